@@ -0,0 +1,437 @@
+"""
+Indexed alert engine: thousands of threshold rules evaluated per bar or tick.
+
+    engine = AlertEngine([LogSink(), MemorySink()])
+    engine.add_rules_text('''
+        close > nh                      # every symbol: close crosses above CDP NH
+        2330.TW: close < stop_loss      # one symbol: close breaks the 2 ATR stop
+        score > 7
+        rsi < 30 and div_rsi has Bottom
+    ''')
+    engine.on_metrics(metrics)          # metrics of `analyze_stock` / the streaming engine
+
+A rule fires when its field *crosses* the threshold (the previous value did not satisfy
+it, the new one does); extra `and` conditions are checked at that moment. Thresholds are
+numbers or session levels of the symbol: the classic / CDP pivots (`pivot`, `r1`, `s1`, `r2`,
+`s2`, `cdp`, `ah`, `nh`, `nl`, `al`) and `stop_loss`, all from the last completed bar.
+
+Index: per scope (symbol or "*") and field, the thresholds of each operator sit in a sorted
+list. An update only bisects the lists of the fields that changed, for the interval between
+the old and the new value, so a tick costs O(fields x log rules + fired rules) however many
+rules are registered. Rules on session levels are resolved into the symbol's own index when
+its levels change (once per bar).
+
+Events are de-duplicated per (rule, symbol, bar): a price oscillating around a level fires
+once per bar. They go to pluggable sinks: `LogSink` (console + JSON lines file, readable by
+any process), `WebhookSink` (JSON payloads queued and POSTed on `flush`) and `MemorySink`
+(recent events for the UI).
+"""
+import bisect
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+
+import bar_store
+import stock_analysis
+import symbol_master
+
+RULES_PATH = os.path.join(bar_store.DEFAULT_DATA_DIR, "alerts.txt")
+EVENTS_PATH = os.path.join(bar_store.DEFAULT_DATA_DIR, "alerts.jsonl")
+
+LEVELS = ("pivot", "r1", "s1", "r2", "s2", "cdp", "ah", "nh", "nl", "al", "stop_loss")
+CROSS_OPS = (">", ">=", "<", "<=")
+CONDITION_OPS = CROSS_OPS + ("==", "!=", "has")
+_TERM = re.compile(r"^\s*([A-Za-z_]\w*)\s*(>=|<=|==|!=|>|<|has)\s*(.+?)\s*$")
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _is_number(x):
+    return isinstance(x, (int, float)) and not isinstance(x, bool) and x == x
+
+class Rule:
+    """
+    `field op threshold [and field op value ...]`, for one symbol or every symbol ("*").
+    """
+    def __init__(self, field, op, threshold, symbol="*", when=(), name=None):
+        if op not in CROSS_OPS:
+            raise ValueError(f"operator must be one of {', '.join(CROSS_OPS)}: {op}")
+        if not _is_number(threshold) and threshold not in LEVELS:
+            raise ValueError(f"threshold must be a number or one of {', '.join(LEVELS)}: {threshold}")
+        for _, cond_op, _ in when:
+            if cond_op not in CONDITION_OPS:
+                raise ValueError(f"condition operator must be one of {', '.join(CONDITION_OPS)}: {cond_op}")
+        self.id = None # assigned by the engine
+        self.field, self.op, self.threshold = field, op, threshold
+        self.symbol = symbol
+        self.when = tuple(when)
+        self.name = name or self.text()
+
+    @classmethod
+    def parse(cls, text, symbol="*", name=None):
+        """
+        "rsi < 30 and div_rsi has Bottom" -> Rule. A "2330.TW:" prefix sets the symbol.
+        """
+        head, sep, body = text.partition(":")
+        if sep:
+            symbol, text = symbol_master.process_ticker(head)[0], body
+        terms = []
+        for part in re.split(r"\s+and\s+", text.strip()):
+            m = _TERM.match(part)
+            if not m: raise ValueError(f"cannot parse rule term: {part!r}")
+            field, op, value = m.groups()
+            number = _number(value)
+            terms.append((field, op, number if number is not None else value))
+        (field, op, threshold), when = terms[0], terms[1:]
+        return cls(field, op, threshold, symbol=symbol, when=when, name=name)
+
+    def text(self):
+        terms = [(self.field, self.op, self.threshold), *self.when]
+        body = " and ".join(f"{f} {op} {v:g}" if _is_number(v) else f"{f} {op} {v}" for f, op, v in terms)
+        return body if self.symbol == "*" else f"{self.symbol}: {body}"
+
+    def conditions_hold(self, values):
+        for field, op, expected in self.when:
+            v = values.get(field)
+            if v is None: return False
+            if op == "has":
+                if str(expected).lower() not in str(v).lower(): return False
+            elif op in ("==", "!="):
+                if (v == expected or str(v) == str(expected)) != (op == "=="): return False
+            elif not (_is_number(v) and _is_number(expected) and _compare(v, op, expected)):
+                return False
+        return True
+
+def _compare(a, op, b):
+    return a > b if op == ">" else a >= b if op == ">=" else a < b if op == "<" else a <= b
+
+def _crossed(thresholds, op, old, new):
+    """
+    Slice of the sorted `thresholds` crossed by a move old -> new (the rule did not hold
+    for `old` and holds for `new`).
+    """
+    if op == ">": # old <= t < new
+        return bisect.bisect_left(thresholds, old), bisect.bisect_left(thresholds, new)
+    if op == ">=": # old < t <= new
+        return bisect.bisect_right(thresholds, old), bisect.bisect_right(thresholds, new)
+    if op == "<": # new < t <= old
+        return bisect.bisect_right(thresholds, new), bisect.bisect_right(thresholds, old)
+    return bisect.bisect_left(thresholds, new), bisect.bisect_left(thresholds, old) # "<=": new <= t < old
+
+def _build_index(entries):
+    """
+    [(field, op, threshold value, rule id)] -> {field: {op: (sorted thresholds, rule ids)}}
+    """
+    grouped = {}
+    for field, op, value, rid in entries:
+        grouped.setdefault(field, {}).setdefault(op, []).append((value, rid))
+    return {field: {op: ([v for v, _ in pairs], [rid for _, rid in pairs])
+                    for op, pairs in ((op, sorted(pairs)) for op, pairs in ops.items())}
+            for field, ops in grouped.items()}
+
+def session_levels(metrics):
+    """
+    Session levels after a completed bar (its `metrics`): the pivots for the next session
+    and the 2 ATR stop.
+    """
+    return {**metrics['pivots'], "stop_loss": metrics['stop_loss']}
+
+class AlertEngine:
+    """
+    Rule registry + threshold index + per-symbol state. Thread-safe.
+    """
+    def __init__(self, sinks=None, rules=None):
+        self.sinks = list(sinks or [])
+        self._lock = threading.RLock()
+        self._rules = {}
+        self._next_id = 1
+        self._static = {}        # scope -> index of numeric-threshold rules
+        self._levels = {}        # symbol -> session levels
+        self._level_index = {}   # symbol -> index of level rules resolved with its levels
+        self._fields = set()     # fields any rule is triggered by
+        self._state = {}         # symbol -> {"values", "bar", "fired", "last"}
+        self._dirty = False
+        self._file_mtime, self._file_errors = False, {}  # `watch_file` state (False = never loaded)
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    # ---- rules ----
+    def add_rule(self, rule):
+        """
+        Registers a Rule (or rule text). Returns: rule id
+        """
+        if isinstance(rule, str): rule = Rule.parse(rule)
+        with self._lock:
+            rule.id = self._next_id
+            self._next_id += 1
+            self._rules[rule.id] = rule
+            self._dirty = True
+        return rule.id
+
+    def add_rules_text(self, text, symbol="*"):
+        """
+        One rule per line; blank lines and "#" comments are skipped.
+        Returns: (list of rule ids, Dictionary of line -> parse error)
+        """
+        ids, errors = [], {}
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line: continue
+            try:
+                ids.append(self.add_rule(Rule.parse(line, symbol=symbol)))
+            except ValueError as e:
+                errors[line] = str(e)
+        return ids, errors
+
+    def remove_rule(self, rule_id):
+        with self._lock:
+            self._dirty |= self._rules.pop(rule_id, None) is not None
+
+    def clear_rules(self):
+        with self._lock:
+            self._rules.clear()
+            self._dirty = True
+
+    def rules(self):
+        return list(self._rules.values())
+
+    def watch_file(self, path=RULES_PATH):
+        """
+        Replaces the rules with the ones in `path` when the file changed since the last call
+        (a missing file means no rules).
+        Returns: Dictionary of line -> parse error of the last load
+        """
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if self._file_mtime != mtime:
+            self._file_mtime = mtime
+            with self._lock:
+                self.clear_rules()
+                _, self._file_errors = self.add_rules_text(load_rules(path))
+        return self._file_errors
+
+    def _reindex(self):
+        static = {}
+        for rule in self._rules.values():
+            if _is_number(rule.threshold):
+                static.setdefault(rule.symbol, []).append((rule.field, rule.op, float(rule.threshold), rule.id))
+        self._static = {scope: _build_index(entries) for scope, entries in static.items()}
+        self._fields = {rule.field for rule in self._rules.values()}
+        self._level_index = {symbol: self._index_levels(symbol) for symbol in self._levels}
+        self._dirty = False
+
+    def _index_levels(self, symbol):
+        levels = self._levels.get(symbol, {})
+        entries = []
+        for rule in self._rules.values():
+            if rule.symbol not in ("*", symbol) or _is_number(rule.threshold): continue
+            value = levels.get(rule.threshold)
+            if _is_number(value):
+                entries.append((rule.field, rule.op, float(value), rule.id))
+        return _build_index(entries)
+
+    # ---- levels / state ----
+    def set_levels(self, symbol, levels):
+        """
+        Session levels of a symbol (see `session_levels`); re-resolves its level rules.
+        """
+        with self._lock:
+            self._levels[symbol] = dict(levels)
+            if not self._dirty:
+                self._level_index[symbol] = self._index_levels(symbol)
+
+    def levels(self, symbol):
+        return dict(self._levels.get(symbol, {}))
+
+    # ---- evaluation ----
+    def update(self, symbol, values, bar=None):
+        """
+        Feeds the latest values of a symbol (e.g. {"close": 612.0} for a tick) and delivers
+        the events of every rule whose threshold was crossed since the previous update.
+        `bar` identifies the current bar (date / timestamp) for de-duplication.
+        Returns: list of event dictionaries
+        """
+        with self._lock:
+            events = self._evaluate(symbol, values, bar)
+        self._deliver(events)
+        return events
+
+    def _evaluate(self, symbol, values, bar):
+        # Caller holds self._lock; events are delivered after it is released
+        if self._dirty: self._reindex()
+        state = self._state.get(symbol)
+        if state is None:
+            state = self._state[symbol] = {"values": {}, "bar": None, "fired": set(), "last": None}
+        if bar != state["bar"]:
+            state["bar"], state["fired"] = bar, set()
+        old = state["values"]
+        current = {**old, **values}
+        candidates = []
+        indexes = [i for i in (self._static.get(symbol), self._static.get("*"), self._level_index.get(symbol)) if i]
+        for field in self._fields.intersection(values):
+            prev, new = old.get(field), values[field]
+            if not (_is_number(prev) and _is_number(new)) or prev == new: continue
+            for index in indexes:
+                for op, (thresholds, ids) in index.get(field, {}).items():
+                    lo, hi = _crossed(thresholds, op, prev, new)
+                    candidates.extend((rid, thresholds[i]) for rid, i in zip(ids[lo:hi], range(lo, hi)))
+        state["values"] = current
+
+        events = []
+        for rid, threshold in candidates:
+            rule = self._rules.get(rid)
+            if rule is None or (rid, symbol) in state["fired"] or not rule.conditions_hold(current): continue
+            state["fired"].add((rid, symbol))
+            events.append(self._event(rule, symbol, current, threshold, bar))
+        return events
+
+    def _event(self, rule, symbol, values, threshold, bar):
+        value = values[rule.field]
+        label = rule.threshold if not _is_number(rule.threshold) else None
+        target = f"{label} {threshold:.2f}" if label else f"{threshold:g}"
+        return {"ts": time.time(), "rule": rule.id, "name": rule.name, "symbol": symbol,
+                "stock_name": values.get("name"), "bar": str(bar) if bar is not None else None,
+                "field": rule.field, "op": rule.op, "threshold": threshold, "level": label,
+                "value": value, "message": f"{symbol} {rule.field} {rule.op} {target} ({value:.2f})"}
+
+    def _deliver(self, events):
+        if not events: return
+        for sink in self.sinks:
+            try:
+                sink(events)
+            except Exception as e:
+                print(f"Error delivering alerts to {type(sink).__name__}: {e}")
+
+    def on_metrics(self, metrics, df=None):
+        """
+        Feeds a metrics dictionary (`analyze_stock`, `StreamingIndicators.update` / `tick`).
+        When the bar date moves on, the finished bar's pivots and stop become the session
+        levels. The first time a symbol is seen, `df` (the analysis frame) seeds the levels
+        and the previous values from its previous bar, so a cross on the very first bar of
+        a fresh process (e.g. `scheduler.py --once`) fires.
+        Returns: list of event dictionaries
+        """
+        if not metrics: return []
+        symbol, bar = metrics['symbol'], metrics['date']
+        values = {k: v for k, v in metrics.items() if k != "pivots"}
+        with self._lock:
+            state = self._state.get(symbol)
+            if state is not None and state["last"] is not None and state["bar"] != bar:
+                self.set_levels(symbol, session_levels(state["last"]))
+            elif df is not None and len(df) > 2 and (state is None or symbol not in self._levels):
+                tail = df.iloc[-3:] if hasattr(df, "iloc") else df.to_frame().iloc[-3:]
+                prev = stock_analysis.build_metrics(tail.iloc[1], tail.iloc[0], tail.index[1], symbol,
+                                                    metrics.get('name'), None, None, None,
+                                                    timeframe=metrics.get('timeframe', "1d"),
+                                                    divergences=("None", "None"))
+                if symbol not in self._levels:
+                    self.set_levels(symbol, session_levels(prev))
+                if state is None:
+                    self._state[symbol] = {"values": {k: v for k, v in prev.items() if k != "pivots"},
+                                           "bar": None, "fired": set(), "last": None}
+            events = self._evaluate(symbol, values, bar)
+            self._state[symbol]["last"] = metrics
+        self._deliver(events)
+        return events
+
+    def stats(self):
+        with self._lock:
+            return {"rules": len(self._rules), "symbols": len(self._state),
+                    "static_entries": sum(len(ids) for index in self._static.values()
+                                          for ops in index.values() for _, ids in ops.values()),
+                    "level_entries": sum(len(ids) for index in self._level_index.values()
+                                         for ops in index.values() for _, ids in ops.values())}
+
+# ---- sinks ----
+class LogSink:
+    """
+    Prints events and appends them as JSON lines to `path` (None = console only).
+    """
+    def __init__(self, path=EVENTS_PATH, echo=True):
+        self.path = path
+        self.echo = echo
+
+    def __call__(self, events):
+        if self.echo:
+            for e in events:
+                print(f"🔔 {e['message']}")
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for e in events:
+                    f.write(json.dumps(e, ensure_ascii=False, default=str) + "\n")
+
+class WebhookSink:
+    """
+    Webhook stand-in: events are queued as JSON payloads; `flush` POSTs them to `url`
+    (outside the tick path). Without a url the payloads just stay in `outbox`.
+    """
+    def __init__(self, url=None, timeout=5, maxlen=10000):
+        self.url = url
+        self.timeout = timeout
+        self.outbox = deque(maxlen=maxlen)
+
+    def __call__(self, events):
+        for e in events:
+            self.outbox.append(json.dumps({"text": e['message'], "event": e}, ensure_ascii=False, default=str))
+
+    def flush(self):
+        """
+        Returns: number of payloads delivered (failed ones stay queued)
+        """
+        if not self.url: return 0
+        sent = 0
+        while self.outbox:
+            payload = self.outbox[0]
+            try:
+                req = urllib.request.Request(self.url, data=payload.encode("utf-8"),
+                                             headers={"Content-Type": "application/json"})
+                urllib.request.urlopen(req, timeout=self.timeout).close()
+            except Exception as e:
+                print(f"Error posting alert webhook: {e}")
+                break
+            self.outbox.popleft()
+            sent += 1
+        return sent
+
+class MemorySink:
+    """
+    Most recent events, newest first (UI).
+    """
+    def __init__(self, maxlen=500):
+        self._events = deque(maxlen=maxlen)
+
+    def __call__(self, events):
+        self._events.extendleft(events)
+
+    def events(self):
+        return list(self._events)
+
+# ---- files ----
+def load_rules(path=RULES_PATH):
+    """
+    Rule text of the shared rules file ("" when missing).
+    """
+    if not os.path.exists(path): return ""
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def save_rules(text, path=RULES_PATH):
+    tmp = bar_store.temp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def read_events(path=EVENTS_PATH, limit=100):
+    """
+    Latest `limit` events of a `LogSink` file, newest first.
+    """
+    if not os.path.exists(path): return []
+    with open(path, encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit)
+    return [json.loads(line) for line in reversed(lines) if line.strip()]
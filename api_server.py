@@ -0,0 +1,406 @@
+"""
+Lightweight HTTP API over the analysis, for dashboards and bots (no Streamlit rerun).
+
+    python api_server.py --port 8765 --warm 2330,2317,6488
+
+Endpoints (GET, `{symbol}` accepts codes, symbols or names like the app's search box;
+every endpoint takes `timeframe=5m|60m|1d|1wk|1mo`, default 1d):
+    /v1/metrics/{symbol}                      metrics dict of `analyze_stock`
+    /v1/metrics?symbols=2330,2317             batch: {"results": {...}, "errors": {...}}
+    /v1/series/{symbol}?columns=Close,RSI&tail=120[&format=arrow]
+                                              indicator columns, JSON or Arrow IPC stream
+    /v1/pivots/{symbol}                       classic + CDP pivots for the next session
+    /healthz                                  hot-cache and result-cache counters
+    /v1/timings                               stage timings and counters (`instrumentation`)
+    /v1/memory                                per-symbol memory of the hot cache
+
+Results live in an in-process hot cache (`HotCache`) in front of the shared result cache,
+with frames held as `compact_frame.CompactFrame` (float32 indicators, no duplicate columns).
+A fresh entry (younger than `ttl`) is served from memory with its JSON body pre-encoded;
+a stale entry is still served while one background refresh per symbol recomputes it, so a
+slow download only delays the first request for a symbol that has never been loaded.
+The hot cache keeps the `max_entries` most recently requested results (LRU).
+Requests run on their own threads (ThreadingHTTPServer).
+"""
+import argparse
+import json
+import math
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pyarrow as pa
+
+import bar_store
+import instrumentation
+import result_cache
+import stock_analysis
+import symbol_master
+import timeframes
+
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+DEFAULT_TTL = 60 # seconds
+MAX_BATCH = 200
+
+# ---- encoding ----
+def _clean(obj):
+    # Strict JSON: NaN/inf -> null, numpy scalars -> Python, dates -> ISO strings
+    if isinstance(obj, dict):
+        return {k: _clean(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean(v) for v in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return obj
+
+def to_json(payload):
+    """
+    Returns: compact UTF-8 JSON bytes
+    """
+    return json.dumps(_clean(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def series_json(df, columns):
+    """
+    Column-oriented series: {"index": [...], "columns": {name: [...]}}
+    """
+    index = [ts.isoformat() for ts in df.index]
+    cols = {}
+    for col in columns:
+        values = df[col].to_numpy(dtype=np.float64)
+        cols[col] = [None if v != v else v for v in values.tolist()]
+    return {"index": index, "columns": cols}
+
+def series_arrow(df, columns):
+    """
+    Returns: bytes of an Arrow IPC stream (index as a "Date" column)
+    """
+    table = pa.Table.from_pandas(df[columns], preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# ---- hot cache ----
+MAX_RENDERED = 32 # memoized response bodies per entry (series column / tail / format variants)
+MAX_ENTRIES = 2000 # (symbol, timeframe) pairs held in memory
+MAX_TOKENS = 10000 # memoized user input -> symbol resolutions
+EVICT_AFTER_TTLS = 10 # entries not refreshed for this many TTLs (nobody asked) are dropped
+
+class _Entry:
+    __slots__ = ("frame", "metrics", "body", "loaded_at", "rendered")
+
+    def __init__(self, frame, metrics):
+        self.frame = frame # CompactFrame: float32 indicators, columns materialized per request
+        self.metrics = metrics
+        self.body = to_json({"symbol": metrics['symbol'], "name": metrics.get('name'), "metrics": metrics})
+        self.loaded_at = time.monotonic()
+        self.rendered = {}
+
+    def render(self, key, build):
+        """
+        Response body for `key`, built once per entry (entries are immutable).
+        """
+        body = self.rendered.get(key)
+        if body is None:
+            body = build()
+            if len(self.rendered) < MAX_RENDERED:
+                self.rendered[key] = body
+        return body
+
+class HotCache:
+    """
+    Symbol -> last (df, metrics) in memory, with single-flight loading and
+    stale-while-revalidate refreshes. Both the entries and the resolved inputs are LRU
+    bounded; entries nobody asked for in `EVICT_AFTER_TTLS` TTLs are dropped as well.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, cache=None, refresh_workers=4, max_entries=MAX_ENTRIES,
+                 max_tokens=MAX_TOKENS):
+        self.ttl = ttl
+        self.cache = cache if cache is not None else result_cache.get_default_cache()
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._symbols = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="api-refresh")
+
+    def resolve(self, token):
+        """
+        User input -> canonical symbol (memoized; the symbol master is only consulted once).
+        """
+        with self._lock:
+            symbol = self._symbols.get(token)
+            if symbol is not None:
+                self._symbols.move_to_end(token)
+                return symbol
+        symbol = symbol_master.process_ticker(token)[0]
+        with self._lock:
+            self._symbols[token] = symbol
+            while len(self._symbols) > self.max_tokens:
+                self._symbols.popitem(last=False)
+        return symbol
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        # Least recently requested first: drop over the bound, then whatever was not
+        # refreshed for a long time (a stale entry refreshes on its next request)
+        expired = time.monotonic() - self.ttl * EVICT_AFTER_TTLS
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if len(self._entries) <= self.max_entries and oldest.loaded_at >= expired: break
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def _load(self, key):
+        # Single flight: concurrent callers for the same (symbol, timeframe) wait on one computation
+        with self._lock:
+            event = self._loading.get(key)
+            owner = event is None
+            if owner:
+                event = self._loading[key] = threading.Event()
+        if not owner:
+            event.wait()
+            return self._lookup(key)
+        try:
+            symbol, timeframe = key
+            df, metrics = stock_analysis.compute_stock(symbol, cache=self.cache, timeframe=timeframe,
+                                                       compact=True)
+            if metrics:
+                entry = _Entry(df, metrics)
+                self._store(key, entry)
+                return entry
+            return self._lookup(key)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+    def get(self, symbol, timeframe="1d"):
+        """
+        Returns: entry (with .frame, .metrics, .body) or None when the symbol has no data
+        """
+        key = (symbol, timeframe)
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return self._load(key)
+        if time.monotonic() - entry.loaded_at < self.ttl:
+            self.hits += 1
+        else:
+            self.stale += 1
+            if key not in self._loading:
+                self._refresh_pool.submit(self._load, key)
+        return entry
+
+    def get_many(self, symbols, timeframe="1d"):
+        """
+        Batch lookup: symbols missing from memory are synced with one batched store call
+        and computed in parallel.
+        Returns: Dictionary of symbol -> entry or None
+        """
+        missing = [s for s in symbols if (s, timeframe) not in self._entries]
+        if not missing:
+            return {s: self.get(s, timeframe) for s in symbols}
+        if len(missing) > 1:
+            try:
+                bar_store.get_default_store().sync_many(missing, period=timeframes.DEFAULT_PERIODS[timeframe],
+                                                        interval=timeframes.base_interval(timeframe))
+            except Exception as e:
+                print(f"Error syncing batch: {e}")
+        return dict(zip(symbols, self._refresh_pool.map(lambda s: self.get(s, timeframe), symbols)))
+
+    def warm(self, symbols):
+        self.get_many([self.resolve(t) for t in symbols])
+
+    def memory_report(self):
+        """
+        Memory per cached (symbol, timeframe): compact frame vs the equivalent float64
+        DataFrame, plus pre-encoded response bodies.
+        Returns: (list of rows, largest first; totals)
+        """
+        rows = []
+        with self._lock:
+            entries = list(self._entries.items())
+        for (symbol, timeframe), entry in entries:
+            report = entry.frame.memory_report()
+            bodies = len(entry.body) + sum(len(b) for b in list(entry.rendered.values()))
+            rows.append({"symbol": symbol, "timeframe": timeframe, **report, "body_bytes": bodies})
+        rows.sort(key=lambda r: -(r["compact_bytes"] + r["body_bytes"]))
+        totals = {k: sum(r[k] for r in rows) for k in ("compact_bytes", "dense_bytes", "body_bytes")}
+        return rows, dict(totals, entries=len(rows))
+
+    def stats(self):
+        lookups = self.hits + self.stale + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "stale": self.stale,
+                "misses": self.misses, "evicted": self.evicted, "hit_rate": (self.hits + self.stale) / lookups if lookups else 0.0,
+                "ttl": self.ttl}
+
+# ---- HTTP ----
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+def make_handler(hot):
+    """
+    Request handler class bound to a `HotCache`.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive for dashboard polling
+        disable_nagle_algorithm = True # headers and body go out as separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json; charset=utf-8"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _entry(self, token, timeframe):
+            symbol = hot.resolve(urllib.parse.unquote(token))
+            entry = hot.get(symbol, timeframe)
+            if entry is None:
+                raise ApiError(404, f"No data for {symbol} ({timeframe})")
+            return entry
+
+        def do_GET(self):
+            parsed = urllib.parse.urlparse(self.path)
+            query = urllib.parse.parse_qs(parsed.query)
+            parts = [p for p in parsed.path.split("/") if p]
+            try:
+                if parts == ["healthz"]:
+                    return self._send(200, to_json({"hot": hot.stats(), "results": hot.cache.stats()}))
+                if parts == ["v1", "timings"]:
+                    return self._send(200, to_json(instrumentation.snapshot()))
+                if parts == ["v1", "memory"]:
+                    rows, totals = hot.memory_report()
+                    return self._send(200, to_json({"totals": totals, "entries": rows}))
+                if len(parts) < 2 or parts[0] != "v1":
+                    raise ApiError(404, f"Unknown path {parsed.path}")
+
+                route, args = parts[1], parts[2:]
+                timeframe = _param(query, "timeframe", "1d")
+                if timeframe not in timeframes.TIMEFRAMES:
+                    raise ApiError(400, f"timeframe must be one of {', '.join(timeframes.TIMEFRAMES)}")
+                if route == "metrics" and not args:
+                    return self._batch(query, timeframe)
+                if len(args) != 1:
+                    raise ApiError(404, f"Unknown path {parsed.path}")
+                entry = self._entry(args[0], timeframe)
+
+                if route == "metrics":
+                    return self._send(200, entry.body)
+                if route == "pivots":
+                    m = entry.metrics
+                    return self._send(200, entry.render("pivots", lambda: to_json(
+                        {"symbol": m['symbol'], "date": m['date'], "pivots": m['pivots']})))
+                if route == "series":
+                    return self._series(entry, query)
+                raise ApiError(404, f"Unknown path {parsed.path}")
+            except ApiError as e:
+                self._send(e.status, to_json({"error": str(e)}))
+            except Exception as e:
+                print(f"Error serving {self.path}: {e}")
+                self._send(500, to_json({"error": str(e)}))
+
+        def _batch(self, query, timeframe):
+            tokens = [t for t in _param(query, "symbols", "").replace(" ", ",").split(",") if t]
+            if not tokens:
+                raise ApiError(400, "symbols is required")
+            if len(tokens) > MAX_BATCH:
+                raise ApiError(400, f"At most {MAX_BATCH} symbols per request")
+            symbols = list(dict.fromkeys(hot.resolve(t) for t in tokens))
+            entries = hot.get_many(symbols, timeframe)
+            results = {s: e.metrics for s, e in entries.items() if e is not None}
+            errors = {s: "no data" for s, e in entries.items() if e is None}
+            self._send(200, to_json({"results": results, "errors": errors}))
+
+        def _series(self, entry, query):
+            frame = entry.frame
+            columns = _param(query, "columns")
+            columns = columns.split(",") if columns else list(frame.columns)
+            unknown = [c for c in columns if c not in frame]
+            if unknown:
+                raise ApiError(400, f"Unknown columns: {', '.join(unknown)}")
+            tail = _param(query, "tail")
+            try:
+                tail = int(tail) if tail else None
+            except ValueError:
+                raise ApiError(400, "tail must be an integer")
+            fmt = _param(query, "format", "json")
+
+            def build():
+                # Only the requested rows / columns are materialized (as float64)
+                df = (frame.tail(tail) if tail else frame).to_frame(columns)
+                if fmt == "arrow":
+                    return series_arrow(df, columns)
+                payload = series_json(df, columns)
+                payload["symbol"] = entry.metrics['symbol']
+                # Already plain floats / None: skip the recursive clean-up of to_json
+                return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+            body = entry.render(("series", tuple(columns), tail, fmt), build)
+            self._send(200, body, ARROW_TYPE if fmt == "arrow" else "application/json; charset=utf-8")
+
+    return Handler
+
+def make_server(host="127.0.0.1", port=8765, hot=None):
+    """
+    Returns: ThreadingHTTPServer (call serve_forever, or use from a thread in tests/benchmarks)
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(hot or HotCache()))
+    server.daemon_threads = True
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON / Arrow API for the stock analysis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="seconds an in-memory result is served without a refresh")
+    parser.add_argument("--max-entries", type=int, default=MAX_ENTRIES, help="(symbol, timeframe) results kept in memory")
+    parser.add_argument("--warm", help="comma separated symbols to load before serving")
+    args = parser.parse_args(argv)
+
+    hot = HotCache(ttl=args.ttl, max_entries=args.max_entries)
+    if args.warm:
+        t0 = time.time()
+        hot.warm([t for t in args.warm.split(",") if t.strip()])
+        print(f"Warmed {hot.stats()['entries']} symbols in {time.time() - t0:.1f}s")
+    server = make_server(args.host, args.port, hot)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
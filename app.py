@@ -1,9 +1,30 @@
+import time
+_script_start = time.perf_counter() # whole-script timing (cold start vs rerun), recorded at the end
+
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
 import stock_analysis
+import cross_section
+import portfolio
+import charting
+import reports
+import symbol_master
+import scheduler
+import alerts
+import bar_store
+import market_hours
+import result_cache
+import timeframes
+import instrumentation
+import metrics_history
+import os
+import json
 import importlib
 
+# Only the first run of the process pays for the imports (later reruns hit sys.modules);
+# yfinance, the slowest dependency, is imported on first use by bar_store / fetcher.
+instrumentation.record("app.imports", time.perf_counter() - _script_start)
+
 # Force reload of backend module to ensure latest code changes (e.g. new metrics) are applied
 # importlib.reload(stock_analysis) # Commented out for Production speed
 
@@ -34,223 +55,391 @@ st.markdown("### 數據驅動 (Data-Driven) | 嚴謹邏輯 (Rigorous Logic) | 
 with st.sidebar:
     st.header("⚙️ 參數設定")
     ticker_input = st.text_input("輸入代號 (如 2330, NVDA, 台指期)", value="2330")
+    timeframe = st.selectbox("K線週期", list(timeframes.TIMEFRAMES), index=2,
+                             format_func=lambda tf: timeframes.TIMEFRAME_LABELS[tf])
     run_btn = st.button("🚀 啟動量化分析", type="primary")
+    decimate_chart = st.checkbox("📉 精簡圖表 (長歷史 / 行動裝置)", value=True,
+                                 help="合併K線並以 WebGL 繪製均線，降低傳送到瀏覽器的資料量")
     
     st.divider()
-    st.info("💡 貼心小幫手：\n1. 台股直接輸入代號 (如 2330)\n2. 輸入 '台指期' 或 'TX' 可分析大盤")
+    with st.expander("⏱️ 背景預熱狀態 (Scheduler)"):
+        status = scheduler.read_status()
+        if not status:
+            st.caption("尚未執行。啟動 `python scheduler.py` 或設定 QUANT_SCHEDULER=1。")
+        else:
+            fmt = lambda ts: market_hours.to_tw(ts).strftime("%m-%d %H:%M:%S") if ts else "-"
+            st.caption(f"上次更新: {fmt(status['last_refresh'])} ({status['last_duration'] or 0:.1f}s)")
+            st.caption(f"下次更新: {fmt(status['next_run'])} | 追蹤 {len(status['watchlist'])} 檔")
+            failed = {s: e for s, e in status['symbols'].items() if e['error']}
+            for symbol, entry in failed.items():
+                st.caption(f"❌ {symbol}: {entry['error']} ({fmt(entry['error_at'])})")
+        cache_stats = result_cache.get_default_cache().stats()
+        st.caption(f"結果快取: 命中率 {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}) | "
+                   f"{cache_stats['entries']} 筆, {cache_stats['bytes'] / 1e6:.1f} MB")
+
+    with st.expander("🔔 價格警示 (Alerts)"):
+        st.caption("每行一條規則，由背景預熱 (Scheduler) 於每次更新時檢查，例如：\n"
+                   "`close > nh`、`2330: close < stop_loss`、`score > 7`、`rsi < 30 and div_rsi has Bottom`")
+        rules_text = st.text_area("警示規則", value=alerts.load_rules(), height=140, key="alert_rules")
+        if st.button("💾 儲存規則"):
+            _, rule_errors = alerts.AlertEngine().add_rules_text(rules_text)
+            for line, reason in rule_errors.items():
+                st.error(f"{line}: {reason}")
+            if not rule_errors:
+                alerts.save_rules(rules_text)
+                st.success("已儲存，下次更新時生效。")
+        events = alerts.read_events(limit=20)
+        if not events:
+            st.caption("尚無觸發紀錄。")
+        for event in events:
+            when = market_hours.to_tw(event['ts']).strftime("%m-%d %H:%M")
+            st.caption(f"{when} | {event.get('stock_name') or ''} {event['message']}")
 
-def process_ticker(input_str):
+    show_timings = st.checkbox("🛠️ 效能除錯面板 (Timings)", value=False,
+                               help="各階段耗時與快取命中次數 (本伺服器程序累計)")
+
+    st.info("💡 貼心小幫手：\n1. 台股直接輸入代號 (如 2330) 或名稱 (如 台積電)\n2. 輸入 '台指期' 或 'TX' 可分析大盤")
+
+@st.cache_resource
+def process_state():
     """
-    Smartly converts user input to yfinance ticker.
+    Per server process: script runs so far (the first one is the cold start).
     """
-    input_str = input_str.strip().upper()
-    
-    # 1. Futures Mapping (Proxy)
-    if input_str in ["TX", "WTX", "台指期", "FUTURES", "TAIEX"]:
-        return "^TWII", "台指期 (Proxy: 加權指數)"
-        
-    # 2. Taiwan Stock Shortcut (4 digits)
-    if input_str.isdigit() and len(input_str) == 4:
-        # Default assumption: simple ticker input -> likely Taiwan Stock
-        return f"{input_str}.TW", f"{input_str}"
-        
-    # 3. Default
-    return input_str, input_str
+    return {"runs": 0}
 
-def generate_rule_based_report(metrics, ticker_display_name):
+def memoized(slot, key, build):
     """
-    Generates a text report based on quantitative metrics.
+    Rendered artifacts (figure, report, prompt) kept in session state, one entry per slot:
+    `build()` runs only when `key` changes, not on every widget interaction.
     """
-    # 1. Market Structure Logic
-    trend_str = "多頭排列 (Bullish)" if metrics['trend'] == "Bullish" else "空頭/盤整 (Bearish/Sideways)"
-    adx_str = "趨勢強勁" if metrics['adx'] > 25 else "趨勢不明/盤整"
-    
-    # 2. Indicator Logic
-    kd_status = "高檔過熱" if metrics['k'] > 80 else "低檔超賣" if metrics['k'] < 20 else "中性"
-    macd_status = "多頭掌控" if metrics['macd_hist'] > 0 else "空頭掌控"
-    
-    # 3. Pivots data
-    p = metrics['pivots']
-    
-    # 4. Scenario Logic (Fix: Ensure Target > Breakout)
-    bull_breakout = p['nh']
-    bull_target = metrics['bb_up']
-    bull_target_desc = "布林上軌"
-    
-    # If BB Upper is below the breakout point (Stock is very strong), look higher to AH
-    if bull_target <= bull_breakout:
-        bull_target = p['ah']
-        bull_target_desc = "CDP AH (最高壓力)"
-    
-    report = f"""
-## {ticker_display_name} 自動化量化決策報告
-**分析日期:** {metrics['date']}
-
-### 1. 市場結構判定
-* **趨勢方向:** **{trend_str}** (MA20 vs MA60)
-* **K線型態:** {metrics['pattern']}
-* **關鍵乖離:** MA20乖離 {metrics['bias_ma20']:.2f}% | MA60乖離 {metrics['bias_ma60']:.2f}%
-
-### 2. 技術指標掃描
-* **動能 (MACD/KD):** {macd_status} (Hist={metrics['macd_hist']:.2f}) | KD狀態: {kd_status} (K={metrics['k']:.2f})
-* **強弱 (RSI):** RSI={metrics['rsi']:.2f} (若 <30 超賣, >70 超買)
-* **通道狀態:** Bandwidth={metrics['bb_width']:.2f}% ({(lambda w: "壓縮待變" if w < 10 else "正常擴張")(metrics['bb_width'])})
-
-### 3. 🎯 CDP 逆勢操作系統 (明日當沖參考)
-| 關鍵點位 | 價格 |戰術意義 |
-| :--- | :--- | :--- |
-| **AH (最高壓力)** | **{p['ah']:.2f}** | 強力賣點/追價極限 |
-| **NH (賣出點)** | {p['nh']:.2f} | 分批獲利了結 |
-| **CDP (中軸)** | {p['cdp']:.2f} | 多空分水嶺 |
-| **NL (買進點)** | {p['nl']:.2f} | 回檔佈局點 |
-| **AL (最低支撐)** | **{p['al']:.2f}** | 強力買點/停損極限 |
-
-### 4. ⚖️ 劇本模擬 (Scenario Analysis)
-* ☀️ **樂觀劇本 (Bull Case):** 若帶量突破 **{bull_breakout:.2f}**，目標挑戰{bull_target_desc} **{bull_target:.2f}**。
-* 🌧️ **悲觀劇本 (Bear Case):** 若跌破季線 **{metrics['ma60']:.2f}** 或 AL **{p['al']:.2f}**，下看 ATR 停損位 **{metrics['stop_loss']:.2f}**。
+    memo = st.session_state.setdefault('render_memo', {})
+    entry = memo.get(slot)
+    if entry is not None and entry[0] == key:
+        instrumentation.count("app.memo.hit")
+        return entry[1]
+    with instrumentation.stage(f"app.render.{slot}"):
+        value = build()
+    memo[slot] = (key, value)
+    return value
+
+def bars_changed(symbol, intervals, since):
     """
-    return report
-
-def generate_ai_prompt(metrics, ticker):
-    # Determine Volume Status
-    vol_status = "價漲量增 (攻擊)" if (metrics['close'] > metrics['prev_close'] and metrics['volume'] > metrics['mv5']) else \
-                 "價漲量縮 (惜售)" if (metrics['close'] > metrics['prev_close'] and metrics['volume'] < metrics['mv5']) else \
-                 "價跌量增 (出貨)" if (metrics['close'] < metrics['prev_close'] and metrics['volume'] > metrics['mv5']) else \
-                 "價跌量縮 (觀望)"
-    
-    ticker_name = f"{ticker} {metrics.get('name', '')}"
-    
-    prompt = f"""
-### 🏛️ 華爾街避險基金策略師分析系統 (Wall Street Hedge Fund Analyst Prompt)
+    Whether the store fetched `symbol`'s bars after `since` (e.g. the scheduler) or would
+    fetch them again now (older than its `min_refresh_seconds`), for any of `intervals`.
+    """
+    store = bar_store.get_default_store()
+    now = time.time()
+    for interval in intervals:
+        fetched_at = store.fetched_at(symbol, interval)
+        if fetched_at is None or fetched_at > since or now - fetched_at >= store.min_refresh_seconds:
+            return True
+    return False
+
+def memoized_analysis(slot, key, symbol, intervals, build, refresh=False):
+    """
+    Analysis results ((df, metrics), ...) kept in session state, one entry per slot:
+    `build()` runs when `key` changes, on `refresh` (the run button) or when the bars
+    changed (`bars_changed`), not on every widget interaction.
+    """
+    memo = st.session_state.setdefault('analysis_memo', {})
+    entry = memo.get(slot)
+    if entry is not None and entry[0] == key and not refresh and not bars_changed(symbol, intervals, entry[1]):
+        instrumentation.count("app.analysis.hit")
+        return entry[2]
+    with instrumentation.stage(f"app.analysis.{slot}"):
+        value = build()
+    memo[slot] = (key, time.time(), value)
+    return value
+
+@st.cache_resource
+def start_scheduler():
+    """
+    One in-process warm-up thread per server process (opt-in via QUANT_SCHEDULER=1).
+    """
+    return scheduler.WarmScheduler().start()
 
-#### 1. System Prompt (請複製到 System Role)
+if os.environ.get("QUANT_SCHEDULER") == "1":
+    start_scheduler()
 
-你是一位擁有 20 年經驗的華爾街避險基金 (Hedge Fund) 首席策略師。你的專長是結合「量化技術分析」、「籌碼博弈理論」與「基本面催化劑」來尋找超額報酬 (Alpha)。
+# Top-level views: single-symbol analysis, multi-symbol screener, cross-sectional analytics
+tab_single, tab_screener, tab_cross, tab_book = st.tabs(["🔍 個股分析", "📋 多檔選股 (Screener)",
+                                                        "🌐 橫斷面 (Cross-Section)", "💼 投資組合 (Portfolio)"])
 
-**你的行為準則：**
-1. **風格冷靜專業：** 不使用誇張形容詞，只用數據和邏輯說話。
-2. **風險厭惡 (Risk Averse)：** 看重「風險報酬比」，若風險過高建議觀望。
-3. **數據導向：** 所有推論基於提供數據，嚴禁憑空臆測。
-4. **操作明確：** 進出場點位必須具體。
+with tab_single:
+    # Keep the analysed symbol across reruns (chart range / options trigger a rerun)
+    if run_btn:
+        st.session_state['active_ticker'] = ticker_input
+    active_ticker = st.session_state.get('active_ticker')
+    if active_ticker:
+        real_ticker, user_input_display = symbol_master.process_ticker(active_ticker)
+    
+        with st.spinner(f"正在運算 {user_input_display} ({real_ticker}) 的機構級模型..."):
+            df, metrics = memoized_analysis("single", (real_ticker, timeframe), real_ticker,
+                                            [timeframes.base_interval(timeframe)],
+                                            lambda: stock_analysis.analyze_stock(real_ticker, timeframe=timeframe),
+                                            refresh=run_btn)
+        
+            if metrics:
+                if real_ticker == "^TWII":
+                    st.warning("⚠️ 注意：因免費數據源限制，目前使用『加權指數 (^TWII)』作為台指期走勢的替代分析參考。")
+            
+                # Construct Display Name with Fetched Chinese Name (just the ticker if the lookup failed)
+                full_display_name = reports.display_name(metrics)
+                # Identifies the analysed bar: a new bar or an intraday update of the last one
+                # (same date, new close / volume) rebuilds the memoized figure / report / prompt
+                bar_key = (metrics['symbol'], timeframe, str(metrics['date']), metrics['close'], metrics['volume'],
+                           full_display_name)
+            
+                # 1. Scorecard Section (NEW)
+                st.subheader("📊 Bull/Bear Scorecard (多空評分卡)")
+                score = metrics.get('score', 5.0)
+                score_class = "bull-score" if score >= 7 else "bear-score" if score <= 3 else "neutral-score"
+                st.markdown(f'<div class="score-box {score_class}">\n'
+                            f'   <h2 style="margin:0;">量化綜效評分 (QUANT SCORE): {score:.1f}/10</h2>\n'
+                            f'</div>', unsafe_allow_html=True)
+                st.progress(score/10)
+            
+                # Layout: KPI - Split into 2x2 grid for better Mobile/Portrait view
+                # Row 1
+                col1, col2 = st.columns(2)
+                col1.metric("收盤價 (Close)", f"{metrics['close']:.2f}", 
+                            delta=f"{(metrics['close']-metrics['prev_close']):.2f} ({(metrics['close']-metrics['prev_close'])/metrics['prev_close']*100:.1f}%)")
+                col2.metric("趨勢 (Trend)", f"{metrics['trend']}")
+            
+                # Row 2
+                col3, col4 = st.columns(2)
+                col3.metric("量能狀態 (Vol)", f"{metrics['volume']/metrics['mv5']:.1f}x 均量", 
+                            delta=f"{metrics['vol_change']:.1f}% vs 昨日", delta_color="off")
+                col4.metric("K線型態 (Pattern)", metrics['pattern'])
 
----
+                # Score history recorded by earlier analyses (read from disk, no recompute)
+                score_hist = memoized("score_history", bar_key,
+                                      lambda: metrics_history.get_default_history().recent("score", [metrics['symbol']]))
+                if len(score_hist) > 1:
+                    st.caption(f"📈 近 {len(score_hist)} 個交易日量化評分 (歷史紀錄)")
+                    st.line_chart(score_hist[metrics['symbol']], height=140)
 
-#### 2. User Prompt (請複製到 User Message)
+                # Multi-timeframe confirmation: same model on hourly / daily / weekly / monthly bars
+                with st.expander("🧭 多週期共振 (Multi-Timeframe)", expanded=True):
+                    # Recomputed only when one of the timeframes' bars changed (or on the run button)
+                    mtf_frames = ("60m", "1d", "1wk", "1mo")
+                    frames = memoized_analysis("mtf", (real_ticker, mtf_frames), real_ticker,
+                                               sorted({timeframes.base_interval(tf) for tf in mtf_frames}),
+                                               lambda: stock_analysis.analyze_timeframes(real_ticker, mtf_frames),
+                                               refresh=run_btn)
+                    rows = [{"週期": timeframes.TIMEFRAME_LABELS[tf], "評分": m['score'], "趨勢": m['trend'],
+                             "RSI": m['rsi'], "K": m['k'], "MACD柱": m['macd_hist'], "K線時間": str(m['date'])}
+                            for tf, (_, m) in frames.items() if m]
+                    if rows:
+                        mtf = pd.DataFrame(rows).set_index("週期")
+                        st.dataframe(mtf, use_container_width=True,
+                                     column_config={"評分": st.column_config.ProgressColumn(
+                                         "評分", min_value=0, max_value=10, format="%.1f")})
+                        trends = set(mtf["趨勢"])
+                        verdict = ("多週期多頭共振" if trends == {"Bullish"} else
+                                   "多週期空頭共振" if trends == {"Bearish"} else "週期分歧，宜降低部位")
+                        st.caption(f"平均評分 {mtf['評分'].mean():.1f}/10 | {verdict}")
+                    missing = [timeframes.TIMEFRAME_LABELS[tf] for tf, (_, m) in frames.items() if not m]
+                    if missing:
+                        st.caption("無資料: " + ", ".join(missing))
+            
+                # Chart
+                st.subheader(f"📊 {full_display_name} {timeframes.TIMEFRAME_LABELS[timeframe]} 股價走勢與布林通道")
+                x_range = None
+                if len(df) > charting.MAX_POINTS:
+                    # Long history: only the selected window is sent, at finer detail when narrower
+                    first, last = df.index[0].date(), df.index[-1].date()
+                    x_range = st.slider("顯示區間 (縮小區間可看更細的K線)", min_value=first, max_value=last,
+                                        value=(first, last), format="YYYY-MM-DD", key=f"range_{metrics['symbol']}_{timeframe}")
+                fig, per_candle = memoized("figure", (bar_key, x_range, decimate_chart),
+                                           lambda: charting.price_figure(df, x_range=x_range, decimate=decimate_chart,
+                                                                         timeframe=timeframe))
+                if per_candle > 1:
+                    st.caption(f"精簡繪圖：每根K線合併 {per_candle} 根原始K線，均線以 LTTB 取樣。")
+                st.plotly_chart(fig, use_container_width=True)
+            
+                # Divide into Tabs for Report vs AI Bridge
+                tab1, tab2 = st.tabs(["📄 即時策略報告", "🤖 AI 橋接咒語 (Institutional Grade)"])
+            
+                with tab1:
+                    st.markdown('<div class="report-box">', unsafe_allow_html=True)
+                    report_md = memoized("report", bar_key,
+                                         lambda: reports.generate_rule_based_report(metrics, full_display_name))
+                    st.markdown(report_md)
+                    st.markdown('</div>', unsafe_allow_html=True)
+                
+                with tab2:
+                    st.markdown("### 🧬 AI 橋接咒語 (Prompt Bridge)")
+                    st.info("此 Prompt 為「華爾街機構級」終極模板，包含 System Prompt, CDP 點位與完整數據。請全部複製貼給 LLM。")
+                    prompt = memoized("prompt", bar_key, lambda: reports.generate_ai_prompt(metrics, full_display_name))
+                    st.code(prompt, language="text")
+                
+            else:
+                st.error(f"無法獲取數據 {real_ticker}。請檢查代號是否正確。")
+                suggestions = symbol_master.get_master().search(active_ticker, limit=5)
+                if suggestions:
+                    st.info("🔎 您是不是要找：\n" + "\n".join(f"- {r['code']} {r['name_zh'] or r['name_en']}" for r in suggestions))
 
-請針對以下標的 **{ticker_name}** 進行深度策略分析。
+with tab_screener:
+    st.subheader("📋 多檔量化選股 (Batch Screener)")
+    universe_input = st.text_area("輸入多檔代號 (以逗號、空白或換行分隔)",
+                                  value="2330, 2317, 2454, 2303, 2308, 2881, 2882, 2886, 2891, 2412", height=120)
+    screen_btn = st.button("🔎 批次評分", type="primary")
+    
+    if screen_btn:
+        universe = symbol_master.parse_ticker_list(universe_input)
+        with st.spinner(f"正在批次運算 {len(universe)} 檔標的..."):
+            table, failures = stock_analysis.analyze_universe(tuple(universe))
+        
+        if not table.empty:
+            history = metrics_history.get_default_history().recent("score", list(table.index))
+            table["score_hist"] = [history[t].dropna().tolist() if t in history else [] for t in table.index]
+            cols = ["rank", "name", "score", "score_hist", "close", "trend", "rsi", "k", "macd_hist",
+                    "bias_ma20", "adx", "bb_width", "div_rsi", "div_macd", "pattern", "nl", "nh", "stop_loss", "date"]
+            st.dataframe(table[cols], use_container_width=True,
+                         column_config={"score": st.column_config.ProgressColumn(
+                                            "量化評分", min_value=0, max_value=10, format="%.1f"),
+                                        "score_hist": st.column_config.LineChartColumn("評分走勢", y_min=0, y_max=10)})
+        
+        if failures:
+            st.warning("⚠️ 以下代號無法分析：\n" + "\n".join(f"- {t}: {reason}" for t, reason in failures.items()))
 
-**【第一維度：核心量價數據 (Price & Volume)】**
-- **分析日期:** {metrics['date']}
-- **收盤數據:** 收盤價 {metrics['close']:.2f} (漲跌幅: {((metrics['close'] - metrics['prev_close']) / metrics['prev_close'] * 100):.2f}%)
-- **K線型態:** {metrics['pattern']} (Open={metrics['open']:.2f}, High={metrics['high']:.2f}, Low={metrics['low']:.2f})
-- **成交量能:** 當日成交量 {metrics['volume']:,} 張 (5日均量: {metrics['mv5']:,})
-- **量價關係:** {vol_status}
+with tab_cross:
+    st.subheader("🌐 橫斷面分析 (Relative Strength / Correlation)")
+    cross_input = st.text_area("輸入股票池 (以逗號、空白或換行分隔；大盤 ^TWII 自動納入作為基準)",
+                               value="2330, 2317, 2454, 2303, 2308, 2382, 3231, 2881, 2882, 2886, 2891, 2412, 2603, 2609, 1301, 0050",
+                               height=120, key="cross_universe")
+    col_w, col_rs = st.columns(2)
+    corr_window = col_w.selectbox("相關係數視窗 (日)", [20, 60, 120], index=1)
+    rs_window = col_rs.selectbox("相對強弱期間 (日)", list(cross_section.RS_WINDOWS), index=1)
+    if st.button("🌐 計算橫斷面", type="primary"):
+        st.session_state['cross_request'] = (tuple(symbol_master.parse_ticker_list(cross_input)), corr_window)
+    cross_request = st.session_state.get('cross_request')
 
-**【第二維度：技術趨勢架構 (Trend & Momentum)】**
-- **均線排列:** MA5={metrics['ma5']:.2f}, MA20={metrics['ma20']:.2f}, MA60={metrics['ma60']:.2f} (MA20乖離: {metrics['bias_ma20']:.2f}%)
-- **趨勢狀態:** {metrics['trend']} (MA20 vs MA60)
-- **波動區間 (Bollinger):** 上軌={metrics['bb_up']:.2f}, 下軌={metrics['bb_low']:.2f} (帶寬狀態: {metrics['bb_width']:.2f}%)
-- **動能指標:** KD(K={metrics['k']:.2f}, D={metrics['d']:.2f}), RSI={metrics['rsi']:.2f} (背離訊號: {metrics['div_rsi']}), MACD柱狀體={metrics['macd_hist']:.2f}
-- **風險指標 (ATR):** {metrics['atr']:.2f} (建議停損位: {metrics['stop_loss']:.2f})
-- **多空評分:** {metrics.get('score', 0):.1f}/10
+    if cross_request:
+        universe, window = cross_request
+        with st.spinner(f"正在計算 {len(universe)} 檔標的的橫斷面指標..."):
+            table, corr, failures = cross_section.analyze_cross_section(universe, window=window)
 
-**【第三維度：籌碼博弈與情緒 (Chips & Sentiment)】**
-- **法人動向:** (請自行聯網搜尋：外資今日買賣超張數 / 投信買賣超張數)
-- **散戶情緒:** (請自行聯網搜尋：融資餘額變化)
-- **衍生品避險:** (請自行聯網搜尋：{ticker} 期貨或選擇權大額交易人部位)
+        if not table.empty:
+            rs_col = f"rs_{rs_window}"
+            ranked = table.sort_values(rs_col, ascending=False, na_position="last") if rs_col in table else table
+            # 1. Ranking: relative strength + percentiles of the main metrics
+            cols = [c for c in ["rank", "name", "sector", "score", rs_col, "beta", f"{rs_col}_pct", "score_pct",
+                                "rsi_pct", "bias_ma20_pct", "adx_pct", "vol_change_pct", "close", "date"] if c in ranked]
+            pct = lambda label: st.column_config.ProgressColumn(label, min_value=0, max_value=100, format="%.0f")
+            st.markdown(f"**📈 相對強弱排行 (vs {cross_section.BENCHMARK}, {rs_window} 日)**")
+            st.dataframe(ranked[cols], use_container_width=True,
+                         column_config={"score": st.column_config.ProgressColumn("量化評分", min_value=0, max_value=10, format="%.1f"),
+                                        rs_col: st.column_config.NumberColumn("RS (%)", format="%+.1f"),
+                                        "beta": st.column_config.NumberColumn("Beta", format="%.2f"),
+                                        f"{rs_col}_pct": pct("RS 百分位"), "score_pct": pct("評分百分位"),
+                                        "rsi_pct": pct("RSI 百分位"), "bias_ma20_pct": pct("乖離百分位"),
+                                        "adx_pct": pct("ADX 百分位"), "vol_change_pct": pct("量能百分位")})
 
-**【第四維度：基本面與外部環境 (Fundamentals & Environment)】**
-- **產業/外部連動:** (請自行聯網搜尋：與該股連動的美股/ETF表現，如 TSUD/SOXX)
-- **核心基本面:** (請自行聯網搜尋：近期營收 YoY / 本益比)
-- **最新消息/催化劑:** (請自行聯網搜尋：{ticker} 近 3 日重大新聞)
+            # 2. Sector momentum
+            if rs_col in table:
+                sectors = cross_section.sector_momentum(table, rs_col)
+                st.markdown("**🏭 產業動能 (中位數相對強弱)**")
+                st.bar_chart(sectors["median_rs"])
+                st.dataframe(sectors, use_container_width=True)
 
----
+            # 3. Correlation heatmap in cluster order
+            if not corr.empty and len(corr) > 1:
+                # Large universes: heatmap of the strongest names only
+                shown = [s for s in ranked.index if s in corr.index][:charting.HEATMAP_MAX]
+                left_out = len(corr) - len(shown)
+                sub = corr.loc[shown, shown]
+                fig, _ = charting.correlation_heatmap(sub, cross_section.cluster_order(sub),
+                                                      labels=table["name"].to_dict())
+                st.markdown(f"**🔗 {window} 日報酬相關係數 (依相關性分群排序)**")
+                st.plotly_chart(fig, use_container_width=True)
+                if left_out:
+                    st.caption(f"僅顯示相對強弱前 {len(shown)} 檔 (另有 {left_out} 檔未顯示)。")
+                st.dataframe(cross_section.top_pairs(corr, 10), use_container_width=True)
 
-**【你的任務 (Mission)】**
+        if failures:
+            st.warning("⚠️ 以下代號無法分析：\n" + "\n".join(f"- {t}: {reason}" for t, reason in failures.items()))
 
-請綜合上述四個維度的數據 (量化數據已提供，質化數據請聯網補充)，撰寫一份決策報告：
+with tab_book:
+    st.subheader("💼 投資組合風險 (VaR / CVaR / ATR 部位規模)")
+    book_input = st.text_area("輸入持股 (每行：代號 股數；只填代號則僅計算建議部位)",
+                              value="2330 2000\n2317 5000\n2454 1000\n2881 10000\n2412 3000",
+                              height=140, key="book_holdings")
+    col_eq, col_rf, col_cl, col_h = st.columns(4)
+    equity = col_eq.number_input("帳戶權益 (0 = 持股市值)", min_value=0.0, value=0.0, step=100000.0)
+    risk_pct = col_rf.number_input("單一部位風險 (%)", min_value=0.1, max_value=10.0,
+                                   value=portfolio.RISK_FRACTION * 100, step=0.1)
+    confidence = col_cl.selectbox("信賴水準", [0.95, 0.99], format_func=lambda c: f"{c:.0%}")
+    horizon = col_h.selectbox("持有期間 (日)", [1, 5, 10])
+    if st.button("💼 計算組合風險", type="primary"):
+        holdings, bad_lines = portfolio.parse_holdings(book_input)
+        st.session_state['book_request'] = (tuple(holdings.items()), tuple(bad_lines))
+    book_request = st.session_state.get('book_request')
 
-**1. 多空位階總結 (Executive Summary)**
-   - 用一句精煉的話定義目前走勢（例如：籌碼換手後的初升段）。
-   - 給予評級：**[強力買進 / 拉回佈局 / 中性觀望 / 反彈減碼 / 放空]**。
+    if book_request:
+        holdings, bad_lines = book_request
+        with st.spinner(f"正在計算 {len(holdings)} 檔持股的組合風險..."):
+            summary, positions, failures = portfolio.analyze_portfolio(
+                holdings, equity=equity or None, confidence=confidence, horizon=horizon,
+                risk_fraction=risk_pct / 100)
 
-**2. 深度邏輯推演 (Deep Dive Diagnosis)**
-   - **矛盾對決：** 若「技術面」與「籌碼面」衝突，請指出誰是雜訊。
-   - **量價解讀：** 分析當前成交量是否足以支撐股價。
+        if summary:
+            # 1. Portfolio figures (losses as positive amounts)
+            label = f"{confidence:.0%} / {horizon} 日"
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric(f"持股市值 ({summary['currency']})", f"{summary['value']:,.0f}")
+            m2.metric(f"歷史 VaR ({label})", f"{summary['hist_var']:,.0f}", f"{summary['hist_var_pct']:.2f}% 權益",
+                      delta_color="off")
+            m3.metric(f"歷史 CVaR ({label})", f"{summary['hist_cvar']:,.0f}", f"{summary['hist_cvar_pct']:.2f}% 權益",
+                      delta_color="off")
+            m4.metric("參數 VaR / CVaR", f"{summary['param_var']:,.0f}", f"CVaR {summary['param_cvar']:,.0f}",
+                      delta_color="off")
+            st.caption(f"{summary['positions']} 檔持股、{summary['scenarios']} 個歷史情境；"
+                       f"全部觸及 {portfolio.ATR_MULTIPLE:g} ATR 停損的損失合計 {summary['stop_risk']:,.0f}。")
 
-**3. 實戰交易計畫 (Actionable Trading Plan)**
-   - **關鍵點位：** 標出最重要的支撐與壓力價位 (可參考 CDP: AH={metrics['pivots']['ah']:.2f}, AL={metrics['pivots']['al']:.2f})。
-   - **進場策略 (Entry):** 設定具體的「安全進場區間」。
-   - **獲利目標 (Take Profit):** 設定 T1 (短線) 與 T2 (波段) 目標價。
-   - **停損防守 (Stop Loss):** 設定一個基於技術面跌破的具體價格。
+            # 2. Positions: risk contribution + ATR sizing
+            cols = ["name", "shares", "close", "value", "weight", "cvar_contrib", "cvar_share", "var_contrib",
+                    "atr", "stop_loss", "stop_risk", "target_shares", "target_value"]
+            num = lambda label, fmt="%,.0f": st.column_config.NumberColumn(label, format=fmt)
+            st.markdown("**📊 部位風險貢獻與 ATR 建議部位**")
+            st.dataframe(positions[cols], use_container_width=True,
+                         column_config={"shares": num("股數"), "close": num("收盤", "%.2f"), "value": num("市值"),
+                                        "weight": num("權重 (%)", "%.1f"), "cvar_contrib": num("CVaR 貢獻"),
+                                        "cvar_share": num("CVaR 占比 (%)", "%.1f"), "var_contrib": num("成分 VaR"),
+                                        "atr": num("ATR", "%.2f"), "stop_loss": num("停損價", "%.2f"),
+                                        "stop_risk": num("停損風險"), "target_shares": num("建議股數"),
+                                        "target_value": num("建議金額")})
+            st.bar_chart(positions["cvar_share"].head(20))
 
-請保持輸出格式整潔，重點數據請加粗顯示。
-"""
-    return prompt.strip()
+        if bad_lines:
+            st.warning("⚠️ 以下持股行無法解析：\n" + "\n".join(f"- {line}" for line in bad_lines))
+        if failures:
+            st.warning("⚠️ 以下代號無法分析：\n" + "\n".join(f"- {t}: {reason}" for t, reason in failures.items()))
 
-if run_btn:
-    real_ticker, user_input_display = process_ticker(ticker_input)
-    
-    with st.spinner(f"正在運算 {user_input_display} ({real_ticker}) 的機構級模型..."):
-        df, metrics = stock_analysis.analyze_stock(real_ticker)
-        
-        if metrics:
-            if real_ticker == "^TWII":
-                st.warning("⚠️ 注意：因免費數據源限制，目前使用『加權指數 (^TWII)』作為台指期走勢的替代分析參考。")
-            
-            # Construct Display Name with Fetched Chinese Name
-            stock_name = metrics.get('name', '')
-            # If name is same as ticker (fetch failed), just use ticker
-            full_display_name = f"{metrics['symbol']} {stock_name}" if stock_name != metrics['symbol'] else f"{metrics['symbol']}"
-            
-            # 1. Scorecard Section (NEW)
-            st.subheader("📊 Bull/Bear Scorecard (多空評分卡)")
-            score = metrics.get('score', 5.0)
-            score_class = "bull-score" if score >= 7 else "bear-score" if score <= 3 else "neutral-score"
-            st.markdown(f'<div class="score-box {score_class}">\n'
-                        f'   <h2 style="margin:0;">量化綜效評分 (QUANT SCORE): {score:.1f}/10</h2>\n'
-                        f'</div>', unsafe_allow_html=True)
-            st.progress(score/10)
-            
-            # Layout: KPI - Split into 2x2 grid for better Mobile/Portrait view
-            # Row 1
-            col1, col2 = st.columns(2)
-            col1.metric("收盤價 (Close)", f"{metrics['close']:.2f}", 
-                        delta=f"{(metrics['close']-metrics['prev_close']):.2f} ({(metrics['close']-metrics['prev_close'])/metrics['prev_close']*100:.1f}%)")
-            col2.metric("趨勢 (Trend)", f"{metrics['trend']}")
-            
-            # Row 2
-            col3, col4 = st.columns(2)
-            col3.metric("量能狀態 (Vol)", f"{metrics['volume']/metrics['mv5']:.1f}x 均量", 
-                        delta=f"{metrics['vol_change']:.1f}% vs 昨日", delta_color="off")
-            col4.metric("K線型態 (Pattern)", metrics['pattern'])
-            
-            # Chart
-            st.subheader(f"📊 {full_display_name} 股價走勢與布林通道")
-            fig = go.Figure()
-            fig.add_trace(go.Candlestick(x=df.index,
-                            open=df['Open'], high=df['High'],
-                            low=df['Low'], close=df['Close'], name='OHLC'))
-            fig.add_trace(go.Scatter(x=df.index, y=df['MA20'], line=dict(color='orange', width=1), name='MA20 (月線)'))
-            fig.add_trace(go.Scatter(x=df.index, y=df['BB_Up'], line=dict(color='gray', dash='dash'), name='布林上軌'))
-            fig.add_trace(go.Scatter(x=df.index, y=df['BB_Low'], line=dict(color='gray', dash='dash'), name='布林下軌'))
-            fig.update_layout(height=500, xaxis_rangeslider_visible=False, template="plotly_dark")
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Divide into Tabs for Report vs AI Bridge
-            tab1, tab2 = st.tabs(["📄 即時策略報告", "🤖 AI 橋接咒語 (Institutional Grade)"])
-            
-            with tab1:
-                st.markdown('<div class="report-box">', unsafe_allow_html=True)
-                report_md = generate_rule_based_report(metrics, full_display_name)
-                st.markdown(report_md)
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-            with tab2:
-                st.markdown("### 🧬 AI 橋接咒語 (Prompt Bridge)")
-                st.info("此 Prompt 為「華爾街機構級」終極模板，包含 System Prompt, CDP 點位與完整數據。請全部複製貼給 LLM。")
-                prompt = generate_ai_prompt(metrics, full_display_name)
-                st.code(prompt, language="text")
-                
+# Debug panel last, so it includes the stages of this rerun
+if show_timings:
+    with st.sidebar:
+        st.subheader("🛠️ 效能除錯 (Timings)")
+        snap = instrumentation.snapshot()
+        if snap['stages']:
+            stages = pd.DataFrame.from_dict(snap['stages'], orient="index").sort_values("total_s", ascending=False)
+            st.dataframe(stages[["calls", "errors", "mean_ms", "p95_ms", "max_ms", "total_s"]],
+                         use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.1f")
+                                        for c in ["mean_ms", "p95_ms", "max_ms"]})
         else:
-            st.error(f"無法獲取數據 {real_ticker}。請檢查代號是否正確。")
+            st.caption("尚無紀錄 (QUANT_TIMING=0 時停用)。")
+        if snap['counters']:
+            st.caption(" | ".join(f"{k}: {v}" for k, v in snap['counters'].items()))
+        col_a, col_b = st.columns(2)
+        col_a.download_button("匯出 JSON", json.dumps(snap, indent=2), file_name="timings.json",
+                              mime="application/json")
+        if col_b.button("重設"):
+            instrumentation.get_default_registry().reset()
+            st.rerun()
+
+# Whole script, reported in the debug panel from the next run on
+state = process_state()
+instrumentation.record("app.cold_start" if state["runs"] == 0 else "app.rerun", time.perf_counter() - _script_start)
+state["runs"] += 1
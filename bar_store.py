@@ -0,0 +1,433 @@
+import contextlib
+import os
+import re
+import json
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError: # Windows: only the in-process lock applies
+    fcntl = None
+
+import instrumentation
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Bar sizes kept on disk; higher timeframes are resampled from these (see timeframes.py)
+BASE_INTERVALS = ("1d", "5m")
+
+# Serializes catalog read-modify-write between threads (API pool, sessions, scheduler)
+_CATALOG_LOCK = threading.Lock()
+
+def temp_path(path):
+    """
+    Per-process, per-thread temporary name next to `path` (written, then `os.replace`d).
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+# Root folder of the on-disk store (override with QUANT_DATA_DIR)
+DEFAULT_DATA_DIR = os.environ.get(
+    "QUANT_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".quant_data"))
+
+def period_start(period, now=None):
+    """
+    Converts a yfinance style period ("5d", "6mo", "1y", "max") to a start Timestamp.
+    Returns None for "max".
+    """
+    if period == "max": return None
+    now = pd.Timestamp(now or pd.Timestamp.today()).normalize()
+    m = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not m: raise ValueError(f"Unsupported period: {period}")
+    n, unit = int(m.group(1)), m.group(2)
+    offset = {"d": pd.DateOffset(days=n), "wk": pd.DateOffset(weeks=n),
+              "mo": pd.DateOffset(months=n), "y": pd.DateOffset(years=n)}[unit]
+    return now - offset
+
+def normalize_bars(df):
+    """
+    Brings provider output to the canonical store layout:
+    flat OHLCV columns (float64 prices, int64 volume), tz-naive sorted DatetimeIndex without duplicates.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS, dtype=float, index=pd.DatetimeIndex([], name="Date"))
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df[[c for c in OHLCV_COLUMNS if c in df.columns]].astype(float)
+    df.index = pd.DatetimeIndex(df.index)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df.index.name = "Date"
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    df = df.dropna(subset=["Close"])
+    if "Volume" in df.columns:
+        df["Volume"] = df["Volume"].fillna(0).astype("int64")
+    return df
+
+class YFinanceProvider:
+    """
+    Default data source backed by yfinance (imported on first use: it is the slowest
+    import of the app's cold start).
+    """
+    def fetch(self, symbol, start=None, period="1y", interval="1d"):
+        import yfinance as yf
+        if start is not None:
+            df = yf.download(symbol, start=start, interval=interval, progress=False)
+        else:
+            df = yf.download(symbol, period=period, interval=interval, progress=False)
+        return normalize_bars(df)
+
+    def fetch_many(self, symbols, start=None, period="1y", interval="1d"):
+        """
+        One batched download for several symbols sharing the same start.
+        Returns: Dictionary of symbol -> DataFrame
+        """
+        import yfinance as yf
+        symbols = list(symbols)
+        if start is not None:
+            raw = yf.download(symbols, start=start, interval=interval, progress=False, group_by="column")
+        else:
+            raw = yf.download(symbols, period=period, interval=interval, progress=False, group_by="column")
+        out = {}
+        for s in symbols:
+            if raw.empty or not isinstance(raw.columns, pd.MultiIndex) or s not in raw.columns.get_level_values(1):
+                out[s] = normalize_bars(None)
+            else:
+                out[s] = normalize_bars(raw.xs(s, axis=1, level=1))
+        return out
+
+class FixtureProvider:
+    """
+    Offline data source reading `<symbol>.csv` or `<symbol>.parquet` files from a folder
+    (intraday bars: `<symbol>@5m.parquet`). Used for tests and demos without network access.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start=None, period="1y", interval="1d"):
+        name = _file_name(symbol, interval)
+        parquet = os.path.join(self.directory, f"{name}.parquet")
+        csv = os.path.join(self.directory, f"{name}.csv")
+        if os.path.exists(parquet):
+            df = pd.read_parquet(parquet)
+        elif os.path.exists(csv):
+            df = pd.read_csv(csv, index_col=0, parse_dates=True)
+        else:
+            return normalize_bars(None)
+        df = normalize_bars(df)
+        start = pd.Timestamp(start) if start is not None else period_start(period, now=df.index[-1] if len(df) else None)
+        return df[df.index >= start] if start is not None else df
+
+    def fetch_many(self, symbols, start=None, period="1y", interval="1d"):
+        return {s: self.fetch(s, start=start, period=period, **_interval_kw(interval)) for s in symbols}
+
+def _safe_name(symbol):
+    # "^TWII" -> "_TWII", keeps dots so "2330.TW" stays readable
+    return re.sub(r"[^A-Za-z0-9.\-]", "_", symbol)
+
+def _file_name(symbol, interval="1d"):
+    # Daily bars keep the original file name; other bar sizes get an "@<interval>" suffix
+    return _safe_name(symbol) if interval == "1d" else f"{_safe_name(symbol)}@{interval}"
+
+def _catalog_key(symbol, interval="1d"):
+    return symbol if interval == "1d" else f"{symbol}@{interval}"
+
+def _interval_kw(interval):
+    # Daily requests keep the original provider call, so providers without intraday support still work
+    return {} if interval == "1d" else {"interval": interval}
+
+class BarStore:
+    """
+    Persistent per-symbol OHLCV store (one Parquet file per symbol and base interval).
+    Only the missing tail since the last stored bars is fetched, so restarts and
+    refreshes cost one small download instead of a full year.
+    A request reaching further back than anything fetched before (e.g. 5y for weekly bars)
+    triggers one full download for that period.
+    """
+    def __init__(self, root=DEFAULT_DATA_DIR, provider=None, min_refresh_seconds=300):
+        self.root = root
+        self.provider = provider or YFinanceProvider()
+        self.min_refresh_seconds = min_refresh_seconds
+        os.makedirs(os.path.join(root, "bars"), exist_ok=True)
+        self._catalog_path = os.path.join(root, "catalog.json")
+
+    # ---- catalog (aliases + last fetch time + earliest requested start + looked-up names) ----
+    def _read_catalog(self):
+        try:
+            with open(self._catalog_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"aliases": {}, "fetched_at": {}, "history_from": {}}
+
+    def _write_catalog(self, catalog):
+        tmp = temp_path(self._catalog_path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._catalog_path)
+
+    @contextlib.contextmanager
+    def _catalog_lock(self):
+        """
+        Exclusive catalog access: a thread lock plus an flock on `catalog.json.lock`
+        (other processes sharing the data folder).
+        """
+        with _CATALOG_LOCK:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self._catalog_path}.lock", "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _update_catalog(self, fetched=(), aliases=None, history_from=None, names=None):
+        with self._catalog_lock():
+            catalog = self._read_catalog()
+            catalog.setdefault("aliases", {}).update(aliases or {})
+            catalog.setdefault("history_from", {}).update(history_from or {})
+            catalog.setdefault("names", {}).update(names or {})
+            now = time.time()
+            for key in fetched:
+                catalog.setdefault("fetched_at", {})[key] = now
+            self._write_catalog(catalog)
+
+    def resolve(self, symbol):
+        """
+        Maps a requested symbol to the one actually stored (e.g. "6488.TW" -> "6488.TWO").
+        """
+        return self._read_catalog()["aliases"].get(symbol, symbol)
+
+    def fetched_at(self, symbol, interval="1d"):
+        """
+        Time of the last download of `symbol`'s bars (None if never fetched).
+        """
+        catalog = self._read_catalog()
+        resolved = catalog["aliases"].get(symbol, symbol)
+        return catalog.get("fetched_at", {}).get(_catalog_key(resolved, interval))
+
+    def name(self, symbol):
+        """
+        Name saved by `save_name`.
+        Returns: name, "" when the lookup found none, None when never looked up
+        """
+        return self._read_catalog().get("names", {}).get(symbol)
+
+    def save_name(self, symbol, name):
+        """
+        Remembers an online name lookup (None = not found), so each symbol is looked up once.
+        """
+        self._update_catalog(names={symbol: name or ""})
+
+    # ---- raw file access ----
+    def path(self, symbol, interval="1d"):
+        return os.path.join(self.root, "bars", f"{_file_name(symbol, interval)}.parquet")
+
+    def read(self, symbol, start=None, interval="1d"):
+        """
+        Reads stored bars straight from disk (no network).
+        """
+        return self._read_resolved(self.resolve(symbol), start, interval)
+
+    def _read_resolved(self, symbol, start=None, interval="1d"):
+        """
+        `read` for a symbol that is already resolved (batch paths resolve once per catalog read).
+        """
+        path = self.path(symbol, interval)
+        if not os.path.exists(path): return normalize_bars(None)
+        df = pd.read_parquet(path)
+        return df[df.index >= pd.Timestamp(start)] if start is not None else df
+
+    def write(self, symbol, df, interval="1d"):
+        path = self.path(symbol, interval)
+        tmp = temp_path(path)
+        df.to_parquet(tmp)
+        os.replace(tmp, path)
+
+    # ---- incremental sync ----
+    def _is_fresh(self, key, catalog, max_age=None):
+        fetched_at = catalog.get("fetched_at", {}).get(key)
+        max_age = self.min_refresh_seconds if max_age is None else max_age
+        return fetched_at is not None and time.time() - fetched_at < max_age
+
+    def _covers(self, key, df, start, catalog):
+        """
+        Whether the stored history already reaches back to `start` (None = "max").
+        """
+        recorded = catalog.get("history_from", {}).get(key)
+        if recorded is not None:
+            return recorded == "max" or (start is not None and pd.Timestamp(recorded) <= start)
+        # Stores written before the history marker: trust the data (a week of slack for holidays)
+        return start is not None and df.index[0] <= start + pd.Timedelta(days=7)
+
+    def _merge(self, symbol, stored, tail, interval="1d"):
+        if tail.empty: return stored
+        if len(stored) > 1:
+            # The tail starts on the last *completed* stored bar. A changed close there means the
+            # provider re-adjusted history (dividend / split), so the stored series is replaced.
+            overlap = stored.index.intersection(tail.index[:1])
+            if len(overlap) and not _close_enough(stored.loc[overlap, "Close"], tail.loc[overlap, "Close"]):
+                full = self.provider.fetch(symbol, start=stored.index[0], **_interval_kw(interval))
+                return full if not full.empty else stored
+        merged = pd.concat([stored[stored.index < tail.index[0]], tail])
+        return merged
+
+    def _fetch_tail(self, group, start, period, interval="1d"):
+        if len(group) > 1:
+            return self.provider.fetch_many(group, start=start, period=period, **_interval_kw(interval))
+        return {group[0]: self.provider.fetch(group[0], start=start, period=period, **_interval_kw(interval))}
+
+    def _fetch_initial(self, group, period, interval="1d"):
+        """
+        Full download for symbols without history, with the .TW -> .TWO (OTC) fallback.
+        Returns: (Dictionary of stored symbol -> DataFrame, Dictionary of new aliases)
+        """
+        if hasattr(self.provider, "probe_many"):
+            # Provider probes both listings concurrently
+            probed = self.provider.probe_many(group, period=period, **_interval_kw(interval))
+            frames = {alt: df for alt, df in probed.values()}
+            aliases = {r: alt for r, (alt, df) in probed.items() if alt != r}
+            return frames, aliases
+
+        frames = self._fetch_tail(group, None, period, interval)
+        # Fallback Logic: empty .TW symbols are retried as OTC (.TWO)
+        retry = {r: r.replace(".TW", ".TWO") for r in group if frames[r].empty and r.endswith(".TW")}
+        aliases = {}
+        if retry:
+            print(f"Retry with OTC ticker: {', '.join(retry.values())}")
+            with instrumentation.stage("store.otc_retry"):
+                alt_frames = self.provider.fetch_many(list(retry.values()), period=period, **_interval_kw(interval))
+            for r, alt in retry.items():
+                if not alt_frames[alt].empty:
+                    aliases[r] = alt
+                    frames[alt] = alt_frames[alt]
+        return frames, aliases
+
+    def sync(self, symbol, period="1y", interval="1d"):
+        """
+        Brings one symbol up to date on disk and returns the resolved symbol.
+        Handles the .TW -> .TWO (OTC) fallback and remembers it as an alias.
+        """
+        return self.sync_many([symbol], period=period, interval=interval)[symbol]
+
+    @instrumentation.timed("store.sync")
+    def sync_many(self, symbols, period="1y", interval="1d", max_age=None):
+        """
+        Brings several symbols up to date using batched provider calls:
+        symbols are grouped by their missing-tail start date.
+        `max_age` (seconds) overrides `min_refresh_seconds` for this call (0 forces the fetch).
+        Returns: Dictionary of requested symbol -> resolved symbol (None if no data)
+        """
+        return self._sync_many(symbols, period, interval, max_age)[0]
+
+    def _sync_many(self, symbols, period, interval, max_age=None):
+        """
+        `sync_many` that also hands back the stored bars it read and left unchanged, so
+        `load_many` does not read every fresh file a second time.
+        Returns: (Dictionary of requested symbol -> resolved symbol, Dictionary of resolved symbol -> DataFrame)
+        """
+        catalog = self._read_catalog()
+        resolved = {s: catalog["aliases"].get(s, s) for s in symbols}
+        stored = {r: self._read_resolved(r, interval=interval) for r in set(resolved.values())}
+        wanted = period_start(period)
+
+        # 1. Group stale symbols by tail start. Full downloads: "initial" for symbols without
+        #    history (with the OTC probe), "backfill" when the request reaches further back
+        #    than anything fetched before (listing already known)
+        groups = {}
+        for r, df in stored.items():
+            key = _catalog_key(r, interval)
+            if df.empty:
+                groups.setdefault("initial", []).append(r)
+            elif not self._covers(key, df, wanted, catalog):
+                groups.setdefault("backfill", []).append(r)
+            elif not self._is_fresh(key, catalog, max_age):
+                # Re-fetch the last two stored bars: the previous one is the adjustment check,
+                # the latest one may have been a partial intraday bar
+                groups.setdefault(df.index[max(len(df) - 2, 0)], []).append(r)
+        stale = sum(len(g) for g in groups.values())
+        instrumentation.count("store.fresh", len(stored) - stale)
+        instrumentation.count("store.stale", stale)
+
+        fetched, new_aliases, history_from = [], {}, {}
+        for start, group in groups.items():
+            full = start in ("initial", "backfill")
+            with instrumentation.stage("store.fetch_" + (start if full else "tail")):
+                if start == "initial":
+                    frames, aliases = self._fetch_initial(group, period, interval)
+                else:
+                    frames, aliases = self._fetch_tail(group, None if full else start, period, interval), {}
+            if aliases: instrumentation.count("store.otc_alias", len(aliases))
+            for r, alt in aliases.items():
+                stored[alt] = self._read_resolved(alt, interval=interval)
+            new_aliases.update(aliases)
+
+            for r, tail in frames.items():
+                # Failed downloads come back empty: not stamped, so the next sync retries them
+                if tail.empty: continue
+                fetched.append(_catalog_key(r, interval))
+                if full:
+                    history_from[_catalog_key(r, interval)] = "max" if wanted is None else wanted.isoformat()
+                with instrumentation.stage("store.merge_write"):
+                    merged = self._merge(r, stored.get(r, normalize_bars(None)), tail, interval)
+                    self.write(r, merged, interval)
+                stored.pop(r, None) # re-read, so loads see exactly what is on disk
+
+        if fetched or new_aliases:
+            self._update_catalog(fetched=fetched, aliases=new_aliases, history_from=history_from)
+        out = {}
+        for s in symbols:
+            r = new_aliases.get(s, resolved[s])
+            out[s] = r if os.path.exists(self.path(r, interval)) else None
+        return out, stored
+
+    def load(self, symbol, period="1y", interval="1d"):
+        """
+        Syncs then reads the requested window from disk.
+        Returns: (DataFrame, resolved symbol) - DataFrame is empty when no data exists
+        """
+        return self.load_many([symbol], period=period, interval=interval)[symbol]
+
+    def load_many(self, symbols, period="1y", interval="1d"):
+        """
+        Batched version of `load`.
+        Returns: Dictionary of requested symbol -> (DataFrame, resolved symbol)
+        """
+        with instrumentation.stage("store.sync"):
+            resolved, frames = self._sync_many(symbols, period, interval)
+        out = {}
+        for s, r in resolved.items():
+            if r is None:
+                out[s] = (normalize_bars(None), s)
+                continue
+            df = frames[r] if r in frames else self._read_resolved(r, interval=interval)
+            # Window is anchored on the last stored bar so offline fixtures never go stale
+            start = period_start(period, now=df.index[-1]) if len(df) else None
+            out[s] = (df[df.index >= start] if start is not None else df, r)
+        return out
+
+def _close_enough(a, b, rtol=1e-6):
+    a, b = float(a.iloc[0]), float(b.iloc[0])
+    return abs(a - b) <= rtol * max(abs(a), abs(b), 1.0)
+
+_default_store = None
+
+def get_default_store():
+    """
+    Process-wide store shared by `analyze_stock` / `analyze_universe`.
+    """
+    global _default_store
+    if _default_store is None:
+        import fetcher  # fetcher builds on this module
+        _default_store = BarStore(provider=fetcher.AsyncProvider())
+    return _default_store
+
+def set_default_store(store):
+    """
+    Swaps the process-wide store (e.g. a BarStore over a FixtureProvider for offline tests).
+    """
+    global _default_store
+    _default_store = store
@@ -0,0 +1,148 @@
+"""
+Headless batch renderer: rule-based reports and AI prompts for a whole universe.
+
+    python batch_report.py 2330 2317 6488 --out reports/
+    python batch_report.py --file universe.txt --format md,json --workers 8
+
+1. One batched bar-store sync for the universe (skipped with --no-prefetch).
+2. Symbols are analysed in a process pool; each worker writes `<symbol>.md` / `<symbol>.json`
+   as soon as its symbol is done, so nothing accumulates in the parent.
+3. Progress is printed per finished symbol; a timing / failure summary is printed at the end
+   and written to `summary.json`.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import bar_store
+import reports
+import stock_analysis
+import symbol_master
+
+FORMATS = ("md", "json")
+
+def _write(path, text):
+    tmp = bar_store.temp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def render_symbol(ticker, out_dir, formats=FORMATS):
+    """
+    Analyses one symbol and writes its output files.
+    Returns: Dictionary with symbol, resolved, seconds, error, files
+    """
+    t0 = time.perf_counter()
+    row = {"symbol": ticker, "resolved": None, "score": None, "seconds": None, "error": None, "files": []}
+    try:
+        df, metrics = stock_analysis.analyze_stock(ticker)
+        if not metrics: raise ValueError("no data")
+        name = reports.display_name(metrics)
+        report_md = reports.generate_rule_based_report(metrics, name)
+        prompt = reports.generate_ai_prompt(metrics, name)
+        base = os.path.join(out_dir, bar_store._safe_name(metrics['symbol']))
+        if "md" in formats:
+            _write(base + ".md", f"{report_md.strip()}\n\n---\n\n{prompt}\n")
+            row["files"].append(base + ".md")
+        if "json" in formats:
+            payload = {"symbol": metrics['symbol'], "name": metrics.get('name'), "metrics": metrics,
+                       "report_md": report_md.strip(), "ai_prompt": prompt}
+            _write(base + ".json", json.dumps(payload, ensure_ascii=False, indent=1, default=str))
+            row["files"].append(base + ".json")
+        row.update(resolved=metrics['symbol'], score=float(metrics.get('score', 0)))
+    except Exception as e:
+        row["error"] = str(e)
+    row["seconds"] = time.perf_counter() - t0
+    return row
+
+def run_batch(tickers, out_dir, formats=FORMATS, workers=None, prefetch=True, on_result=None):
+    """
+    Renders every ticker over a process pool (workers=1 runs in-process).
+    `on_result(row)` is called in the parent as each symbol finishes.
+    Returns: (list of result rows in completion order, wall-clock seconds)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    if prefetch:
+        try:
+            bar_store.get_default_store().sync_many(tickers)
+        except Exception as e:
+            print(f"Error prefetching bars: {e}")
+
+    rows = []
+    def collect(row):
+        rows.append(row)
+        if on_result: on_result(row)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for t in tickers:
+            collect(render_symbol(t, out_dir, formats))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_symbol, t, out_dir, formats) for t in tickers]
+            for future in as_completed(futures):
+                collect(future.result())
+    return rows, time.perf_counter() - t0
+
+def summarize(rows, wall):
+    """
+    Returns: summary text (totals, slowest symbols, failures)
+    """
+    ok = [r for r in rows if not r["error"]]
+    failed = [r for r in rows if r["error"]]
+    seconds = sorted(r["seconds"] for r in rows)
+    lines = [f"Done: {len(ok)}/{len(rows)} symbols in {wall:.1f}s wall"]
+    if seconds:
+        p50 = seconds[len(seconds) // 2]
+        p95 = seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))]
+        lines.append(f"Per symbol: mean {sum(seconds) / len(seconds):.2f}s | p50 {p50:.2f}s | p95 {p95:.2f}s | max {seconds[-1]:.2f}s")
+    slowest = sorted(rows, key=lambda r: r["seconds"], reverse=True)[:5]
+    lines.append("Slowest: " + ", ".join(f"{r['symbol']} {r['seconds']:.2f}s" for r in slowest))
+    if failed:
+        lines.append(f"Failures ({len(failed)}):")
+        lines.extend(f"  {r['symbol']}: {r['error']}" for r in failed)
+    return "\n".join(lines)
+
+def _read_universe(args):
+    tokens = list(args.tickers)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            tokens += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    # De-duplicate after normalization, keep order
+    return list(dict.fromkeys(symbol_master.parse_ticker_list(" ".join(tokens))))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tickers", nargs="*", help="codes, symbols or names (e.g. 2330 6488.TWO 台積電)")
+    parser.add_argument("--file", help="one ticker per line")
+    parser.add_argument("--out", default="reports", help="output folder")
+    parser.add_argument("--format", default="md,json", help="comma separated: md, json")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--no-prefetch", action="store_true", help="let each worker sync its own bars")
+    args = parser.parse_args(argv)
+
+    universe = _read_universe(args)
+    if not universe:
+        parser.error("no tickers given")
+    formats = tuple(f for f in args.format.split(",") if f in FORMATS)
+
+    done = [0]
+    def progress(row):
+        done[0] += 1
+        status = f"score {row['score']:.1f}" if not row["error"] else f"FAILED: {row['error']}"
+        print(f"[{done[0]}/{len(universe)}] {row['symbol']} {row['seconds']:.2f}s {status}", flush=True)
+
+    rows, wall = run_batch(universe, args.out, formats=formats, workers=args.workers,
+                           prefetch=not args.no_prefetch, on_result=progress)
+    print()
+    print(summarize(rows, wall))
+    with open(os.path.join(args.out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump({"wall_seconds": wall, "symbols": rows}, f, ensure_ascii=False, indent=1)
+    return 0 if all(not r["error"] for r in rows) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
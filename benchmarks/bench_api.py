@@ -0,0 +1,93 @@
+"""
+Latency benchmark of `api_server` against the fake Yahoo server (no network).
+
+    python -m benchmarks.bench_api [--symbols 50] [--requests 2000] [--clients 8]
+
+1. Cold: first request per symbol (download + indicators), then a batch request.
+2. Warm: `--clients` keep-alive clients hammer metrics / pivots / series endpoints of
+   cached symbols; reports p50 / p99 per endpoint (the target is low milliseconds).
+"""
+import argparse
+import http.client
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import api_server
+import bar_store
+import fetcher
+import result_cache
+from benchmarks.fake_server import FakeYahooServer, fake_universe
+from benchmarks.fixtures import temp_history
+
+def _get(conn, path):
+    t0 = time.perf_counter()
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status != 200:
+        raise RuntimeError(f"{path}: HTTP {resp.status} {body[:200]!r}")
+    return time.perf_counter() - t0
+
+def _client(port, paths, out):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for kind, path in paths:
+        out.append((kind, _get(conn, path)))
+    conn.close()
+
+def _report(label, seconds):
+    ms = np.asarray(seconds) * 1000
+    print(f"{label:<14} n={len(ms):<5} p50 {np.percentile(ms, 50):7.2f} ms | p99 {np.percentile(ms, 99):7.2f} ms | max {ms.max():7.2f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake download latency (s)")
+    args = parser.parse_args(argv)
+
+    requested, frames, names = fake_universe(args.symbols)
+    root = tempfile.mkdtemp()
+    with FakeYahooServer(frames, names, latency=args.latency) as yahoo, temp_history(root):
+        fetcher.set_default_fetcher(fetcher.AsyncFetcher(fetcher.YahooChartSource(yahoo.url)))
+        bar_store.set_default_store(bar_store.BarStore(root=root, provider=fetcher.AsyncProvider()))
+        hot = api_server.HotCache(ttl=3600, cache=result_cache.ResultCache(result_cache.MemoryBackend()))
+        server = api_server.make_server(port=0, hot=hot)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        # 1. Cold
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        half = len(requested) // 2
+        cold = [_get(conn, f"/v1/metrics/{s}") for s in requested[:half]]
+        _report("cold single", cold)
+        _report("cold batch", [_get(conn, "/v1/metrics?symbols=" + ",".join(requested[half:]))])
+        conn.close()
+
+        # 2. Warm
+        rng = random.Random(0)
+        templates = [("metrics", "/v1/metrics/{}"), ("pivots", "/v1/pivots/{}"),
+                     ("series", "/v1/series/{}?columns=Close,RSI,MACD&tail=120"),
+                     ("series arrow", "/v1/series/{}?columns=Close,RSI,MACD&tail=120&format=arrow")]
+        per_client = args.requests // args.clients
+        results, threads = [], []
+        t0 = time.perf_counter()
+        for _ in range(args.clients):
+            paths = [(kind, tpl.format(rng.choice(requested)))
+                     for kind, tpl in (rng.choice(templates) for _ in range(per_client))]
+            threads.append(threading.Thread(target=_client, args=(port, paths, results)))
+            threads[-1].start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+        for kind, _ in templates:
+            _report(f"warm {kind}", [s for k, s in results if k == kind])
+        print(f"Throughput: {len(results) / wall:.0f} req/s with {args.clients} clients | hot cache {hot.stats()}")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold-start and rerun timings of the Streamlit app against the fake Yahoo server (no network).
+
+    python -m benchmarks.bench_app [--reruns 20]
+
+The app runs in a fresh interpreter (so module imports count towards the cold start)
+through `streamlit.testing`:
+1. cold start   first script run of the process (imports, CSS, empty tabs)
+2. analysis     the "run" button for one symbol (download, indicators, figure, report)
+3. reruns       `--reruns` widget interactions that do not change the analysed bar
+                (the case a user hits on every click); p50 / max per rerun
+Per-stage totals from `instrumentation` (app.imports, app.render.*) are printed after.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child(reruns):
+    """
+    Runs inside the fresh interpreter. Returns: Dictionary of timings
+    """
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.run()
+    cold = time.perf_counter() - t0
+
+    at.sidebar.text_input[0].set_value("1000")
+    t0 = time.perf_counter()
+    at.sidebar.button[0].click().run()
+    analysis = time.perf_counter() - t0
+
+    # Toggling the debug panel reruns the whole script without touching the analysis
+    import instrumentation
+    instrumentation.get_default_registry().reset()
+    timings_box = [c for c in at.sidebar.checkbox if "Timings" in c.label][0]
+    times = []
+    for i in range(reruns):
+        t0 = time.perf_counter()
+        timings_box.set_value(i % 2 == 0).run()
+        times.append(time.perf_counter() - t0)
+    errors = [str(e.value) for e in at.exception]
+    return {"cold": cold, "analysis": analysis, "reruns": sorted(times), "errors": errors,
+            "stages": {k: v["total_s"] for k, v in instrumentation.snapshot()["stages"].items()}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(child(args.reruns)))
+        return
+
+    from benchmarks.fake_server import FakeYahooServer, fake_universe
+    from benchmarks.fixtures import synthetic_intraday
+    _, frames, names = fake_universe(4)
+    # Recent intraday bars, so the 60m timeframe falls inside the default lookback
+    recent = (pd.Timestamp.today().normalize() - pd.Timedelta(days=30)).strftime("%Y-%m-%d")
+    intraday = {s: synthetic_intraday(seed=i, start=recent) for i, s in enumerate(frames)}
+    with FakeYahooServer(frames, names, intraday=intraday) as yahoo:
+        env = dict(os.environ, QUANT_YAHOO_URL=yahoo.url, QUANT_DATA_DIR=tempfile.mkdtemp())
+        proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_app", "--child", "--reruns", str(args.reruns)],
+                              cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    reruns = result["reruns"]
+    print(f"cold start   {result['cold'] * 1000:8.1f} ms")
+    print(f"analysis     {result['analysis'] * 1000:8.1f} ms")
+    if reruns:
+        print(f"rerun        {reruns[len(reruns) // 2] * 1000:8.1f} ms p50 | {reruns[-1] * 1000:8.1f} ms max (n={len(reruns)})")
+    for name, total in sorted(result["stages"].items(), key=lambda kv: -kv[1]):
+        print(f"  {name:<28} {total * 1000 / max(len(reruns), 1):8.2f} ms / rerun")
+    for error in result["errors"]:
+        print(f"app exception: {error}")
+
+if __name__ == "__main__":
+    main()
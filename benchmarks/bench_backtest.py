@@ -0,0 +1,100 @@
+"""
+Parity check + benchmark of the vectorized backtest signals.
+
+    python -m benchmarks.bench_backtest [--bars 2500] [--symbols 1000]
+
+1. Verifies that `backtest.signals` on a union-calendar panel with holes (suspensions,
+   symbols listed later) gives, for every symbol and bar, the score, CDP levels and ATR of
+   the single-symbol pipeline (`compute_indicators` + `build_metrics`, as in
+   `compute_stock`) run on that symbol's own bars (exits 1 on mismatch).
+2. Reports the time of `run_backtest` over a synthetic universe with the same kind of gaps.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import backtest
+import stock_analysis
+from benchmarks.fixtures import synthetic_frame, synthetic_panel
+
+RTOL, ATOL = 1e-9, 1e-9
+
+def gapped_panel(frames):
+    """
+    Union-calendar panel (field -> date x ticker DataFrame) of single-symbol frames.
+    """
+    return {f: pd.concat({t: df[f] for t, df in frames.items()}, axis=1).sort_index().astype(float)
+            for f in stock_analysis.OHLCV_FIELDS}
+
+def check_gaps(n_bars=300, seeds=range(3)):
+    """
+    Returns: list of (symbol, field, mismatching bars) for every difference found
+    """
+    frames = {}
+    for seed in seeds:
+        df = synthetic_frame(n_bars=n_bars, seed=seed)
+        if seed % 3 == 1: df = df.drop(df.index[100:110])  # 10-day suspension
+        if seed % 3 == 2: df = df.iloc[40:]                # listed later
+        frames[f"S{seed}"] = df
+    panel = gapped_panel(frames)
+    arrays, index, tickers = backtest.panel_arrays(panel)
+    sig = backtest.signals(arrays)
+
+    failures = []
+    for j, t in enumerate(tickers):
+        df = frames[t].copy()
+        for col, values in stock_analysis.compute_indicators(df['High'], df['Low'], df['Close'], df['Volume']).items():
+            df[col] = values
+        ref = {"score": [np.nan], "nl": [np.nan], "nh": [np.nan]}
+        for i in range(1, len(df)):
+            m = stock_analysis.build_metrics(df.iloc[i], df.iloc[i - 1], df.index[i].date(), t, t, None, None, None,
+                                             divergences=("None", "None"))
+            ref["score"].append(m['score'])
+            ref["nl"].append(m['pivots']['nl'])
+            ref["nh"].append(m['pivots']['nh'])
+        ref["atr"] = df['ATR'].to_numpy(float)
+        rows = index.get_indexer(df.index)
+        for name, expected in ref.items():
+            got = sig[name][rows, j]
+            # The first bar has no previous bar in build_metrics
+            bad = ~np.isclose(got[1:], np.asarray(expected, dtype=float)[1:], rtol=RTOL, atol=ATOL, equal_nan=True)
+            if bad.any():
+                failures.append((t, name, int(bad.sum())))
+    return failures
+
+def run(n_bars, n_symbols, repeat=3):
+    data = synthetic_panel(n_symbols, n_bars=n_bars)
+    panel = {f: pd.DataFrame(data[f], index=data["index"]) for f in stock_analysis.OHLCV_FIELDS}
+    # Every 10th symbol suspended for 10 bars somewhere in the history
+    rng = np.random.default_rng(0)
+    for j in range(0, n_symbols, 10):
+        start = int(rng.integers(60, n_bars - 20))
+        for f in panel:
+            panel[f].iloc[start:start + 10, j] = np.nan
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        backtest.run_backtest(panel)
+        best = min(best, time.perf_counter() - t0)
+    print(f"run_backtest bars={n_bars} symbols={n_symbols}: {best:.2f} s")
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=2500)
+    parser.add_argument("--symbols", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    failures = check_gaps()
+    if failures:
+        print(f"MISMATCH: backtest signals differ from the single-symbol pipeline for {failures}")
+        return 1
+    print("gap check: backtest signals == single-symbol pipeline (score, NL, NH, ATR)")
+    run(args.bars, args.symbols)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Regression check + benchmark of the fused array kernel against the pandas reference.
+
+    python -m benchmarks.bench_indicators [--bars 250] [--symbols 1000]
+
+1. Verifies every kernel output matches `compute_indicators_pandas` (exits 1 on mismatch).
+2. Reports time per symbol (1-D call) and per 1000 symbols (one 2-D call vs. a pandas loop).
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import indicator_kernel
+import stock_analysis
+from benchmarks.fixtures import synthetic_frame, synthetic_panel
+
+RTOL, ATOL = 1e-9, 1e-9
+
+def check_regression(n_bars, seeds=range(5)):
+    """
+    Compares kernel vs pandas on several fixtures, incl. a suspended (flat) stretch.
+    Returns: list of (seed, field) pairs that mismatched
+    """
+    failures = []
+    for seed in seeds:
+        df = synthetic_frame(n_bars=n_bars, seed=seed)
+        if seed % 2 and n_bars > 60:
+            flat = df['Close'].iloc[30]
+            df.iloc[31:46, :4] = flat
+            df.iloc[31:46, 4] = 0
+        ref = stock_analysis.compute_indicators_pandas(df['High'], df['Low'], df['Close'], df['Volume'])
+        got = indicator_kernel.compute(df['High'].to_numpy(float), df['Low'].to_numpy(float),
+                                       df['Close'].to_numpy(float), df['Volume'].to_numpy(float))
+        for name in indicator_kernel.FIELDS:
+            if not np.allclose(got[name], ref[name].to_numpy(), rtol=RTOL, atol=ATOL, equal_nan=True):
+                failures.append((seed, name))
+    return failures
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def run(n_bars, n_symbols, repeat=3):
+    df = synthetic_frame(n_bars=n_bars)
+    h, l, c, v = (df[f].to_numpy(float) for f in ["High", "Low", "Close", "Volume"])
+
+    pandas_one = _best_of(lambda: stock_analysis.compute_indicators_pandas(df['High'], df['Low'], df['Close'], df['Volume']), repeat)
+    kernel_one = _best_of(lambda: indicator_kernel.compute(h, l, c, v), repeat)
+
+    panel = synthetic_panel(n_symbols, n_bars=n_bars)
+    frames = [pd.DataFrame({f: panel[f][:, j] for f in ["High", "Low", "Close", "Volume"]}, index=panel["index"])
+              for j in range(n_symbols)]
+    pandas_many = _best_of(lambda: [stock_analysis.compute_indicators_pandas(f['High'], f['Low'], f['Close'], f['Volume'])
+                                    for f in frames], 1)
+    kernel_many = _best_of(lambda: indicator_kernel.compute(panel["High"], panel["Low"], panel["Close"], panel["Volume"]), repeat)
+
+    scale = 1000 / n_symbols
+    print(f"bars={n_bars}")
+    print(f"  per symbol      pandas {pandas_one * 1e3:8.2f} ms | kernel {kernel_one * 1e3:8.2f} ms | speedup {pandas_one / kernel_one:6.1f}x")
+    print(f"  per 1000 symbols pandas {pandas_many * scale:8.2f} s  | kernel {kernel_many * scale:8.3f} s  | speedup {pandas_many / kernel_many:6.1f}x")
+    return {"pandas_one": pandas_one, "kernel_one": kernel_one,
+            "pandas_1000": pandas_many * scale, "kernel_1000": kernel_many * scale}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=250)
+    parser.add_argument("--symbols", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    failures = check_regression(args.bars)
+    if failures:
+        print(f"REGRESSION: kernel differs from pandas reference for {failures}")
+        return 1
+    print("regression check: kernel == pandas reference (all fields)")
+    run(args.bars, args.symbols)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Memory and precision check of the compact result layout (`compact_frame`).
+
+    python -m benchmarks.bench_memory [--symbols 500] [--bars 250]
+
+1. Builds full result frames (OHLCV + indicators) for synthetic symbols and verifies the
+   precision contract on every column (exits 1 if a column exceeds `REL_TOL`).
+2. Reports bytes per symbol held as float64 DataFrames, as CompactFrames and as
+   result-cache blobs (traced allocations, so pandas overhead is included).
+3. Reports how often the quant score would change if it were recomputed from the
+   compacted values (it is not: metrics are computed before compaction) and the cost of
+   materializing one column vs. the whole frame.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import compact_frame
+import result_cache
+import stock_analysis
+from benchmarks.fixtures import synthetic_frame
+
+def build_frames(n_symbols, n_bars):
+    frames = []
+    for seed in range(n_symbols):
+        df = synthetic_frame(n_bars=n_bars, seed=seed)
+        for col, values in stock_analysis.compute_indicators(df['High'], df['Low'], df['Close'], df['Volume']).items():
+            df[col] = values
+        frames.append(df)
+    return frames
+
+def traced_bytes(build):
+    """
+    Bytes still allocated after `build()` returns (the result is kept alive until measured).
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+def score(df):
+    latest, prev = df.iloc[-1], df.iloc[-2]
+    return stock_analysis.build_metrics(latest, prev, latest.name.date(), "X", "X",
+                                        df['Close'], df['RSI'], df['Hist'])['score']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=250)
+    args = parser.parse_args(argv)
+
+    frames = build_frames(args.symbols, args.bars)
+    compact = [compact_frame.CompactFrame.from_frame(df) for df in frames]
+
+    # 1. Precision contract
+    worst = {}
+    for df, cf in zip(frames, compact):
+        for col, err in compact_frame.max_rel_error(df, cf).items():
+            worst[col] = max(worst.get(col, 0.0), err)
+    bad = {col: err for col, err in worst.items() if err > compact_frame.REL_TOL}
+    print(f"precision: max relative error {max(worst.values()):.2e} (contract {compact_frame.REL_TOL:.2e}) "
+          f"| exact columns: {', '.join(c for c, e in worst.items() if e == 0)}")
+    if bad:
+        print(f"CONTRACT VIOLATED: {bad}")
+        return 1
+
+    # 2. Memory per symbol
+    n = args.symbols
+    dense = traced_bytes(lambda: [df.copy(deep=True) for df in frames]) / n
+    packed = traced_bytes(lambda: [compact_frame.CompactFrame.from_frame(df) for df in frames]) / n
+    blobs = traced_bytes(lambda: [result_cache.encode(df, {}) for df in frames]) / n
+    report = compact[0].memory_report()
+    print(f"per symbol ({args.bars} bars, {report['columns']} columns: {report['float32']} float32, "
+          f"{report['aliased']} aliased, {report['exact']} exact)")
+    print(f"  DataFrame float64 {dense / 1024:8.1f} KiB")
+    print(f"  CompactFrame      {packed / 1024:8.1f} KiB  ({packed / dense:.0%})")
+    print(f"  cache blob (lz4)  {blobs / 1024:8.1f} KiB  ({blobs / dense:.0%})")
+
+    # 3. Score stability and materialization cost
+    changed = sum(score(df) != score(cf.to_frame()) for df, cf in zip(frames, compact))
+    t0 = time.perf_counter()
+    for cf in compact: cf["RSI"]
+    one = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for cf in compact: cf.to_frame()
+    full = (time.perf_counter() - t0) / n
+    print(f"score recomputed from compact values differs for {changed}/{n} symbols")
+    print(f"materialize: one column {one * 1e6:.0f} us | full frame {full * 1e6:.0f} us")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
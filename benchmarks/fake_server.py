@@ -0,0 +1,153 @@
+"""
+Local fake of the Yahoo chart/search endpoints for exercising `fetcher` without network.
+
+    python -m benchmarks.fake_server [--symbols 40] [--latency 0.2]
+
+Serves synthetic bars for `<code>.TW` (even codes) or `<code>.TWO` (odd codes, so the OTC
+fallback is exercised), adds a fixed latency per request and can fail the first N requests
+per path with 429/503. Intraday requests (`interval` other than 1d) are answered from
+`intraday` frames when given. Compares a serial fetch (concurrency 1) with the concurrent fetcher.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import fetcher
+from benchmarks.fixtures import synthetic_frame
+
+def chart_payload(df, name=None):
+    """
+    Chart endpoint response for a bar DataFrame (prices reported unadjusted, adjclose = Close).
+    """
+    ts = ((df.index - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).astype("int64").tolist()
+    quote = {f.lower(): df[f].tolist() for f in ["Open", "High", "Low", "Close", "Volume"]}
+    return {"chart": {"result": [{
+        "meta": {"symbol": name, "gmtoffset": 0},
+        "timestamp": ts,
+        "indicators": {"quote": [quote], "adjclose": [{"adjclose": df['Close'].tolist()}]},
+    }], "error": None}}
+
+class FakeYahooServer:
+    """
+    Threaded HTTP server on 127.0.0.1 (random port). Use as a context manager.
+    """
+    def __init__(self, frames, names=None, latency=0.0, fail_first=0, fail_status=503, intraday=None):
+        self.frames = frames
+        self.intraday = intraday or {}
+        self.names = names or {}
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.hits = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                with server._lock:
+                    n = server.hits.get(parsed.path, 0)
+                    server.hits[parsed.path] = n + 1
+                time.sleep(server.latency)
+                if n < server.fail_first:
+                    return self._send(server.fail_status, {"error": "try again"})
+
+                if parsed.path.startswith("/v8/finance/chart/"):
+                    symbol = urllib.parse.unquote(parsed.path.rsplit("/", 1)[1])
+                    params = urllib.parse.parse_qs(parsed.query)
+                    daily = params.get("interval", ["1d"])[0] == "1d"
+                    df = (server.frames if daily else server.intraday).get(symbol)
+                    if df is None:
+                        return self._send(404, {"chart": {"result": None, "error": {"code": "Not Found"}}})
+                    if "period1" in params:
+                        df = df[df.index >= pd.Timestamp(int(params["period1"][0]), unit="s")]
+                    return self._send(200, chart_payload(df, symbol))
+
+                if parsed.path == "/v1/finance/search":
+                    q = urllib.parse.parse_qs(parsed.query).get("q", [""])[0]
+                    quotes = [{"symbol": q, "longname": server.names[q]}] if q in server.names else []
+                    return self._send(200, {"quotes": quotes})
+
+                self._send(404, {})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def fake_universe(n_symbols, n_bars=250):
+    """
+    Returns: (requested symbols, frames keyed by listed symbol, names keyed by listed symbol)
+    """
+    requested, frames, names = [], {}, {}
+    for i in range(n_symbols):
+        code = 1000 + i
+        listed = f"{code}.TW" if i % 2 == 0 else f"{code}.TWO"
+        requested.append(f"{code}.TW")
+        frames[listed] = synthetic_frame(n_bars=n_bars, seed=i)
+        names[listed] = f"Fake {code}"
+    return requested, frames, names
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    requested, frames, names = fake_universe(args.symbols)
+    with FakeYahooServer(frames, names, latency=args.latency, fail_first=1) as server:
+        async def lookup_all(f):
+            return await asyncio.gather(*(f.lookup(s) for s in requested))
+
+        for label, concurrency in [("serial", 1), ("concurrent", args.concurrency)]:
+            server.hits.clear()
+            f = fetcher.AsyncFetcher(fetcher.YahooChartSource(server.url), max_concurrency=concurrency,
+                                     rate=1000, burst=1000, backoff=0.01)
+            t0 = time.perf_counter()
+            results = asyncio.run(lookup_all(f))
+            elapsed = time.perf_counter() - t0
+            ok = sum(1 for df, resolved, name in results if not df.empty and name == names[resolved])
+            print(f"{label:>10}: {elapsed:6.2f} s for {len(requested)} lookups | resolved {ok} | {f.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Synthetic OHLCV fixtures for benchmarks and offline checks (no network).
+"""
+import contextlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import metrics_history
+
+def synthetic_panel(n_symbols, n_bars=250, seed=0, start="2020-01-02"):
+    """
+    Random-walk OHLCV panel.
+    Returns: Dictionary of field -> float64 array (bars x symbols), plus "index" (DatetimeIndex)
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, (n_bars, n_symbols))
+    close = 100 * np.exp(np.cumsum(returns, axis=0))
+    open_p = close * np.exp(rng.normal(0, 0.01, (n_bars, n_symbols)))
+    high = np.maximum(open_p, close) * np.exp(np.abs(rng.normal(0, 0.01, (n_bars, n_symbols))))
+    low = np.minimum(open_p, close) * np.exp(-np.abs(rng.normal(0, 0.01, (n_bars, n_symbols))))
+    volume = rng.integers(1_000, 5_000_000, (n_bars, n_symbols)).astype(np.float64)
+    return {"Open": open_p, "High": high, "Low": low, "Close": close, "Volume": volume,
+            "index": pd.bdate_range(start, periods=n_bars)}
+
+def synthetic_frame(n_bars=250, seed=0, start="2020-01-02"):
+    """
+    Single-symbol OHLCV DataFrame shaped like the bar store / yfinance output.
+    """
+    panel = synthetic_panel(1, n_bars=n_bars, seed=seed, start=start)
+    df = pd.DataFrame({f: panel[f][:, 0] for f in ["Open", "High", "Low", "Close", "Volume"]},
+                      index=panel["index"])
+    df["Volume"] = df["Volume"].astype("int64")
+    df.index.name = "Date"
+    return df
+
+def synthetic_intraday(n_days=20, seed=0, start="2020-01-02", minutes=5):
+    """
+    Intraday OHLCV bars on the TWSE session: 09:00 ... 13:25 every `minutes`, plus the
+    13:30 closing-auction bar, on business days (tz-naive Taipei time).
+    """
+    days = pd.bdate_range(start, periods=n_days)
+    offsets = pd.to_timedelta(list(range(9 * 60, 13 * 60 + 30, minutes)) + [13 * 60 + 30], unit="min")
+    index = pd.DatetimeIndex([d + o for d in days for o in offsets], name="Date")
+    panel = synthetic_panel(1, n_bars=len(index), seed=seed)
+    df = pd.DataFrame({f: panel[f][:, 0] for f in ["Open", "High", "Low", "Close", "Volume"]}, index=index)
+    df["Volume"] = (df["Volume"] // 100).astype("int64")
+    return df
+
+def synthetic_symbols(n_symbols):
+    """
+    Fake TWSE-style tickers ("1000.TW", "1001.TW", ...).
+    """
+    return [f"{1000 + i}.TW" for i in range(n_symbols)]
+
+@contextlib.contextmanager
+def temp_history(root):
+    """
+    Default metrics history swapped for one under `root` (a temporary folder), so runs that
+    analyse synthetic symbols never record into the real data folder. Restored on exit.
+    """
+    previous = metrics_history.get_default_history()
+    metrics_history.set_default_history(metrics_history.MetricsHistory(os.path.join(root, "metrics")))
+    try:
+        yield
+    finally:
+        metrics_history.set_default_history(previous)
@@ -0,0 +1,186 @@
+"""
+Reproducible benchmark suite on synthetic fixtures (no network), recorded per commit.
+
+    python -m benchmarks.suite [--sizes 1,100,5000] [--bars 250] [--latency 0] [--check 20]
+
+For each universe size:
+1. indicators_panel  one 2-D kernel call over the whole (bars x symbols) panel
+   indicators_loop   `compute_indicators` per symbol
+2. End-to-end over the fake Yahoo server and a fresh bar store, with the per-stage
+   breakdown from `instrumentation`:
+   e2e_sync          batched store sync of the whole universe (download, OTC probe, writes)
+   e2e_cold          `compute_stock` per symbol, first computation (result cache puts)
+   e2e_warm          bars on disk, no result cache (indicators + metrics)
+   e2e_cached        result cache hits
+   screener          `analyze_universe` over the whole universe
+   The per-symbol scenarios run over the first `--sample` symbols while the store holds the
+   whole universe, so large sizes still finish in minutes on a small machine.
+Every scenario appends one JSON line (commit, dirty flag, environment, seconds, symbols/s,
+symbols timed, stages) to `--out` and is printed next to the latest earlier record of the same scenario on
+the same host, so runs can be compared across commits. `--check PCT` exits 1 when a
+scenario got more than PCT percent slower than that record.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import fetcher
+import indicator_kernel
+import instrumentation
+import result_cache
+import stock_analysis
+from benchmarks.fake_server import FakeYahooServer, fake_universe
+from benchmarks.fixtures import synthetic_panel, temp_history
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUT = os.path.join(ROOT, "benchmarks", "results.jsonl")
+
+def git_revision():
+    """
+    Returns: (short commit or "unknown", True when tracked files have local changes)
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip() != ""
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def environment():
+    return {"host": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__}
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def _stage_means():
+    snap = instrumentation.snapshot()
+    return ({name: round(s["mean_ms"], 4) for name, s in snap["stages"].items()}, snap["counters"])
+
+# ---- scenarios ----
+def bench_indicators(n_symbols, n_bars, repeat=3):
+    """
+    Returns: Dictionary of scenario -> (seconds, symbols timed, stage means in ms, counters)
+    """
+    panel = synthetic_panel(n_symbols, n_bars=n_bars)
+    fields = ["High", "Low", "Close", "Volume"]
+    out = {"indicators_panel": _best_of(lambda: indicator_kernel.compute(*(panel[f] for f in fields)), repeat)}
+    series = [[pd.Series(panel[f][:, j], index=panel["index"]) for f in fields] for j in range(n_symbols)]
+    out["indicators_loop"] = _best_of(lambda: [stock_analysis.compute_indicators(*s) for s in series],
+                                      1 if n_symbols > 100 else repeat)
+    return {name: (seconds, n_symbols, {}, {}) for name, seconds in out.items()}
+
+def bench_end_to_end(n_symbols, n_bars, latency=0.0, sample=500):
+    """
+    Returns: Dictionary of scenario -> (seconds, symbols timed, stage means in ms, counters)
+    """
+    requested, frames, names = fake_universe(n_symbols, n_bars=n_bars)
+    timed = requested[:sample]
+    out = {}
+    with FakeYahooServer(frames, names, latency=latency) as yahoo, tempfile.TemporaryDirectory() as root, \
+            temp_history(root):
+        # Limits opened up: the suite measures this code, not Yahoo's rate limit
+        fetcher.set_default_fetcher(fetcher.AsyncFetcher(fetcher.YahooChartSource(yahoo.url),
+                                                         max_concurrency=32, rate=1e6, burst=1e6))
+        store = bar_store.BarStore(root=root, provider=fetcher.AsyncProvider())
+        bar_store.set_default_store(store)
+        cache = result_cache.ResultCache(result_cache.MemoryBackend())
+
+        steps = [
+            ("e2e_sync", requested, lambda: store.sync_many(requested)),
+            ("e2e_cold", timed, lambda: [stock_analysis.compute_stock(s, cache=cache) for s in timed]),
+            ("e2e_warm", timed, lambda: [stock_analysis.compute_stock(s, cache=None) for s in timed]),
+            ("e2e_cached", timed, lambda: [stock_analysis.compute_stock(s, cache=cache) for s in timed]),
+            ("screener", requested, lambda: stock_analysis.analyze_universe(tuple(requested))),
+        ]
+        stock_analysis.analyze_universe.clear()
+        for name, symbols, fn in steps:
+            instrumentation.get_default_registry().reset()
+            t0 = time.perf_counter()
+            fn()
+            seconds = time.perf_counter() - t0
+            out[name] = (seconds, len(symbols), *_stage_means())
+    return out
+
+# ---- history ----
+def load_history(path):
+    if not os.path.exists(path): return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous(history, record):
+    """
+    Latest earlier record of the same scenario / size / sample / bars on the same host.
+    """
+    same = lambda r: (r["scenario"], r["symbols"], r.get("timed"), r["bars"], r["env"]["host"])
+    for old in reversed(history):
+        if same(old) == same(record):
+            return old
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,100,5000", help="comma separated universe sizes")
+    parser.add_argument("--bars", type=int, default=250)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake download latency (s)")
+    parser.add_argument("--sample", type=int, default=500, help="symbols timed in the per-symbol end-to-end scenarios")
+    parser.add_argument("--skip-e2e", action="store_true", help="indicator scenarios only")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON lines history file")
+    parser.add_argument("--check", type=float, help="exit 1 if a scenario is this many percent slower")
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_revision()
+    env = environment()
+    history = load_history(args.out)
+    print(f"commit {commit}{' (dirty)' if dirty else ''} | {env['host']} {env['machine']} x{env['cpus']} | "
+          f"python {env['python']} numpy {env['numpy']} pandas {env['pandas']}")
+
+    regressions = []
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        results = bench_indicators(n, args.bars)
+        if not args.skip_e2e:
+            results.update(bench_end_to_end(n, args.bars, args.latency, args.sample))
+        for scenario, (seconds, n_timed, stages, counters) in results.items():
+            record = {"ts": time.time(), "commit": commit, "dirty": dirty, "env": env, "scenario": scenario,
+                      "symbols": n, "timed": n_timed, "bars": args.bars, "seconds": seconds,
+                      "per_symbol_ms": seconds / n_timed * 1e3, "symbols_per_s": n_timed / seconds,
+                      "stages": stages, "counters": counters}
+            old = previous(history, record)
+            delta = ""
+            if old is not None:
+                change = (seconds / old["seconds"] - 1) * 100
+                delta = f" | {change:+6.1f}% vs {old['commit']}{'*' if old['dirty'] else ''}"
+                if args.check is not None and change > args.check:
+                    regressions.append((scenario, n, change))
+            print(f"{scenario:<17} n={n:<5} timed={n_timed:<5} {seconds:9.4f} s | {record['per_symbol_ms']:8.3f} ms/symbol | "
+                  f"{record['symbols_per_s']:10.0f} symbols/s{delta}")
+            if stages:
+                top = sorted(stages.items(), key=lambda kv: -kv[1])[:4]
+                print(" " * 19 + "stages (mean ms): " + ", ".join(f"{k} {v:.2f}" for k, v in top))
+            history.append(record)
+            with open(args.out, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    if regressions:
+        print("REGRESSION: " + ", ".join(f"{s} n={n} {c:+.1f}%" for s, n, c in regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Price chart construction with server-side decimation for long histories.
+
+The browser never receives more than about `max_points` candles per chart:
+1. Only the visible range (`x_range`) is sent, so zooming in via the range control re-renders
+   that window at full detail.
+2. Inside the window, consecutive bars are merged into equal-count buckets
+   (first Open, max High, min Low, last Close, summed Volume), so the shape of every bucket
+   is the true range of the bars it replaces.
+3. Overlay lines (MA20, Bollinger bands) are thinned with LTTB (Largest-Triangle-Three-Buckets),
+   which keeps the visually significant turning points instead of every n-th sample.
+Overlays and pattern markers use WebGL traces (`Scattergl`). Plotly has no WebGL candlestick,
+so the candles rely on the bucket limit alone.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+import patterns
+import timeframes
+
+MAX_POINTS = 600 # candles / line points per trace; enough for a full-width desktop chart
+
+# ---- decimation ----
+def bucket_ohlc(df, n_buckets):
+    """
+    Merges consecutive bars into at most `n_buckets` equal-count buckets.
+    Each bucket is labelled with the timestamp of its first bar.
+    Returns: DataFrame with Open/High/Low/Close (+ Volume if present)
+    """
+    n = len(df)
+    if n <= n_buckets:
+        return df
+    size = -(-n // n_buckets) # ceil
+    starts = np.arange(0, n, size)
+    return timeframes.aggregate_runs(df, starts, df.index[starts])
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets point selection. `x`, `y` are float arrays without NaN.
+    Returns: sorted int array of the indices to keep (first and last always kept)
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Third vertex: average of the next bucket (the last point for the final bucket)
+        nxt_hi = edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[hi:nxt_hi].mean(), y[hi:nxt_hi].mean()
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def decimate_line(series, n_out):
+    """
+    LTTB-thinned copy of a time series (NaN rows, e.g. the MA warm-up, are dropped first).
+    """
+    s = series.dropna()
+    if len(s) <= n_out:
+        return s
+    x = s.index.asi8.astype(np.float64) if isinstance(s.index, pd.DatetimeIndex) else np.arange(len(s), dtype=np.float64)
+    return s.iloc[lttb_indices(x, s.to_numpy(dtype=np.float64), n_out)]
+
+def visible_slice(df, x_range=None):
+    """
+    Rows inside `x_range` = (start, end) (inclusive, None = open ended).
+    """
+    if not x_range:
+        return df
+    start, end = x_range
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None: mask &= df.index >= pd.Timestamp(start)
+    if end is not None: mask &= df.index <= pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1)
+    return df[mask]
+
+# ---- figure ----
+OVERLAYS = [
+    ("MA20", "MA20 (月線)", dict(color='orange', width=1)),
+    ("BB_Up", "布林上軌", dict(color='gray', dash='dash')),
+    ("BB_Low", "布林下軌", dict(color='gray', dash='dash')),
+]
+
+MARKERS = [
+    (patterns.HAMMER, "Low", 0.99, 'triangle-up', '#4CAF50'),
+    (patterns.SHOOTING_STAR, "High", 1.01, 'triangle-down', '#f44336'),
+    (patterns.DOJI, "High", 1.01, 'x', '#FFC107'),
+]
+
+def price_figure(df, x_range=None, max_points=MAX_POINTS, decimate=True, timeframe="1d"):
+    """
+    Candlestick + MA20 / Bollinger overlays + pattern markers for the visible range.
+    With `decimate=False` every bar of the range is sent (the original rendering).
+    Returns: (go.Figure, bars per candle)
+    """
+    view = visible_slice(df, x_range)
+    limit = max_points if decimate else len(view)
+    candles = bucket_ohlc(view, limit)
+    per_candle = -(-len(view) // max(len(candles), 1))
+
+    fig = go.Figure()
+    name = 'OHLC' if per_candle == 1 else f'OHLC ({per_candle} 根合併)'
+    fig.add_trace(go.Candlestick(x=candles.index, open=candles['Open'], high=candles['High'],
+                                 low=candles['Low'], close=candles['Close'], name=name))
+    Line = go.Scattergl if decimate else go.Scatter
+    for col, label, line in OVERLAYS:
+        if col not in view: continue
+        s = decimate_line(view[col], limit)
+        fig.add_trace(Line(x=s.index, y=s.to_numpy(), mode='lines', line=line, name=label))
+
+    # Candlestick pattern markers over the visible bars (one vectorized pass)
+    codes = patterns.classify(view['Open'], view['High'], view['Low'], view['Close'])
+    for code, anchor, offset, symbol, color in MARKERS:
+        hit = codes == code
+        if not hit.any(): continue
+        x, y = view.index[hit], view[anchor].to_numpy()[hit] * offset
+        if hit.sum() > limit:
+            # Too dense to read at this zoom: keep an evenly spread subset
+            pick = np.linspace(0, hit.sum() - 1, limit).astype(np.int64)
+            x, y = x[pick], y[pick]
+        fig.add_trace(Line(x=x, y=y, mode='markers', marker=dict(symbol=symbol, size=8, color=color),
+                           name=patterns.PATTERN_LABELS[code]))
+    fig.update_layout(height=500, xaxis_rangeslider_visible=False, template="plotly_dark")
+    if timeframes.is_intraday(timeframe):
+        # Hide nights and weekends so sessions sit next to each other
+        fig.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"]), dict(bounds=[13.5, 9], pattern="hour")])
+    return fig, per_candle
+
+# ---- cross-section ----
+HEATMAP_MAX = 150 # symbols per correlation heatmap; beyond that the cells are unreadable anyway
+
+def correlation_heatmap(corr, order=None, labels=None, max_symbols=HEATMAP_MAX):
+    """
+    Correlation heatmap in `order` (e.g. `cross_section.cluster_order`), limited to the first
+    `max_symbols` labels of that order.
+    Returns: (Figure, number of symbols left out)
+    """
+    order = list(corr.index if order is None else order)
+    shown = order[:max_symbols]
+    view = corr.loc[shown, shown]
+    names = [labels.get(s, s) if labels else s for s in shown]
+    fig = go.Figure(go.Heatmap(z=view.to_numpy(), x=names, y=names, zmin=-1, zmax=1,
+                               colorscale="RdBu_r", colorbar=dict(title="ρ")))
+    fig.update_layout(height=min(300 + 12 * len(shown), 1200), template="plotly_dark",
+                      yaxis=dict(autorange="reversed"))
+    return fig, len(order) - len(shown)
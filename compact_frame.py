@@ -0,0 +1,180 @@
+"""
+Compact in-memory layout for analysis results (the DataFrame of `compute_stock`).
+
+A `CompactFrame` holds
+- the bar index and raw OHLCV once, in their original dtypes (exact),
+- derived indicator columns as float32 where the precision contract below holds,
+  float64 otherwise,
+- aliases instead of duplicate columns (BB_Mid is MA20 with the default windows; a column
+  is only aliased when it is bit-for-bit equal to its target).
+Columns are materialized on access (`frame["RSI"]`, `frame.to_frame(["Close", "RSI"])`) as
+float64 pandas objects, so consumers see the same dtypes as the full frame.
+
+Precision contract, against the float64 computation:
+- float32 columns: |stored - exact| <= 2**-24 * |exact| (round to nearest, about 7
+  significant digits); NaN stays NaN. A column that cannot meet it (values outside the
+  normal float32 range) stays float64.
+- Index, OHLCV and the metrics dict are exact: metrics (score, pivots, divergences) are
+  computed from the float64 frame before it is compacted.
+Seven significant digits is far below display precision (2 decimals on prices, 1 on
+oscillators). Anything that needs bit-exact indicator history recomputes it from the bars.
+"""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import bar_store
+
+RAW_COLUMNS = bar_store.OHLCV_COLUMNS
+ALIASES = {"BB_Mid": "MA20"} # column -> identical column it is served from
+REL_TOL = 2.0 ** -24 # float32 unit roundoff
+_FLOAT32_MIN = np.finfo(np.float32).tiny
+_FLOAT32_MAX = np.finfo(np.float32).max
+_SCHEMA_KEY = b"quant.compact"
+
+def fits_float32(values):
+    """
+    Whether float64 `values` round to float32 within REL_TOL (finite values in the normal
+    float32 range, or exact zeros / NaN / inf).
+    """
+    a = np.abs(values[np.isfinite(values)])
+    return not len(a) or bool(np.all((a == 0) | ((a >= _FLOAT32_MIN) & (a <= _FLOAT32_MAX))))
+
+class CompactFrame:
+    """
+    Read-only column store with the DataFrame surface the result consumers use:
+    `len`, `index`, `columns`, `col in frame`, `frame[col]`, `tail(n)`, `to_frame(columns)`.
+    """
+    __slots__ = ("index", "columns", "_arrays", "_aliases")
+
+    def __init__(self, index, columns, arrays, aliases=None):
+        self.index = index
+        self.columns = [sys.intern(str(c)) for c in columns] # shared across frames
+        self._arrays = arrays # column -> stored ndarray
+        self._aliases = dict(aliases or {})
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Compacts a result DataFrame (copies the columns, so the source frame can be freed;
+        the immutable index is shared).
+        """
+        arrays, aliases = {}, {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            target = ALIASES.get(col)
+            if target in df.columns and np.array_equal(values, df[target].to_numpy(), equal_nan=True):
+                aliases[col] = target
+            elif col in RAW_COLUMNS or values.dtype != np.float64 or not fits_float32(values):
+                arrays[col] = values.copy()
+            else:
+                arrays[col] = values.astype(np.float32)
+        return cls(df.index, df.columns, arrays, aliases)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, col):
+        return col in self._arrays or col in self._aliases
+
+    def values(self, col):
+        """
+        Stored array of a column (float32 for compacted columns, no copy).
+        """
+        return self._arrays[self._aliases.get(col, col)]
+
+    def __getitem__(self, col):
+        if col not in self:
+            raise KeyError(col)
+        values = self.values(col)
+        if values.dtype == np.float32:
+            values = values.astype(np.float64)
+        return pd.Series(values, index=self.index, name=col)
+
+    def to_frame(self, columns=None):
+        """
+        Materializes `columns` (default: all, in the original order) as a DataFrame.
+        """
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({col: self[col] for col in columns}, index=self.index)
+
+    def tail(self, n):
+        """
+        Last `n` rows (views, no copy).
+        """
+        if n >= len(self): return self
+        start = len(self) - max(n, 0)
+        return CompactFrame(self.index[start:], self.columns,
+                            {col: a[start:] for col, a in self._arrays.items()}, self._aliases)
+
+    # ---- size ----
+    def nbytes(self):
+        return int(self.index.nbytes + sum(a.nbytes for a in self._arrays.values()))
+
+    def dense_nbytes(self):
+        """
+        Size of the equivalent full frame (every column float64 / original dtype, no aliases).
+        """
+        itemsize = lambda col: max(self.values(col).dtype.itemsize, 8)
+        return int(self.index.nbytes + len(self) * sum(itemsize(col) for col in self.columns))
+
+    def memory_report(self):
+        """
+        Returns: Dictionary with rows, columns, stored / float32 / float64 / aliased column
+                 counts, compact and dense bytes and their ratio
+        """
+        kinds = {col: ("alias" if col in self._aliases else str(self.values(col).dtype)) for col in self.columns}
+        compact, dense = self.nbytes(), self.dense_nbytes()
+        return {"rows": len(self), "columns": len(self.columns),
+                "float32": sum(k == "float32" for k in kinds.values()),
+                "aliased": sum(k == "alias" for k in kinds.values()),
+                "exact": sum(k not in ("float32", "alias") for k in kinds.values()),
+                "compact_bytes": compact, "dense_bytes": dense,
+                "ratio": compact / dense if dense else 1.0}
+
+    # ---- Arrow ----
+    def to_table(self):
+        """
+        Arrow table with the stored dtypes; layout (column order, aliases) in the schema metadata.
+        """
+        names = [self.index.name or "Date"] + list(self._arrays)
+        arrays = [pa.array(self.index)] + [pa.array(a) for a in self._arrays.values()]
+        layout = {"index": self.index.name, "columns": self.columns, "aliases": self._aliases}
+        return pa.Table.from_arrays(arrays, names=names,
+                                    metadata={_SCHEMA_KEY: json.dumps(layout).encode("utf-8")})
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        Inverse of `to_table`. Returns None for tables without the compact layout.
+        """
+        meta = table.schema.metadata or {}
+        if _SCHEMA_KEY not in meta: return None
+        layout = json.loads(meta[_SCHEMA_KEY])
+        index = pd.DatetimeIndex(table.column(0).to_pandas(), name=layout["index"])
+        arrays = {name: table.column(name).to_numpy() for name in table.column_names[1:]}
+        return cls(index, layout["columns"], arrays, layout["aliases"])
+
+def max_rel_error(frame, compact):
+    """
+    Largest relative error per column of `compact` against the float64 `frame`
+    (the quantity bounded by the precision contract; NaN mismatches count as inf).
+    Returns: Dictionary of column -> error
+    """
+    out = {}
+    for col in frame.columns:
+        exact = frame[col].to_numpy(dtype=np.float64)
+        got = compact[col].to_numpy(dtype=np.float64)
+        nan = np.isnan(exact)
+        if not np.array_equal(nan, np.isnan(got)):
+            out[col] = float("inf")
+            continue
+        diff = np.abs(got[~nan] - exact[~nan])
+        scale = np.abs(exact[~nan])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rel = np.where(diff == 0, 0.0, diff / scale)
+        out[col] = float(rel.max()) if len(rel) else 0.0
+    return out
@@ -0,0 +1,231 @@
+"""
+Cross-sectional analytics over a universe: relative strength against the index,
+percentile ranks of every metric, sector momentum and rolling correlation / beta.
+
+Everything works on wide (date x symbol) close panels as loaded by
+`stock_analysis.load_panel`, so 1000+ symbols are a few array operations:
+- `relative_strength`: excess return over `^TWII` across several windows.
+- `percentile_ranks`: 0-100 rank of each metric within the universe.
+- `RollingCorrelation`: pairwise correlation and beta over the last `window` bars, from
+  window sums built with one matrix product each.
+- `cluster_order`: heatmap order that puts correlated names next to each other.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import instrumentation
+import stock_analysis
+import symbol_master
+
+BENCHMARK = "^TWII"
+RS_WINDOWS = (20, 60, 120)
+CORR_WINDOW = 60
+# Metrics ranked across the universe (higher = higher percentile)
+RANK_COLUMNS = ["score", "rs_20", "rs_60", "rs_120", "rsi", "k", "bias_ma20", "bias_ma60",
+                "macd_hist", "adx", "bb_width", "vol_change", "beta"]
+
+# TWSE / TPEx industry of the bundled symbols (ETFs and US listings grouped separately)
+SECTORS = {
+    "0050": "ETF", "0056": "ETF", "00878": "ETF",
+    "1101": "水泥", "1102": "水泥", "1216": "食品", "1301": "塑膠", "1303": "塑膠", "1326": "塑膠",
+    "2002": "鋼鐵", "2105": "橡膠", "2207": "汽車", "2912": "貿易百貨", "6505": "油電燃氣", "9910": "其他",
+    "1565": "生技醫療", "3293": "文化創意",
+    "2303": "半導體", "2330": "半導體", "2344": "半導體", "2379": "半導體", "2408": "半導體",
+    "2454": "半導體", "3034": "半導體", "3443": "半導體", "3711": "半導體", "3105": "半導體",
+    "3529": "半導體", "5274": "半導體", "5347": "半導體", "5483": "半導體", "6147": "半導體",
+    "6488": "半導體", "8299": "半導體",
+    "2301": "電腦及週邊", "2324": "電腦及週邊", "2353": "電腦及週邊", "2356": "電腦及週邊",
+    "2357": "電腦及週邊", "2376": "電腦及週邊", "2382": "電腦及週邊", "2395": "電腦及週邊",
+    "3017": "電腦及週邊", "3231": "電腦及週邊", "3324": "電腦及週邊", "6669": "電腦及週邊",
+    "2308": "電子零組件", "2327": "電子零組件", "2383": "電子零組件", "3037": "電子零組件", "6274": "電子零組件",
+    "2409": "光電", "3008": "光電", "3481": "光電", "8069": "光電",
+    "2345": "通信網路", "2412": "通信網路", "3045": "通信網路", "4904": "通信網路",
+    "2317": "其他電子", "2360": "其他電子", "2474": "其他電子",
+    "2801": "金融保險", "2880": "金融保險", "2881": "金融保險", "2882": "金融保險", "2884": "金融保險",
+    "2885": "金融保險", "2886": "金融保險", "2887": "金融保險", "2890": "金融保險", "2891": "金融保險",
+    "2892": "金融保險", "5880": "金融保險",
+    "2603": "航運", "2609": "航運", "2610": "航運", "2615": "航運", "2618": "航運",
+}
+
+def sector_of(symbol, sectors=None):
+    """
+    Sector label of a symbol ("2330.TW" -> "半導體"); US listings -> "美股", unknown -> "其他".
+    """
+    sectors = SECTORS if sectors is None else sectors
+    code = symbol.split(".")[0]
+    if code in sectors: return sectors[code]
+    rec = symbol_master.get_master().get(symbol)
+    return "美股" if rec and rec["exchange"] == "US" else "其他"
+
+# ---- relative strength / ranks ----
+def relative_strength(close, benchmark, windows=RS_WINDOWS):
+    """
+    Excess return over the benchmark across each window (in benchmark sessions), in percent:
+    (P_t / P_t-w) / (B_t / B_t-w) - 1. Symbols are aligned to the benchmark calendar and
+    carried forward over their own missing days (suspensions, different holidays).
+    Returns: DataFrame (symbol x rs_<window>) of the latest values
+    """
+    bench = benchmark.dropna()
+    px = close.reindex(bench.index.union(close.index)).ffill().reindex(bench.index)
+    b = bench.to_numpy(dtype=np.float64)
+    p = px.to_numpy(dtype=np.float64)
+    out = {}
+    for w in windows:
+        if len(b) <= w:
+            out[f"rs_{w}"] = np.full(p.shape[1], np.nan)
+            continue
+        out[f"rs_{w}"] = ((p[-1] / p[-1 - w]) / (b[-1] / b[-1 - w]) - 1) * 100
+    return pd.DataFrame(out, index=close.columns)
+
+def percentile_ranks(table, columns=RANK_COLUMNS):
+    """
+    Percentile (0-100, ties averaged) of each metric within the universe; NaN stays NaN.
+    Returns: DataFrame with a "<column>_pct" column per ranked metric
+    """
+    columns = [c for c in columns if c in table]
+    ranks = table[columns].apply(pd.to_numeric, errors="coerce").rank(pct=True) * 100
+    return ranks.add_suffix("_pct")
+
+def sector_momentum(table, column="rs_60"):
+    """
+    Sector ranking by median relative strength (table needs "sector", `column` and "score").
+    Returns: DataFrame (sector x median_rs, mean_score, count) sorted strongest first
+    """
+    grouped = table.groupby("sector")
+    out = pd.DataFrame({"median_rs": grouped[column].median(), "mean_score": grouped["score"].mean(),
+                        "count": grouped.size()})
+    return out.sort_values("median_rs", ascending=False)
+
+# ---- rolling correlation / beta ----
+def log_returns(close):
+    """
+    Daily log returns of a wide close panel (NaN where either day is missing).
+    """
+    values = close.to_numpy(dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = np.log(values[1:] / values[:-1])
+    return pd.DataFrame(out, index=close.index, columns=close.columns)
+
+class RollingCorrelation:
+    """
+    Pairwise-complete correlation and covariance over the last `window` return rows.
+
+    Keeps four (N x N) window sums over the valid mask m and the zero-filled returns x:
+    counts sum(m m'), sums sum(x m'), squares sum(x^2 m') and products sum(x x').
+    """
+    def __init__(self, columns, rows, window=CORR_WINDOW):
+        self.columns = list(columns)
+        self.window = window
+        x = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.columns))[-window:]
+        m = (~np.isnan(x)).astype(np.float64)
+        x = np.where(m > 0, x, 0.0)
+        self._n, self._sx, self._sxx, self._sxy = m.T @ m, x.T @ m, (x * x).T @ m, x.T @ x
+
+    @classmethod
+    def from_returns(cls, returns, window=CORR_WINDOW):
+        """
+        Window ending at the last row of a (date x symbol) returns frame.
+        """
+        return cls(returns.columns, returns.to_numpy(dtype=np.float64), window)
+
+    def _moments(self, min_periods):
+        n = self._n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = (self._sxy - self._sx * self._sx.T / n) / (n - 1)
+            var = (self._sxx - self._sx * self._sx / n) / (n - 1) # var[i, j]: of i where j is valid
+        cov[n < min_periods] = np.nan
+        return cov, var
+
+    def cov(self, min_periods=None):
+        cov, _ = self._moments(min_periods or max(self.window // 2, 3))
+        return pd.DataFrame(cov, index=self.columns, columns=self.columns)
+
+    def corr(self, min_periods=None):
+        """
+        Returns: DataFrame (N x N); NaN for pairs with fewer than `min_periods` common bars
+        (default half the window)
+        """
+        cov, var = self._moments(min_periods or max(self.window // 2, 3))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.clip(cov / np.sqrt(var * var.T), -1.0, 1.0)
+        np.fill_diagonal(corr, np.where(np.isnan(np.diag(cov)), np.nan, 1.0))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def beta(self, benchmark, min_periods=None):
+        """
+        Beta of every column against column `benchmark` over the window.
+        Returns: Series
+        """
+        cov, var = self._moments(min_periods or max(self.window // 2, 3))
+        j = self.columns.index(benchmark)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta = cov[:, j] / var[j, :]
+        return pd.Series(beta, index=self.columns, name="beta")
+
+def cluster_order(corr):
+    """
+    Heatmap order grouping correlated symbols: sorted by the Fiedler vector of the graph with
+    edge weights (1 + corr) / 2 (spectral seriation; no SciPy needed).
+    Returns: list of labels
+    """
+    labels = list(corr.index)
+    if len(labels) < 3: return labels
+    w = (1 + np.nan_to_num(corr.to_numpy(dtype=np.float64), nan=0.0)) / 2
+    np.fill_diagonal(w, 0.0)
+    laplacian = np.diag(w.sum(axis=1)) - w
+    _, vectors = np.linalg.eigh(laplacian)
+    return [labels[i] for i in np.argsort(vectors[:, 1], kind="stable")]
+
+def top_pairs(corr, n=20):
+    """
+    Most correlated distinct pairs.
+    Returns: DataFrame (a, b, corr)
+    """
+    values = corr.to_numpy(dtype=np.float64)
+    i, j = np.triu_indices(len(values), k=1)
+    v = values[i, j]
+    keep = ~np.isnan(v)
+    i, j, v = i[keep], j[keep], v[keep]
+    order = np.argsort(-v, kind="stable")[:n]
+    labels = corr.index
+    return pd.DataFrame({"a": labels[i[order]], "b": labels[j[order]], "corr": v[order]})
+
+# ---- universe ----
+@st.cache_data(ttl=300) # same lifetime as the screener
+def analyze_cross_section(tickers, window=CORR_WINDOW, period="1y", sectors=None):
+    """
+    Screener metrics + relative strength, beta, percentile ranks and sectors for a universe,
+    plus the correlation matrix, from one batched panel load.
+    Returns: (ranking DataFrame, correlation DataFrame, Dictionary of ticker -> failure reason)
+    """
+    tickers = [t for t in dict.fromkeys(tickers) if t != BENCHMARK]
+    if not tickers: return pd.DataFrame(), pd.DataFrame(), {}
+    try:
+        with instrumentation.stage("cross.load_panel"):
+            panel, resolved = stock_analysis.load_panel(tickers + [BENCHMARK], period=period)
+    except Exception as e:
+        print(f"Error downloading universe: {e}")
+        return pd.DataFrame(), pd.DataFrame(), {t: f"download failed: {e}" for t in tickers}
+    bench = panel['Close'].get(resolved.get(BENCHMARK, BENCHMARK))
+    members = [c for c in panel['Close'].columns if c != resolved.get(BENCHMARK)]
+    table, failures = stock_analysis.screen_panel({f: frame[members] for f, frame in panel.items()})
+    if table.empty: return table, pd.DataFrame(), failures
+
+    with instrumentation.stage("cross.statistics"):
+        close = panel['Close'][list(table.index)]
+        returns = log_returns(close)
+        if bench is not None and bench.notna().sum() > 1:
+            table = table.join(relative_strength(close, bench))
+            bench_returns = log_returns(bench.to_frame(BENCHMARK))
+            combined = returns.join(bench_returns, how="left")
+            rc = RollingCorrelation.from_returns(combined, window)
+            table["beta"] = rc.beta(BENCHMARK).drop(BENCHMARK)
+            corr = rc.corr().drop(index=BENCHMARK, columns=BENCHMARK)
+        else:
+            failures[BENCHMARK] = "no benchmark data: relative strength / beta unavailable"
+            corr = RollingCorrelation.from_returns(returns, window).corr()
+        table.insert(1, "sector", [sector_of(s, sectors) for s in table.index])
+        table = table.join(percentile_ranks(table))
+    return table, corr, failures
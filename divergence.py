@@ -0,0 +1,232 @@
+"""
+Vectorized swing-point divergence detector.
+
+`detect` labels every bar of a history (1-D) or of many symbols (2-D, bars x symbols) in
+one pass over fixed-size windows, so the cost is linear in the number of bars:
+1. Swing highs / lows in price and in the indicator: a bar is a swing high when it is
+   above the `order` bars before it and not below the `order` bars after it (lows
+   mirrored).
+2. Each price swing is matched with an indicator swing of the same kind within
+   `tolerance` bars; the indicator extreme in that window is its value at the swing.
+   The match is only known `order + tolerance` bars after the price swing, so every
+   signal is dated on that confirming bar (no look-ahead).
+3. Consecutive matched swings of the same kind, at most `max_gap` bars apart, are compared:
+   - regular bullish: price lower low,   indicator higher low
+   - hidden bullish:  price higher low,  indicator lower low
+   - regular bearish: price higher high, indicator lower high
+   - hidden bearish:  price lower high,  indicator higher high
+Codes are bit flags (a bar can confirm a low and a high pair at once); `label` gives the
+display string used in the metrics (`div_rsi`, `div_macd`). `StreamingDivergence` is the
+same detector fed one bar at a time (streaming engine).
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+ORDER = 3       # bars on each side of a swing
+TOLERANCE = 2   # bars between a price swing and the matching indicator swing
+MAX_GAP = 60    # bars between the two swings of a pair
+RECENT = 10     # bars a confirmed divergence stays in the latest-bar metrics
+
+REGULAR_BULLISH, HIDDEN_BULLISH, REGULAR_BEARISH, HIDDEN_BEARISH = 1, 2, 4, 8
+FLAG_LABELS = {
+    REGULAR_BEARISH: "Top Divergence (Bearish)",
+    REGULAR_BULLISH: "Bottom Divergence (Bullish)",
+    HIDDEN_BEARISH: "Hidden Divergence (Bearish)",
+    HIDDEN_BULLISH: "Hidden Divergence (Bullish)",
+}
+# Bars of history that fully determine the latest-bar result (see `latest`)
+HISTORY = RECENT + MAX_GAP + 2 * ORDER + 2 * TOLERANCE + 1
+
+def _shifted(x, k):
+    """
+    x moved by k bars along axis 0 (x[t - k] at t; negative k looks ahead), NaN padded.
+    """
+    out = np.full(x.shape, np.nan)
+    if abs(k) >= len(x): return out
+    if k >= 0:
+        out[k:] = x[:len(x) - k]
+    else:
+        out[:k] = x[-k:]
+    return out
+
+def _extreme(x, offsets, fn):
+    """
+    np.maximum / np.minimum of x over the given bar offsets (NaN propagates).
+    """
+    out = _shifted(x, offsets[0])
+    for k in offsets[1:]:
+        out = fn(out, _shifted(x, k))
+    return out
+
+def swings(x, order=ORDER):
+    """
+    Swing highs / lows of every bar (dated on the swing bar itself, confirmed `order` bars later).
+    Returns: (bool array of swing highs, bool array of swing lows), shaped like x
+    """
+    x = np.asarray(x, dtype=np.float64)
+    left, right = range(1, order + 1), range(-1, -order - 1, -1)
+    with np.errstate(invalid="ignore"):
+        # NaN anywhere in the window (warm-up, edges of the history) compares False
+        high = (x > _extreme(x, left, np.maximum)) & (x >= _extreme(x, right, np.maximum))
+        low = (x < _extreme(x, left, np.minimum)) & (x <= _extreme(x, right, np.minimum))
+    return high, low
+
+def _bar_index(a):
+    """
+    Bar number along axis 0, broadcastable against `a`.
+    """
+    return np.arange(len(a)).reshape((-1,) + (1,) * (a.ndim - 1))
+
+def _previous(flags):
+    """
+    Index of the latest True strictly before each bar along axis 0 (-1 if none).
+    """
+    idx = np.where(flags, _bar_index(flags), -1)
+    last = np.maximum.accumulate(idx, axis=0)
+    out = np.full(flags.shape, -1)
+    out[1:] = last[:-1]
+    return out
+
+def _pairs(price, value, swing, sign, max_gap):
+    """
+    Regular / hidden divergence of each swing against the previous swing of the same kind.
+    `sign` is +1 for highs, -1 for lows (so "higher" means more extreme).
+    Returns: (regular, hidden) bool arrays dated on the later swing bar
+    """
+    prev = _previous(swing)
+    has_prev = swing & (prev >= 0) & (_bar_index(swing) - prev <= max_gap)
+    safe = np.where(prev >= 0, prev, 0)
+    price_prev = np.take_along_axis(price, safe, axis=0)
+    value_prev = np.take_along_axis(value, safe, axis=0)
+    with np.errstate(invalid="ignore"):
+        price_more = sign * (price - price_prev) > 0
+        price_less = sign * (price - price_prev) < 0
+        value_more = sign * (value - value_prev) > 0
+        value_less = sign * (value - value_prev) < 0
+    return has_prev & price_more & value_less, has_prev & price_less & value_more
+
+def detect(price, indicator, order=ORDER, tolerance=TOLERANCE, max_gap=MAX_GAP):
+    """
+    Divergence flags of every bar, dated on the confirming bar (swing bar + `order` + `tolerance`).
+    Inputs are arrays/Series/DataFrames of equal shape (bars along axis 0).
+    Returns: uint8 array of REGULAR_/HIDDEN_ BULLISH/BEARISH bit flags (same shape as `price`)
+    """
+    p = np.asarray(price, dtype=np.float64)
+    ind = np.asarray(indicator, dtype=np.float64)
+    p_high, p_low = swings(p, order)
+    i_high, i_low = swings(ind, order)
+
+    # 1. Indicator value at each price swing: its swing extreme within +-tolerance bars
+    near = range(-tolerance, tolerance + 1)
+    high = p_high & (_extreme(i_high.astype(np.float64), near, np.fmax) > 0)
+    low = p_low & (_extreme(i_low.astype(np.float64), near, np.fmax) > 0)
+    ind_high = np.where(high, _extreme(ind, near, np.fmax), np.nan)
+    ind_low = np.where(low, _extreme(ind, near, np.fmin), np.nan)
+
+    # 2. Consecutive matched swings of the same kind
+    reg_bear, hid_bear = _pairs(p, ind_high, high, 1, max_gap)
+    reg_bull, hid_bull = _pairs(p, ind_low, low, -1, max_gap)
+    flags = (reg_bull * REGULAR_BULLISH | hid_bull * HIDDEN_BULLISH |
+             reg_bear * REGULAR_BEARISH | hid_bear * HIDDEN_BEARISH).astype(np.uint8)
+
+    # 3. Date every flag on the bar that confirms the later swing
+    delay = order + tolerance
+    out = np.zeros_like(flags)
+    if len(flags) > delay:
+        out[delay:] = flags[:len(flags) - delay]
+    return out
+
+def latest(flags, recent=RECENT):
+    """
+    Flags confirmed within the last `recent` bars (OR over the window).
+    Returns: int (1-D input) or int array per symbol (2-D input)
+    """
+    flags = np.asarray(flags)
+    return np.bitwise_or.reduce(flags[-recent:], axis=0) if len(flags) else 0
+
+def label(flags):
+    """
+    Display string of a flag value ("None" when no divergence).
+    """
+    parts = [text for bit, text in FLAG_LABELS.items() if int(flags) & bit]
+    return ", ".join(parts) if parts else "None"
+
+def detect_frame(df, columns=("RSI", "Hist", "K"), price="Close"):
+    """
+    Divergence flags of the price against each indicator column of an analysis frame
+    (backtests, charts).
+    Returns: DataFrame (same index) with one "Div_<column>" uint8 column per indicator
+    """
+    close = df[price].to_numpy(dtype=np.float64)
+    return pd.DataFrame({f"Div_{col}": detect(close, df[col].to_numpy(dtype=np.float64))
+                         for col in columns if col in df}, index=df.index)
+
+def _is_swing(x, i, order, sign):
+    """
+    Scalar version of `swings` for position i of a list (sign +1: high, -1: low).
+    """
+    c, left, right = x[i], x[i - order:i], x[i + 1:i + order + 1]
+    if c != c or any(v != v for v in left) or any(v != v for v in right): return False
+    if sign > 0: return c > max(left) and c >= max(right)
+    return c < min(left) and c <= min(right)
+
+class StreamingDivergence:
+    """
+    `detect` for one price / indicator pair, one bar at a time in O(1): keeps the last
+    2 * (order + tolerance) bars, the last matched swing of each kind and the flags of the
+    last `recent - 1` bars. `latest(price, value)` of a pending bar equals
+    `latest(detect(full history + pending bar))`.
+    """
+    def __init__(self, order=ORDER, tolerance=TOLERANCE, max_gap=MAX_GAP, recent=RECENT):
+        self.order, self.tolerance, self.max_gap = order, tolerance, max_gap
+        self.delay = order + tolerance
+        size = 2 * self.delay
+        self._price = deque([np.nan] * size, maxlen=size)  # NaN = before the first bar
+        self._value = deque([np.nan] * size, maxlen=size)
+        self._flags = deque(maxlen=recent - 1)
+        self._last = {1: None, -1: None}  # sign -> (bar, price, value) of the last matched swing
+        self._n = 0                       # committed bars
+
+    def _evaluate(self, price, value):
+        """
+        Flags confirmed by a bar with these values.
+        Returns: (flags, Dictionary of sign -> matched swing it confirms)
+        """
+        p, v = [*self._price, price], [*self._value, value]
+        o, tol = self.order, self.tolerance
+        t, bar = len(p) - 1 - self.delay, self._n - self.delay
+        flags, found = 0, {}
+        for sign in (1, -1):
+            if not _is_swing(p, t, o, sign): continue
+            if not any(_is_swing(v, s, o, sign) for s in range(t - tol, t + tol + 1)): continue
+            near = [x for x in v[t - tol:t + tol + 1] if x == x]
+            found[sign] = (bar, p[t], max(near) if sign > 0 else min(near))
+            last = self._last[sign]
+            if last is None or bar - last[0] > self.max_gap: continue
+            dp, dv = sign * (p[t] - last[1]), sign * (found[sign][2] - last[2])
+            if dp > 0 and dv < 0: flags |= REGULAR_BEARISH if sign > 0 else REGULAR_BULLISH
+            if dp < 0 and dv > 0: flags |= HIDDEN_BEARISH if sign > 0 else HIDDEN_BULLISH
+        return flags, found
+
+    def push(self, price, value):
+        """
+        Commits one bar. Returns: its flags
+        """
+        flags, found = self._evaluate(float(price), float(value))
+        self._last.update(found)
+        self._price.append(float(price))
+        self._value.append(float(value))
+        self._flags.append(flags)
+        self._n += 1
+        return flags
+
+    def latest(self, price, value):
+        """
+        `latest` flags with a pending (uncommitted) bar as the last bar.
+        """
+        flags, _ = self._evaluate(float(price), float(value))
+        for f in self._flags:
+            flags |= f
+        return flags
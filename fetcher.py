@@ -0,0 +1,376 @@
+"""
+Asyncio fetch layer for bars and stock names.
+
+- Bounded concurrency (semaphore) plus a token bucket shared by every request, so bursts
+  from the screener or several Streamlit sessions stay under the provider's rate limit.
+- Transient failures (rate limit, 5xx, network) are retried with exponential backoff + jitter.
+- Identical in-flight requests are coalesced: a second caller for the same symbol awaits the
+  request already running instead of issuing its own.
+- `probe` downloads the `.TW` and `.TWO` (OTC) candidates concurrently, and `lookup` also runs
+  the name lookup alongside the price download.
+
+Sources are pluggable: `YFinanceSource` (default, yfinance calls in worker threads) and
+`YahooChartSource`, which speaks the Yahoo chart/search JSON API over plain HTTP against any
+base URL (e.g. the local fake server in `benchmarks/fake_server.py`). Setting QUANT_YAHOO_URL
+points the default fetcher at such a server.
+
+Synchronous callers (Streamlit, `BarStore`) go through `run`/`submit`, which execute the
+coroutines on one background event loop so the limits hold across threads.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import instrumentation
+
+YAHOO_URL = os.environ.get("QUANT_YAHOO_URL")
+
+# Ranges the chart endpoint accepts directly
+_CHART_RANGES = {"1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"}
+
+# Blocking sources run here; sized for I/O rather than the CPU-based default executor
+_IO_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fetch-io")
+
+def _reset_io_pool():
+    # A forked child inherits the pool's bookkeeping but none of its threads
+    global _IO_POOL
+    _IO_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fetch-io")
+
+os.register_at_fork(after_in_child=_reset_io_pool)
+
+async def _in_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_IO_POOL, fn, *args)
+
+class RetryableError(Exception):
+    """
+    Transient failure (rate limited, server error, network): the request is retried.
+    """
+
+# ---- sources ----
+class YFinanceSource:
+    """
+    yfinance calls run in worker threads. `Ticker.history` is used instead of `yf.download`
+    because concurrent `download` calls share module-level state. yfinance is imported on
+    first use (the app's cold start does not pay for it).
+    """
+    async def bars(self, symbol, start=None, period="1y", interval="1d"):
+        return await _in_thread(self._bars, symbol, start, period, interval)
+
+    async def name(self, symbol):
+        return await _in_thread(self._name, symbol)
+
+    def _bars(self, symbol, start, period, interval="1d"):
+        import yfinance as yf
+        try:
+            t = yf.Ticker(symbol)
+            if start is not None:
+                df = t.history(start=start, interval=interval)
+            else:
+                df = t.history(period=period, interval=interval)
+        except yf.exceptions.YFRateLimitError as e:
+            raise RetryableError(str(e)) from e
+        except (OSError, ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+        return bar_store.normalize_bars(df)
+
+    def _name(self, symbol):
+        import yfinance as yf
+        try:
+            info = yf.Ticker(symbol).info
+        except yf.exceptions.YFRateLimitError as e:
+            raise RetryableError(str(e)) from e
+        except Exception:
+            return None
+        return info.get('longName') or info.get('shortName')
+
+class YahooChartSource:
+    """
+    Yahoo chart (`/v8/finance/chart`) and search (`/v1/finance/search`) endpoints over HTTP.
+    Adjusted like `yf.download(auto_adjust=True)`: OHLC scaled by adjclose / close.
+    """
+    def __init__(self, base_url="https://query2.finance.yahoo.com", timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _get_json(self, path, params):
+        url = f"{self.base_url}{path}?{urllib.parse.urlencode(params)}"
+        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise RetryableError(f"HTTP {e.code} for {path}") from e
+            return None  # 404 etc.: unknown symbol
+        except (urllib.error.URLError, OSError) as e:
+            raise RetryableError(str(e)) from e
+
+    async def bars(self, symbol, start=None, period="1y", interval="1d"):
+        params = {"interval": interval, "events": "div,split", "includeAdjustedClose": "true"}
+        if start is not None:
+            params["period1"] = int(pd.Timestamp(start).timestamp())
+            params["period2"] = int(time.time()) + 86400
+        elif period in _CHART_RANGES:
+            params["range"] = period
+        else:
+            params["period1"] = int(bar_store.period_start(period).timestamp())
+            params["period2"] = int(time.time()) + 86400
+        path = f"/v8/finance/chart/{urllib.parse.quote(symbol)}"
+        payload = await _in_thread(self._get_json, path, params)
+        return parse_chart(payload, intraday=interval != "1d")
+
+    async def name(self, symbol):
+        payload = await _in_thread(self._get_json, "/v1/finance/search",
+                                  {"q": symbol, "quotesCount": 5, "newsCount": 0})
+        for q in (payload or {}).get("quotes", []):
+            if q.get("symbol") == symbol:
+                return q.get("longname") or q.get("shortname")
+        return None
+
+def parse_chart(payload, adjust=True, intraday=False):
+    """
+    Converts a chart endpoint payload to the canonical bar layout (see `bar_store.normalize_bars`).
+    Intraday bars keep their exchange-local time of day; daily bars keep only the date.
+    """
+    result = ((payload or {}).get("chart") or {}).get("result") or []
+    if not result or not result[0].get("timestamp"):
+        return bar_store.normalize_bars(None)
+    r = result[0]
+    quote = r["indicators"]["quote"][0]
+    # Bars are stamped in UTC; shift to exchange time (daily bars: keep the date)
+    offset = r.get("meta", {}).get("gmtoffset", 0)
+    index = pd.to_datetime(np.asarray(r["timestamp"], dtype=np.int64) + offset, unit="s")
+    if not intraday:
+        index = index.normalize()
+    df = pd.DataFrame({f: np.array(quote.get(f.lower(), []), dtype=float) for f in bar_store.OHLCV_COLUMNS},
+                      index=index)
+    adjclose = (r["indicators"].get("adjclose") or [{}])[0].get("adjclose")
+    if adjust and adjclose:
+        ratio = np.array(adjclose, dtype=float) / df['Close'].to_numpy()
+        for f in ["Open", "High", "Low"]:
+            df[f] = df[f] * ratio
+        df['Close'] = np.array(adjclose, dtype=float)
+    return bar_store.normalize_bars(df)
+
+# ---- rate limiting ----
+class TokenBucket:
+    """
+    `rate` requests per second on average, bursts up to `capacity`.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncFetcher:
+    """
+    Concurrency-limited, rate-limited, retrying and coalescing front end to a source.
+    One instance belongs to one event loop (the background loop for `get_default_fetcher`).
+    """
+    def __init__(self, source=None, max_concurrency=8, rate=8.0, burst=8, retries=3,
+                 backoff=0.5, max_backoff=8.0):
+        self.source = source or (YahooChartSource(YAHOO_URL) if YAHOO_URL else YFinanceSource())
+        self.max_concurrency = max_concurrency
+        self.rate, self.burst = rate, burst
+        self.retries, self.backoff, self.max_backoff = retries, backoff, max_backoff
+        self.stats = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0}
+        self._inflight = {}
+        self._semaphore = None
+        self._bucket = None
+        self._pid = None
+
+    def _limits(self):
+        # Created lazily so they bind to the loop that runs the first request;
+        # rebuilt in a forked child, where the parent's loop is gone
+        if self._semaphore is None or self._pid != os.getpid():
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = TokenBucket(self.rate, self.burst)
+            self._inflight = {}
+            self._pid = os.getpid()
+        return self._semaphore, self._bucket
+
+    async def _with_retry(self, fn, *args):
+        semaphore, bucket = self._limits()
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                await bucket.acquire()
+                self.stats["requests"] += 1
+                try:
+                    # Upstream round trip only (queueing for the semaphore / token bucket excluded)
+                    with instrumentation.stage("fetch.request"):
+                        return await fn(*args)
+                except RetryableError as e:
+                    error = e
+            if attempt == self.retries: break
+            self.stats["retries"] += 1
+            # Backoff outside the semaphore so other symbols keep flowing
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+        self.stats["failures"] += 1
+        raise error
+
+    async def _request(self, key, fn, *args):
+        self._limits()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._with_retry(fn, *args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None)
+        else:
+            self.stats["coalesced"] += 1
+        # Shielded: one caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def bars(self, symbol, start=None, period="1y", interval="1d"):
+        """
+        Bars (daily by default) for one symbol. Raises RetryableError once retries are exhausted.
+        """
+        start = pd.Timestamp(start) if start is not None else None
+        return await self._request(("bars", symbol, start, period, interval), self.source.bars,
+                                   symbol, start, period, interval)
+
+    async def name(self, symbol):
+        return await self._request(("name", symbol), self.source.name, symbol)
+
+    async def bars_many(self, symbols, start=None, period="1y", interval="1d"):
+        """
+        Returns: Dictionary of symbol -> DataFrame (empty on failure)
+        """
+        symbols = list(symbols)
+        results = await asyncio.gather(*(self.bars(s, start, period, interval) for s in symbols),
+                                       return_exceptions=True)
+        out = {}
+        for s, res in zip(symbols, results):
+            if isinstance(res, BaseException):
+                print(f"Error fetching {s}: {res}")
+                res = bar_store.normalize_bars(None)
+            out[s] = res
+        return out
+
+    async def names(self, symbols):
+        """
+        Returns: Dictionary of symbol -> name (None when unknown or failed)
+        """
+        symbols = list(symbols)
+        results = await asyncio.gather(*(self.name(s) for s in symbols), return_exceptions=True)
+        return {s: (None if isinstance(res, BaseException) else res) for s, res in zip(symbols, results)}
+
+    async def probe(self, symbol, start=None, period="1y", interval="1d"):
+        """
+        Downloads `.TW` and its `.TWO` fallback concurrently and keeps the one with data.
+        Returns: (resolved symbol, DataFrame)
+        """
+        if not symbol.endswith(".TW"):
+            return symbol, (await self.bars_many([symbol], start, period, interval))[symbol]
+        otc = symbol.replace(".TW", ".TWO")
+        frames = await self.bars_many([symbol, otc], start, period, interval)
+        if frames[symbol].empty and not frames[otc].empty:
+            return otc, frames[otc]
+        return symbol, frames[symbol]
+
+    async def probe_many(self, symbols, start=None, period="1y", interval="1d"):
+        """
+        Returns: Dictionary of symbol -> (resolved symbol, DataFrame)
+        """
+        symbols = list(symbols)
+        results = await asyncio.gather(*(self.probe(s, start, period, interval) for s in symbols))
+        return dict(zip(symbols, results))
+
+    async def lookup(self, symbol, period="1y"):
+        """
+        Price probe and name lookup in parallel.
+        Returns: (DataFrame, resolved symbol, name or None)
+        """
+        candidates = [symbol] + ([symbol.replace(".TW", ".TWO")] if symbol.endswith(".TW") else [])
+        (resolved, df), names = await asyncio.gather(self.probe(symbol, period=period), self.names(candidates))
+        return df, resolved, names.get(resolved)
+
+# ---- synchronous bridge ----
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    global _loop, _loop_pid
+    with _loop_lock:
+        # A forked child inherits `_loop` but not the thread running it
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="fetcher-loop", daemon=True).start()
+    return _loop
+
+def submit(coro):
+    """
+    Schedules a coroutine on the background loop.
+    Returns: concurrent.futures.Future
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop())
+
+def run(coro, timeout=None):
+    """
+    Runs a coroutine on the background loop and waits for its result.
+    """
+    return submit(coro).result(timeout)
+
+_default_fetcher = None
+
+def get_default_fetcher():
+    """
+    Process-wide fetcher used on the background loop (shared limits and coalescing).
+    """
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = AsyncFetcher()
+    return _default_fetcher
+
+def set_default_fetcher(fetcher):
+    """
+    Swaps the process-wide fetcher (e.g. one over a YahooChartSource pointed at a fake server).
+    """
+    global _default_fetcher
+    _default_fetcher = fetcher
+
+class AsyncProvider:
+    """
+    `BarStore` provider backed by the async fetcher: batches run concurrently and
+    `probe_many` lets the store resolve `.TW` / `.TWO` in one round trip.
+    """
+    def __init__(self, fetcher=None):
+        self.fetcher = fetcher
+
+    def _fetcher(self):
+        return self.fetcher or get_default_fetcher()
+
+    def fetch(self, symbol, start=None, period="1y", interval="1d"):
+        return self.fetch_many([symbol], start=start, period=period, interval=interval)[symbol]
+
+    def fetch_many(self, symbols, start=None, period="1y", interval="1d"):
+        return run(self._fetcher().bars_many(symbols, start=start, period=period, interval=interval))
+
+    def probe_many(self, symbols, period="1y", interval="1d"):
+        return run(self._fetcher().probe_many(symbols, period=period, interval=interval))
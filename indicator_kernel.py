@@ -0,0 +1,286 @@
+"""
+Fused, array-native indicator kernel.
+
+Computes every indicator of the `analyze_stock` pipeline in one pass over contiguous
+NumPy arrays, either 1-D (one symbol) or 2-D (bars x symbols). Shared intermediates
+(previous close, true range, rolling sums, the MA20 window) are computed once and all
+outputs are written into a single preallocated block.
+
+Semantics follow the pandas reference functions in `stock_analysis` (warm-up NaNs,
+`min_periods == window`, EWM `adjust=False` incl. NaN handling).
+"""
+import numpy as np
+
+FIELDS = ("MA5", "MA20", "MA60", "BB_Mid", "BB_Std", "BB_Up", "BB_Low", "K", "D", "RSI",
+          "MACD", "Signal", "Hist", "ATR", "ADX", "MV5", "MV20")
+FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+# Window parameters of the pipeline (the constants hard-coded in stock_analysis)
+DEFAULT_WINDOWS = {
+    "ma_short": 5, "ma_mid": 20, "ma_long": 60,
+    "bb_window": 20, "bb_k": 2.0,
+    "kd_window": 9, "kd_com": 2,
+    "rsi_window": 14,
+    "macd_fast": 12, "macd_slow": 26, "macd_signal": 9,
+    "atr_window": 14, "adx_window": 14,
+    "mv_short": 5, "mv_long": 20,
+}
+
+class IndicatorArrays:
+    """
+    Preallocated (field x bars [x symbols]) block returned by `compute`.
+    `arrays["RSI"]` is a view, no copy.
+    """
+    def __init__(self, shape, dtype=np.float64):
+        self.data = np.empty((len(FIELDS),) + tuple(shape), dtype=dtype)
+
+    def __getitem__(self, name):
+        return self.data[FIELD_INDEX[name]]
+
+    def __setitem__(self, name, values):
+        self.data[FIELD_INDEX[name]] = values
+
+    def keys(self):
+        return FIELDS
+
+    def items(self):
+        return ((name, self[name]) for name in FIELDS)
+
+def _as_2d(x):
+    x = np.asarray(x, dtype=np.float64)
+    return x.reshape(-1, 1) if x.ndim == 1 else x
+
+def _cumsum0(x):
+    # Cumulative sum with a leading zero row: window sums become c[t+1] - c[t+1-w]
+    c = np.zeros((x.shape[0] + 1,) + x.shape[1:])
+    np.cumsum(x, axis=0, out=c[1:])
+    return c
+
+def prefix_sums(x):
+    """
+    Prefix sums shared by every rolling mean over `x`.
+    Returns: (sums, counts) - counts is None when `x` has no NaN (fast path)
+    """
+    valid = ~np.isnan(x)
+    if valid.all():
+        return _cumsum0(x), None
+    return _cumsum0(np.where(valid, x, 0.0)), _cumsum0(valid.astype(np.float64))
+
+def rolling_mean(x, window, out=None, prefix=None):
+    """
+    Rolling mean with pandas `min_periods=window` semantics: any NaN in the window -> NaN.
+    Pass `prefix` (from `prefix_sums`) to reuse the cumulative sums across windows.
+    """
+    T = x.shape[0]
+    out = np.full(x.shape, np.nan) if out is None else out
+    sums, counts = prefix if prefix is not None else prefix_sums(x)
+    if T >= window:
+        s = sums[window:] - sums[:-window]
+        if counts is None:
+            np.divide(s, window, out=out[window - 1:])
+        else:
+            n = counts[window:] - counts[:-window]
+            out[window - 1:] = np.where(n == window, s / window, np.nan)
+    out[:min(window - 1, T)] = np.nan
+    return out
+
+def rolling_std(x, window, mean, out=None):
+    """
+    Rolling sample std (ddof=1) from centered window sums, reusing the rolling `mean`.
+    Values are shifted by their column mean first to keep the square sums small.
+    """
+    T = x.shape[0]
+    out = np.full(x.shape, np.nan) if out is None else out
+    valid = ~np.isnan(x)
+    shift = np.where(valid, x, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    dev = x - shift
+    sq = _cumsum0(np.where(np.isnan(dev), 0.0, dev * dev))
+    if T >= window:
+        s2 = sq[window:] - sq[:-window]
+        m = mean[window - 1:] - shift
+        var = (s2 - window * m * m) / (window - 1)
+        out[window - 1:] = np.sqrt(np.maximum(var, 0.0))
+        out[window - 1:][np.isnan(mean[window - 1:])] = np.nan
+    out[:min(window - 1, T)] = np.nan
+    return out
+
+def rolling_extreme(x, window, fn):
+    """
+    Rolling min/max (fn = np.min / np.max) over a strided window view; NaN in window -> NaN.
+    """
+    out = np.full(x.shape, np.nan)
+    if x.shape[0] >= window:
+        view = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)
+        out[window - 1:] = fn(view, axis=-1)
+    return out
+
+def _ewm_loop(x, alpha):
+    # Scalar recurrence mirroring pandas' ewma (adjust=False, ignore_na=False) for columns with gaps
+    out = np.empty_like(x)
+    weighted, old_wt = np.nan, 1.0
+    for t, cur in enumerate(x):
+        if weighted != weighted:
+            if cur == cur: weighted = cur
+        else:
+            old_wt *= 1.0 - alpha
+            if cur == cur:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.0
+        out[t] = weighted
+    return out
+
+def ewm_mean(x, alpha, out=None):
+    """
+    `ewm(alpha=alpha, adjust=False).mean()` vectorized over symbols.
+    The recurrence y[t] = r*y[t-1] + a*x[t] is solved in closed form per block of bars
+    (block length keeps r**-B within float range), so only T/B Python iterations remain.
+    Columns with interior NaNs fall back to an exact scalar loop.
+    """
+    T, N = x.shape
+    out = np.empty_like(x) if out is None else out
+    if T == 0: return out
+    r = 1.0 - alpha
+    valid = ~np.isnan(x)
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), T)
+    gaps = valid.sum(axis=0) != (T - first)
+    cols = ~gaps
+
+    if cols.any():
+        xs = x[:, cols]
+        f = first[cols]
+        # Leading NaNs are filled with the first valid value: the recurrence then holds that
+        # value until the real start, which reproduces pandas' "start at first observation".
+        seed = xs[np.minimum(f, T - 1), np.arange(xs.shape[1])]
+        xs = np.where(np.arange(T)[:, None] < f, seed, xs)
+        block = max(1, min(T, int(27.0 / -np.log(r)) if r > 0 else 1))
+        powers = r ** -np.arange(block, dtype=np.float64)
+        decay = r ** np.arange(block, dtype=np.float64)
+        res = np.empty_like(xs)
+        # y[0] = x[0]: seeding the carry with x[0] gives r*x0 + a*x0 = x0
+        carry = xs[0]
+        for start in range(0, T, block):
+            stop = min(start + block, T)
+            n = stop - start
+            acc = np.cumsum(xs[start:stop] * powers[:n, None], axis=0)
+            res[start:stop] = decay[:n, None] * (r * carry + alpha * acc)
+            carry = res[stop - 1]
+        res[np.arange(T)[:, None] < f] = np.nan
+        out[:, cols] = res
+
+    for j in np.flatnonzero(gaps):
+        out[:, j] = _ewm_loop(x[:, j], alpha)
+    return out
+
+def _memo(cache, key, fn):
+    # Intermediates are keyed by the window parameters they depend on, so parameter
+    # combinations that share a window reuse the arrays instead of recomputing them
+    if cache is None: return fn()
+    if key not in cache:
+        cache[key] = fn()
+    return cache[key]
+
+def compute(high, low, close, volume, windows=None, cache=None):
+    """
+    Computes all indicators at once.
+    Inputs are 1-D (bars) or 2-D (bars x symbols) arrays; returns an `IndicatorArrays`
+    whose fields have the same shape as `close`.
+    `cache` (optional dict, one per input dataset) memoizes intermediates across calls
+    with different `windows`, e.g. in a parameter sweep.
+    """
+    w = dict(DEFAULT_WINDOWS, **(windows or {}))
+    shape = np.shape(close)
+    high, low, close, volume = _as_2d(high), _as_2d(low), _as_2d(close), _as_2d(volume)
+    T, N = close.shape
+    res = IndicatorArrays((T, N))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Shared intermediates
+        def base():
+            prev_close = np.empty_like(close)
+            prev_close[:1] = np.nan
+            prev_close[1:] = close[:-1]
+            true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+            up_move = np.empty_like(high)
+            up_move[:1] = np.nan
+            np.subtract(high[1:], high[:-1], out=up_move[1:])
+            down_move = np.empty_like(low)
+            down_move[:1] = np.nan
+            np.subtract(low[:-1], low[1:], out=down_move[1:])
+            return {
+                "prev_close": prev_close,
+                "close_sums": prefix_sums(close),
+                "volume_sums": prefix_sums(volume),
+                "true_range": true_range,
+                "tr_sums": prefix_sums(true_range),
+                "plus_dm": np.where((up_move > down_move) & (up_move > 0), up_move, 0.0),
+                "minus_dm": np.where((down_move > up_move) & (down_move > 0), down_move, 0.0),
+            }
+        b = _memo(cache, ("base",), base)
+
+        def ma(window):
+            return _memo(cache, ("ma", window), lambda: rolling_mean(close, window, prefix=b["close_sums"]))
+
+        def atr(window):
+            return _memo(cache, ("atr", window), lambda: rolling_mean(b["true_range"], window, prefix=b["tr_sums"]))
+
+        def ema(span):
+            return _memo(cache, ("ema", span), lambda: ewm_mean(close, 2.0 / (span + 1)))
+
+        # 1. Trend & Bollinger (one prefix sum for all MAs; MA20 doubles as the Bollinger mid)
+        res["MA5"] = ma(w["ma_short"])
+        res["MA20"] = ma(w["ma_mid"])
+        res["MA60"] = ma(w["ma_long"])
+        res["BB_Mid"] = ma(w["bb_window"])
+        res["BB_Std"] = _memo(cache, ("bb_std", w["bb_window"]),
+                              lambda: rolling_std(close, w["bb_window"], ma(w["bb_window"])))
+        np.multiply(res["BB_Std"], w["bb_k"], out=res["BB_Up"])
+        np.subtract(res["BB_Mid"], res["BB_Up"], out=res["BB_Low"])
+        res["BB_Up"] += res["BB_Mid"]
+
+        # 2. KD
+        def kd():
+            low_min = rolling_extreme(low, w["kd_window"], np.min)
+            high_max = rolling_extreme(high, w["kd_window"], np.max)
+            rsv = 100 * (close - low_min) / (high_max - low_min)
+            kd_alpha = 1.0 / (1.0 + w["kd_com"])
+            k = ewm_mean(rsv, kd_alpha)
+            return k, ewm_mean(k, kd_alpha)
+        res["K"], res["D"] = _memo(cache, ("kd", w["kd_window"], w["kd_com"]), kd)
+
+        # 3. RSI (NaN first delta counts as zero gain/loss, like Series.where)
+        def rsi():
+            delta = close - b["prev_close"]
+            gain = rolling_mean(np.where(delta > 0, delta, 0.0), w["rsi_window"])
+            loss = rolling_mean(np.where(delta < 0, -delta, 0.0), w["rsi_window"])
+            return 100 - 100 / (1 + gain / loss)
+        res["RSI"] = _memo(cache, ("rsi", w["rsi_window"]), rsi)
+
+        # 4. MACD
+        def macd():
+            line = ema(w["macd_fast"]) - ema(w["macd_slow"])
+            signal = ewm_mean(line, 2.0 / (w["macd_signal"] + 1))
+            return line, signal, line - signal
+        res["MACD"], res["Signal"], res["Hist"] = _memo(
+            cache, ("macd", w["macd_fast"], w["macd_slow"], w["macd_signal"]), macd)
+
+        # 5. ATR / ADX share the true range
+        res["ATR"] = atr(w["atr_window"])
+
+        def adx():
+            window = w["adx_window"]
+            plus_di = 100 * (rolling_mean(b["plus_dm"], window) / atr(window))
+            minus_di = 100 * (rolling_mean(b["minus_dm"], window) / atr(window))
+            dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+            return rolling_mean(dx, window)
+        res["ADX"] = _memo(cache, ("adx", w["adx_window"]), adx)
+
+        # 6. Volume
+        res["MV5"] = _memo(cache, ("mv", w["mv_short"]),
+                           lambda: rolling_mean(volume, w["mv_short"], prefix=b["volume_sums"]))
+        res["MV20"] = _memo(cache, ("mv", w["mv_long"]),
+                            lambda: rolling_mean(volume, w["mv_long"], prefix=b["volume_sums"]))
+
+    if len(shape) == 1:
+        res.data = res.data.reshape((len(FIELDS),) + shape)
+    return res
@@ -0,0 +1,129 @@
+"""
+Stage timings and counters for the hot paths (per process).
+
+    with instrumentation.stage("analyze.indicators"):
+        ...
+    instrumentation.count("analyze.result_cache.hit")
+
+A `Registry` keeps per stage: calls, errors (the block raised), total / max seconds and the
+most recent durations for percentiles; counters are plain integers. `snapshot()` is
+JSON-ready and is what the app's debug panel, `api_server` (/v1/timings) and
+`benchmarks/suite.py` export. Recording costs two `perf_counter` calls and a lock per
+stage; set QUANT_TIMING=0 to turn it off.
+"""
+import contextlib
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+RECENT = 512 # durations kept per stage for p50 / p95
+
+class Registry:
+    """
+    Thread-safe stage timings and counters.
+    """
+    def __init__(self, enabled=True, recent=RECENT):
+        self.enabled = enabled
+        self.recent = recent
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+            self.since = time.time()
+
+    def record(self, name, seconds, error=False):
+        """
+        Adds one duration to a stage (for timings measured by the caller).
+        """
+        if not self.enabled: return
+        with self._lock:
+            s = self._stages.get(name)
+            if s is None:
+                s = self._stages[name] = {"calls": 0, "errors": 0, "total": 0.0, "max": 0.0,
+                                          "recent": deque(maxlen=self.recent)}
+            s["calls"] += 1
+            s["errors"] += bool(error)
+            s["total"] += seconds
+            s["max"] = max(s["max"], seconds)
+            s["recent"].append(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled: return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times the block; an exception leaving it is counted as an error of the stage
+        (and re-raised).
+        """
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(name, time.perf_counter() - t0, error=True)
+            raise
+        self.record(name, time.perf_counter() - t0)
+
+    def snapshot(self):
+        """
+        Returns: {"since", "stages": {name: {calls, errors, total_s, mean_ms, p50_ms, p95_ms,
+                 max_ms}}, "counters": {name: int}}
+        """
+        with self._lock:
+            stages = {name: dict(s, recent=np.fromiter(s["recent"], dtype=np.float64))
+                      for name, s in self._stages.items()}
+            counters = dict(self._counters)
+            since = self.since
+        out = {}
+        for name, s in sorted(stages.items()):
+            p50, p95 = np.percentile(s["recent"], [50, 95]) * 1e3 if len(s["recent"]) else (0.0, 0.0)
+            out[name] = {"calls": s["calls"], "errors": s["errors"], "total_s": s["total"],
+                         "mean_ms": s["total"] / s["calls"] * 1e3, "p50_ms": float(p50),
+                         "p95_ms": float(p95), "max_ms": s["max"] * 1e3}
+        return {"since": since, "stages": out, "counters": dict(sorted(counters.items()))}
+
+_default_registry = Registry(enabled=os.environ.get("QUANT_TIMING", "1") != "0")
+
+def get_default_registry():
+    return _default_registry
+
+def set_default_registry(registry):
+    global _default_registry
+    _default_registry = registry
+
+# Module-level shortcuts on the process-wide registry
+def stage(name):
+    return _default_registry.stage(name)
+
+def record(name, seconds, error=False):
+    _default_registry.record(name, seconds, error)
+
+def count(name, n=1):
+    _default_registry.count(name, n)
+
+def timed(name):
+    """
+    Decorator resolving the registry at call time (so `set_default_registry` applies).
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with _default_registry.stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def snapshot():
+    return _default_registry.snapshot()
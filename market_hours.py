@@ -0,0 +1,56 @@
+"""
+TWSE trading session helpers (Asia/Taipei, Mon-Fri 09:00-13:30).
+Exchange holidays are not modelled: a holiday just looks like a session without new bars.
+"""
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("Asia/Taipei")
+SESSION_OPEN = dt.time(9, 0)
+SESSION_CLOSE = dt.time(13, 30)
+
+def now_tw():
+    return dt.datetime.now(TZ)
+
+def to_tw(ts):
+    """
+    Epoch seconds / naive (taken as Taipei time) / aware datetime -> aware Taipei datetime.
+    """
+    if isinstance(ts, (int, float)):
+        return dt.datetime.fromtimestamp(ts, TZ)
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=TZ)
+    return ts.astimezone(TZ)
+
+def is_trading_day(day):
+    return day.weekday() < 5
+
+def session_bounds(day):
+    """
+    Returns: (open, close) aware datetimes for the given date
+    """
+    return (dt.datetime.combine(day, SESSION_OPEN, TZ), dt.datetime.combine(day, SESSION_CLOSE, TZ))
+
+def is_open(now=None):
+    now = to_tw(now or now_tw())
+    if not is_trading_day(now.date()): return False
+    open_at, close_at = session_bounds(now.date())
+    return open_at <= now < close_at
+
+def last_close(now=None):
+    """
+    Most recent session close at or before `now`.
+    """
+    now = to_tw(now or now_tw())
+    day = now.date()
+    while True:
+        if is_trading_day(day):
+            close_at = session_bounds(day)[1]
+            if close_at <= now: return close_at
+        day -= dt.timedelta(days=1)
+
+def next_trading_day(day):
+    day += dt.timedelta(days=1)
+    while not is_trading_day(day):
+        day += dt.timedelta(days=1)
+    return day
@@ -0,0 +1,299 @@
+"""
+Append-only history of the daily `metrics` (score, pivots, bias, divergences, pattern)
+of every analysed symbol, so research can look at yesterday's score without recomputing.
+
+Layout under `<data dir>/metrics/`:
+
+    date=2026-10-16/part-<time>-<pid>-<n>.arrow
+    date=2026-10-17/...
+
+Each part is an uncompressed Arrow IPC file (one row per symbol and bar date), written to a
+temporary name and renamed, so readers never see a partial file and writers in different
+processes never touch the same file. Columns are flat: the nested `pivots` become the same
+columns as in the screener table (`pivot`, `r1`, ..., `nh`, `nl`), and the repetitive strings
+(`symbol`, `name`, `trend`, `pattern`, divergence labels) are dictionary-encoded.
+
+Readers memory-map the parts (`pa.memory_map` + `pa.ipc.open_file`): column projection and
+the numeric buffers are zero-copy views of the page cache, only the rows a query keeps are
+materialized. The same (symbol, date) can be recorded several times (intraday updates of
+the day's bar, several processes); queries keep the latest record. `compact` merges the
+parts of a finished day into one file sorted by symbol (the scheduler does this).
+
+    history = get_default_history()
+    history.read(["2330.TW"], start="2026-09-01", fields=["score", "rsi", "nh"])
+    history.pivot("score", start="2026-09-01")        # date x symbol
+"""
+import datetime as dt
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import bar_store
+
+DEFAULT_HISTORY_DIR = os.path.join(bar_store.DEFAULT_DATA_DIR, "metrics")
+ENABLED = os.environ.get("QUANT_HISTORY", "1") != "0"
+
+SPARKLINE_DAYS = 90 # calendar days of history behind the app's score sparklines
+WRITTEN_DATES = 5   # most recent bar dates whose last written rows are remembered for de-duplication
+
+# Only daily metrics are kept (one row per symbol and trading day)
+TIMEFRAMES = ("1d",)
+
+PIVOT_FIELDS = ["pivot", "r1", "s1", "r2", "s2", "cdp", "ah", "nh", "nl", "al"]
+NUMERIC_FIELDS = ["open", "high", "low", "close", "prev_close", "volume", "mv5", "mv20", "vol_change",
+                  "ma5", "ma20", "ma60", "bias_ma20", "bias_ma60", "k", "d", "rsi", "macd", "macd_hist",
+                  "macd_hist_prev", "bb_up", "bb_low", "bb_width", "atr", "adx", "stop_loss", "score"] + PIVOT_FIELDS
+LABEL_FIELDS = ["name", "trend", "div_rsi", "div_macd", "pattern"]
+
+_LABEL = pa.dictionary(pa.int32(), pa.string())
+SCHEMA = pa.schema([pa.field("date", pa.date32()), pa.field("symbol", _LABEL),
+                    pa.field("recorded_at", pa.timestamp("ms"))]
+                   + [pa.field(f, pa.float64()) for f in NUMERIC_FIELDS]
+                   + [pa.field(f, _LABEL) for f in LABEL_FIELDS],
+                   metadata={"format": "metrics-history/1"})
+KEY_FIELDS = ["date", "symbol", "recorded_at"]
+
+def flatten(metrics):
+    """
+    Metrics dict -> flat row: `pivots` spread into top-level columns (as in the screener).
+    """
+    row = {k: v for k, v in metrics.items() if k != 'pivots'}
+    row.update(metrics.get('pivots') or {})
+    return row
+
+def _bar_date(value):
+    if type(value) is dt.date: return value
+    return pd.Timestamp(value).date()
+
+def _fingerprint(row):
+    return tuple(row.get(f) for f in ("close", "volume", "score", "div_rsi", "div_macd"))
+
+def _to_table(rows, recorded_at):
+    """
+    Flat rows of one date -> Arrow table in SCHEMA order, sorted by symbol.
+    """
+    rows = sorted(rows, key=lambda r: r['symbol'])
+    n = len(rows)
+    columns = [pa.array([_bar_date(r['date']) for r in rows], pa.date32()),
+               pa.array([r['symbol'] for r in rows]).dictionary_encode(),
+               pa.array(np.full(n, recorded_at, dtype="datetime64[ms]"))]
+    columns += [pa.array(np.array([r.get(f, np.nan) for r in rows], dtype=np.float64)) for f in NUMERIC_FIELDS]
+    columns += [pa.array([None if r.get(f) is None else str(r[f]) for r in rows], pa.string()).dictionary_encode()
+                for f in LABEL_FIELDS]
+    return pa.Table.from_arrays(columns, schema=SCHEMA)
+
+def _write_ipc(table, path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+def _read_part(path, columns=None):
+    """
+    Memory-mapped read of one part (None if it disappeared, e.g. compacted meanwhile).
+    """
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    except FileNotFoundError:
+        return None
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+class MetricsHistory:
+    """
+    Date-partitioned Arrow IPC dataset of daily metrics under `root`.
+    """
+    def __init__(self, root=DEFAULT_HISTORY_DIR):
+        self.root = root
+        self._seq = itertools.count()
+        self._written = {}  # date -> {symbol: fingerprint of the last row this process wrote}
+        self._lock = threading.Lock()
+
+    # ---- writes ----
+    def record(self, metrics_list, recorded_at=None):
+        """
+        Appends metrics dicts (nested as from `build_metrics` or flat screener rows).
+        Rows identical to what this process last wrote for the same symbol and date are skipped
+        (remembered for the `WRITTEN_DATES` most recent dates).
+        Returns: number of rows written
+        """
+        recorded_at = recorded_at or time.time()
+        by_date, pending = {}, {}
+        with self._lock:
+            for metrics in metrics_list:
+                if metrics.get('timeframe', "1d") not in TIMEFRAMES: continue
+                row = flatten(metrics)
+                date, seen = _bar_date(row['date']), _fingerprint(row)
+                if pending.get(date, self._written.get(date, {})).get(row['symbol']) == seen: continue
+                pending.setdefault(date, dict(self._written.get(date, {})))[row['symbol']] = seen
+                by_date.setdefault(date, []).append(row)
+
+        ms = np.datetime64(int(recorded_at * 1000), "ms")
+        for date, rows in by_date.items():
+            folder = self._partition(date)
+            os.makedirs(folder, exist_ok=True)
+            name = f"part-{dt.datetime.fromtimestamp(recorded_at):%H%M%S%f}-{os.getpid()}-{next(self._seq)}.arrow"
+            _write_ipc(_to_table(rows, ms), os.path.join(folder, name))
+            # Remembered only once the part is in place: a failed write is retried next time
+            with self._lock:
+                written = self._written.setdefault(date, {})
+                written.update({r['symbol']: pending[date][r['symbol']] for r in rows})
+                while len(self._written) > WRITTEN_DATES:
+                    del self._written[min(self._written)]
+        return sum(len(rows) for rows in by_date.values())
+
+    def compact(self, date):
+        """
+        Merges the parts of one date into a single file (latest record per symbol).
+        Returns: number of parts merged (0 when there was nothing to do)
+        """
+        folder = self._partition(_bar_date(date))
+        parts = self._parts(folder)
+        if len(parts) < 2: return 0
+        tables = [t for t in (_read_part(p) for p in parts) if t is not None]
+        merged = _latest(pa.concat_tables(tables, promote_options="default"))
+        symbol = merged.column("symbol").cast(pa.string()).to_numpy(zero_copy_only=False)
+        # One dictionary per column in the merged file
+        merged = merged.take(pa.array(np.argsort(symbol, kind="stable"))).unify_dictionaries().combine_chunks()
+        _write_ipc(merged, os.path.join(folder, f"part-{dt.datetime.now():%H%M%S%f}-{os.getpid()}-{next(self._seq)}.arrow"))
+        for p in parts:
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+        return len(parts)
+
+    def compact_before(self, date):
+        """
+        `compact` for every partition older than `date` that still has several parts.
+        """
+        merged = 0
+        for day, folder in self.partitions(end=_bar_date(date) - dt.timedelta(days=1)):
+            if len(self._parts(folder)) > 1:
+                merged += self.compact(day)
+        return merged
+
+    # ---- reads ----
+    def _partition(self, date):
+        return os.path.join(self.root, f"date={date.isoformat()}")
+
+    @staticmethod
+    def _parts(folder):
+        try:
+            return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".arrow"))
+        except FileNotFoundError:
+            return []
+
+    def partitions(self, start=None, end=None):
+        """
+        Returns: list of (date, folder) in date order, restricted to [start, end]
+        """
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        start = _bar_date(start) if start is not None else None
+        end = _bar_date(end) if end is not None else None
+        out = []
+        for name in sorted(names):
+            if not name.startswith("date="): continue
+            try:
+                day = dt.date.fromisoformat(name[5:])
+            except ValueError:
+                continue
+            if (start is None or day >= start) and (end is None or day <= end):
+                out.append((day, os.path.join(self.root, name)))
+        return out
+
+    def scan(self, start=None, end=None, columns=None):
+        """
+        All records (duplicates included) of the dates in [start, end], memory-mapped.
+        `columns` not in the schema are ignored.
+        Returns: pyarrow Table (one chunk per part)
+        """
+        if columns is not None:
+            columns = [c for c in columns if c in SCHEMA.names]
+        tables = [t for _, folder in self.partitions(start, end) for t in
+                  (_read_part(p, columns) for p in self._parts(folder)) if t is not None]
+        if not tables:
+            return SCHEMA.empty_table() if columns is None else SCHEMA.empty_table().select(columns)
+        return pa.concat_tables(tables, promote_options="default")
+
+    def read(self, symbols=None, start=None, end=None, fields=None):
+        """
+        (symbol x date x field) slice, latest record per symbol and date.
+        Returns: DataFrame with date / symbol columns plus the requested fields, sorted by symbol and date
+        """
+        columns = None if fields is None else KEY_FIELDS + [f for f in fields if f not in KEY_FIELDS]
+        table = self.scan(start, end, columns)
+        if symbols is not None:
+            # Matched against each part's dictionary, the symbol strings are not decoded
+            table = table.filter(pc.is_in(table.column("symbol"), value_set=pa.array(list(symbols), pa.string())))
+        table = _latest(table)
+        df = table.to_pandas()
+        if df.empty: return df
+        df["date"] = pd.to_datetime(df["date"])
+        return df.drop(columns="recorded_at").sort_values(["symbol", "date"], kind="stable").reset_index(drop=True)
+
+    def pivot(self, field, symbols=None, start=None, end=None):
+        """
+        One field as a wide frame for research / charts.
+        Returns: DataFrame (date x symbol)
+        """
+        df = self.read(symbols, start, end, [field])
+        if df.empty or field not in df: return pd.DataFrame()
+        return df.pivot(index="date", columns="symbol", values=field)
+
+    def recent(self, field, symbols=None, days=SPARKLINE_DAYS):
+        """
+        `pivot` over the last `days` calendar days (sparklines in the app).
+        """
+        return self.pivot(field, symbols, start=dt.date.today() - dt.timedelta(days=days))
+
+def _latest(table):
+    """
+    Keeps the last recorded row per (symbol, date).
+    """
+    if table.num_rows < 2: return table
+    symbol = table.column("symbol").cast(pa.string()).to_numpy(zero_copy_only=False)
+    date = table.column("date").to_numpy().astype("datetime64[D]").astype(np.int64)
+    recorded = table.column("recorded_at").to_numpy().astype(np.int64)
+    order = np.lexsort((recorded, date, symbol))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (symbol[order][1:] != symbol[order][:-1]) | (date[order][1:] != date[order][:-1])
+    if last.all(): return table
+    return table.take(pa.array(np.sort(order[last])))
+
+_default_history = None
+
+def get_default_history():
+    """
+    Process-wide history under the data folder.
+    """
+    global _default_history
+    if _default_history is None:
+        _default_history = MetricsHistory()
+    return _default_history
+
+def set_default_history(history):
+    global _default_history
+    _default_history = history
+
+def record_metrics(metrics_list):
+    """
+    Best-effort `record` into the default history (analysis never fails because of it;
+    QUANT_HISTORY=0 turns recording off).
+    """
+    if not ENABLED: return 0
+    try:
+        return get_default_history().record(metrics_list)
+    except Exception as e:
+        print(f"Error recording metrics history: {e}")
+        return 0
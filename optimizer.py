@@ -0,0 +1,273 @@
+"""
+Parallel parameter sweep for indicator windows, score weights and trading rules.
+
+- The OHLCV panel is copied once into a `multiprocessing.shared_memory` block; workers
+  attach to it by name and wrap it in NumPy views, so no DataFrame is pickled per task.
+- Combinations are sorted by their window parameters and handed out in contiguous chunks.
+  Each worker keeps an LRU cache of kernel intermediates (see `indicator_kernel.compute`),
+  so combinations sharing e.g. the RSI window or the MACD spans reuse those arrays.
+- Every combination is backtested once over the full range (`backtest.simulate`); its daily
+  portfolio returns are then scored on rolling walk-forward folds (train segment i, test
+  segment i+1). The result table is ranked by mean out-of-sample Sharpe, and a second table
+  reports the walk-forward chain (best in-sample combination per fold, scored on its test fold).
+
+    python optimizer.py --tickers 2330.TW,2317.TW,2454.TW --period 5y --samples 40
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import backtest
+import indicator_kernel
+import stock_analysis
+
+# Example search space: the constants nobody has tuned
+DEFAULT_SPACE = {
+    "rsi_window": [9, 14, 21],
+    "kd_window": [9, 14],
+    "macd_fast": [8, 12],
+    "macd_slow": [21, 26],
+    "bb_window": [20],
+    "adx_window": [14],
+    "ma_alignment": [1, 2, 3],
+    "rsi_healthy": [1.0, 1.5],
+    "entry_score": [6.0, 7.0, 8.0],
+}
+
+CACHE_MB = 256 # per worker; a 10y x 1000-symbol float64 intermediate is ~20 MB
+
+def _nbytes(value):
+    """
+    Array bytes held by a cache value (arrays, or tuples / dicts of them).
+    """
+    if isinstance(value, np.ndarray): return value.nbytes
+    if isinstance(value, dict): return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)): return sum(_nbytes(v) for v in value)
+    return 0
+
+class LRUCache(OrderedDict):
+    """
+    Dict bounded by the bytes of the arrays it holds, used as the kernel's intermediate
+    cache inside a worker. The most recent entry is always kept, even when larger than
+    the bound.
+    """
+    def __init__(self, max_bytes=CACHE_MB * 1024 * 1024):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.nbytes -= _nbytes(super().__getitem__(key))
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        self.nbytes += _nbytes(value)
+        while self.nbytes > self.max_bytes and len(self) > 1:
+            _, dropped = self.popitem(last=False)
+            self.nbytes -= _nbytes(dropped)
+
+def split_params(params):
+    """
+    Routes a flat parameter dict to (windows, weights, rules).
+    """
+    windows, weights, rules = {}, {}, {}
+    for key, value in params.items():
+        if key in indicator_kernel.DEFAULT_WINDOWS: windows[key] = value
+        elif key in stock_analysis.SCORE_WEIGHTS: weights[key] = value
+        elif key in backtest.DEFAULT_RULES: rules[key] = value
+        else: raise ValueError(f"Unknown parameter: {key}")
+    return windows, weights, rules
+
+def _is_valid(params):
+    w = dict(indicator_kernel.DEFAULT_WINDOWS, **split_params(params)[0])
+    return w["macd_fast"] < w["macd_slow"]
+
+def expand_space(space, n_samples=None, seed=0):
+    """
+    Grid search (all combinations) or random search (`n_samples` distinct draws).
+    Returns: list of parameter dicts
+    """
+    keys = list(space)
+    if n_samples is None:
+        combos = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    else:
+        rng = random.Random(seed)
+        total = math.prod(len(space[k]) for k in keys)
+        seen, combos = set(), []
+        while len(combos) < min(n_samples, total):
+            values = tuple(rng.choice(space[k]) for k in keys)
+            if values not in seen:
+                seen.add(values)
+                combos.append(dict(zip(keys, values)))
+    return [c for c in combos if _is_valid(c)]
+
+def walk_forward_folds(n_bars, n_folds=4, warmup=120):
+    """
+    Rolling folds after the indicator warm-up: train on segment i, test on segment i+1.
+    Returns: list of ((train_start, train_stop), (test_start, test_stop)) bar ranges
+    """
+    edges = np.linspace(min(warmup, n_bars - 1), n_bars, n_folds + 2).astype(int)
+    return [((edges[i], edges[i + 1]), (edges[i + 1], edges[i + 2])) for i in range(n_folds)]
+
+def _segment_stats(returns, start, stop):
+    seg = returns[start:stop]
+    if len(seg) < 2 or not np.isfinite(seg).all():
+        return float("nan"), float("nan")
+    std = seg.std(ddof=1)
+    sharpe = seg.mean() / std * math.sqrt(252) if std > 0 else float("nan")
+    return sharpe, float(np.prod(1 + seg) - 1)
+
+# ---- shared memory panel ----
+class SharedPanel:
+    """
+    OHLCV arrays (field x bars x symbols, float64) in one shared-memory block.
+    """
+    def __init__(self, arrays):
+        stacked = np.stack([arrays[f] for f in stock_analysis.OHLCV_FIELDS])
+        self.shape = stacked.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=stacked.nbytes)
+        np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)[:] = stacked
+        self.name = self.shm.name
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+_WORKER = {}
+
+def _init_worker(shm_name, shape, folds, cache_mb):
+    # Pool workers share the parent's resource tracker, so only the parent unlinks the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _WORKER.update(shm=shm, folds=folds, cache=LRUCache(int(cache_mb * 1024 * 1024)),
+                   arrays={f: data[i] for i, f in enumerate(stock_analysis.OHLCV_FIELDS)})
+
+def _evaluate(params):
+    arrays, cache, folds = _WORKER["arrays"], _WORKER["cache"], _WORKER["folds"]
+    windows, weights, rules = split_params(params)
+    sig = backtest.signals(arrays, windows=windows, weights=weights, cache=cache)
+    equity, notional, exposure, trades = backtest.simulate(arrays, sig, rules)
+    portfolio = equity.mean(axis=1)
+    returns = np.concatenate([[0.0], portfolio[1:] / portfolio[:-1] - 1])
+
+    row = {"trades": int(sum(len(t["symbol"]) for t in trades)),
+           "total_return": float(portfolio[-1] - 1),
+           "max_drawdown": float(np.min(portfolio / np.maximum.accumulate(portfolio) - 1)),
+           "exposure": float(exposure.mean())}
+    for i, (train, test) in enumerate(folds):
+        row[f"is_sharpe_{i}"], _ = _segment_stats(returns, *train)
+        row[f"oos_sharpe_{i}"], row[f"oos_return_{i}"] = _segment_stats(returns, *test)
+    return row
+
+def _evaluate_chunk(chunk):
+    return [(i, _evaluate(params)) for i, params in chunk]
+
+def _windows_key(params):
+    windows = split_params(params)[0]
+    return tuple(sorted(windows.items()))
+
+def run_sweep(panel, space=None, n_samples=None, n_folds=4, warmup=120, workers=None,
+              seed=0, cache_mb=CACHE_MB):
+    """
+    Evaluates parameter combinations over a panel (field -> date x ticker DataFrame).
+    Returns: (results DataFrame ranked by mean OOS Sharpe, walk-forward DataFrame per fold)
+    """
+    combos = expand_space(space or DEFAULT_SPACE, n_samples=n_samples, seed=seed)
+    if not combos: raise ValueError("Search space has no valid combination")
+    arrays, index, tickers = backtest.panel_arrays(panel)
+    folds = walk_forward_folds(len(index), n_folds=n_folds, warmup=warmup)
+
+    # Neighbouring combinations share windows -> contiguous chunks maximize cache hits
+    order = sorted(range(len(combos)), key=lambda i: _windows_key(combos[i]))
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, math.ceil(len(order) / (workers * 4)))
+    chunks = [[(i, combos[i]) for i in order[k:k + chunk_size]] for k in range(0, len(order), chunk_size)]
+
+    shared = SharedPanel(arrays)
+    rows = {}
+    try:
+        if workers == 1:
+            _init_worker(shared.name, shared.shape, folds, cache_mb)
+            for chunk in chunks:
+                rows.update(_evaluate_chunk(chunk))
+            _WORKER["shm"].close()
+            _WORKER.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shared.name, shared.shape, folds, cache_mb)) as pool:
+                futures = [pool.submit(_evaluate_chunk, chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    rows.update(future.result())
+    finally:
+        shared.release()
+
+    results = pd.DataFrame([{**combos[i], **rows[i]} for i in range(len(combos))])
+    is_cols = [f"is_sharpe_{i}" for i in range(len(folds))]
+    oos_cols = [f"oos_sharpe_{i}" for i in range(len(folds))]
+    results["is_sharpe"] = results[is_cols].mean(axis=1)
+    results["oos_sharpe"] = results[oos_cols].mean(axis=1)
+    results = results.sort_values("oos_sharpe", ascending=False, na_position="last").reset_index(drop=True)
+    results.insert(0, "rank", range(1, len(results) + 1))
+
+    # Walk-forward chain: pick the best in-sample combination per fold, report its next fold
+    chain = []
+    for i, (train, test) in enumerate(folds):
+        best = results[f"is_sharpe_{i}"].idxmax() if results[f"is_sharpe_{i}"].notna().any() else None
+        chain.append({
+            "fold": i,
+            "train": f"{index[train[0]].date()} ~ {index[train[1] - 1].date()}",
+            "test": f"{index[test[0]].date()} ~ {index[test[1] - 1].date()}",
+            "selected_rank": None if best is None else int(results.loc[best, "rank"]),
+            "is_sharpe": None if best is None else results.loc[best, f"is_sharpe_{i}"],
+            "oos_sharpe": None if best is None else results.loc[best, f"oos_sharpe_{i}"],
+            "oos_return": None if best is None else results.loc[best, f"oos_return_{i}"],
+            "params": None if best is None else {k: results.loc[best, k] for k in combos[0]},
+        })
+    return results, pd.DataFrame(chain)
+
+def sweep_universe(tickers, space=None, period="5y", start=None, end=None, **kwargs):
+    """
+    Loads `tickers` from the bar store, restricts to [start, end] and runs `run_sweep`.
+    """
+    panel, _ = stock_analysis.load_panel(tickers, period=period)
+    if start is not None or end is not None:
+        panel = {f: frame.loc[start:end] for f, frame in panel.items()}
+    return run_sweep(panel, space=space, **kwargs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep for windows, score weights and rules")
+    parser.add_argument("--tickers", required=True, help="comma separated, e.g. 2330.TW,2317.TW")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--samples", type=int, help="random search draws (default: full grid)")
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache-mb", type=float, default=CACHE_MB, help="kernel cache per worker")
+    parser.add_argument("--out", help="write the ranked table to this CSV")
+    args = parser.parse_args(argv)
+
+    results, chain = sweep_universe(args.tickers.split(","), period=args.period, start=args.start, end=args.end,
+                                    n_samples=args.samples, n_folds=args.folds, workers=args.workers,
+                                    cache_mb=args.cache_mb)
+    print(results.head(20).to_string())
+    print()
+    print(chain.to_string())
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+if __name__ == "__main__":
+    main()
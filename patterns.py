@@ -0,0 +1,73 @@
+"""
+Vectorized candlestick pattern classifier.
+
+`classify` labels every bar of a history (1-D) or of many symbols (2-D) in one pass and
+returns compact int8 codes; `PATTERN_LABELS[code]` gives the display string, which is
+identical to what `stock_analysis.analyze_pattern` returns for that bar.
+"""
+import numpy as np
+import pandas as pd
+
+_COLORS = ("紅K", "黑K", "十字")
+
+def _compose(color, long_upper, long_lower):
+    pat = [color]
+    if long_upper: pat.append("長上影線")
+    if long_lower: pat.append("長下影線")
+    return " ".join(pat)
+
+# 0-3: specific patterns (checked first, in this order), 4-15: color x long upper x long lower
+DOJI_FLAT, DOJI, HAMMER, SHOOTING_STAR = 0, 1, 2, 3
+PATTERN_LABELS = (
+    "十字星 (Doji)",
+    "十字星變盤線 (Doji)",
+    "錘頭/吊人 (Hammer/Hanging Man)",
+    "流星/倒錘 (Shooting Star)",
+) + tuple(_compose(color, upper, lower)
+          for color in _COLORS for upper in (False, True) for lower in (False, True))
+
+# Lookup tables used by the quant score ("紅K"/"黑K" in pattern)
+PATTERN_IS_RED = np.array(["紅K" in label for label in PATTERN_LABELS])
+PATTERN_IS_BLACK = np.array(["黑K" in label for label in PATTERN_LABELS])
+_LABEL_ARRAY = np.array(PATTERN_LABELS, dtype=object)
+
+def classify(open_p, high, low, close):
+    """
+    Classifies every bar. Inputs are arrays/Series/DataFrames of equal shape.
+    Returns: int8 array of pattern codes (same shape as `close`)
+    """
+    o, h, l, c = (np.asarray(x, dtype=np.float64) for x in (open_p, high, low, close))
+    with np.errstate(invalid="ignore"):
+        entity = np.abs(c - o)
+        # Python's max(close, open_p)/min(...) semantics, incl. NaN ordering
+        upper_shadow = h - np.where(o > c, o, c)
+        lower_shadow = np.where(o < c, o, c) - l
+        total_len = h - l
+
+        long_upper = upper_shadow > entity * 2
+        long_lower = lower_shadow > entity * 2
+        color = np.where(c > o, 0, np.where(c < o, 1, 2))
+        composed = 4 + color * 4 + long_upper * 2 + long_lower
+
+        codes = np.select(
+            [total_len == 0,
+             entity < total_len * 0.1,
+             long_lower & (upper_shadow < entity * 0.5),
+             long_upper & (lower_shadow < entity * 0.5)],
+            [DOJI_FLAT, DOJI, HAMMER, SHOOTING_STAR],
+            default=composed)
+    return codes.astype(np.int8)
+
+def classify_frame(df):
+    """
+    Classifies every bar of an OHLC DataFrame.
+    Returns: pd.Series of categorical labels sharing the DataFrame index
+    """
+    codes = classify(df['Open'], df['High'], df['Low'], df['Close'])
+    return pd.Series(pd.Categorical.from_codes(codes, PATTERN_LABELS), index=df.index, name="Pattern")
+
+def labels(codes):
+    """
+    Maps pattern codes to display strings.
+    """
+    return _LABEL_ARRAY[np.asarray(codes)]
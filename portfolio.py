@@ -0,0 +1,255 @@
+"""
+Portfolio risk for the book actually held: aggregate VaR / CVaR, per-position risk
+contribution and ATR-based position sizing.
+
+    book = load_book({"2330.TW": 2000, "2317.TW": 5000})   # symbol -> shares
+    report = risk_report(book)
+
+Returns come from the same bar store / panel as the screener (`stock_analysis.load_panel`),
+aligned on the union calendar (a symbol without a bar that day contributes a zero return).
+With R the (scenarios x positions) return matrix and v the position values:
+- historical: P&L scenarios R @ v; VaR is the loss quantile, CVaR the mean loss beyond it;
+  each position's contribution is its mean P&L in those tail scenarios (sums to CVaR);
+- parametric (normal): sigma_p = sqrt(v' S v) with S the return covariance; component VaR
+  v_i (S v)_i / sigma_p * z sums to the portfolio VaR.
+Everything is a handful of matrix products, so a 200-position book takes milliseconds.
+Losses are reported as positive amounts in the book's currency over `horizon` days
+(sqrt-of-time scaling for the parametric figures, overlapping h-day sums for historical).
+There is no FX conversion: the book's currency is the one most positions trade in (TWD on
+a tie) and positions quoted in another currency are left out and listed as failures.
+Sizing rounds to each exchange's board lot.
+"""
+import statistics
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import instrumentation
+import stock_analysis
+import symbol_master
+
+CONFIDENCE = 0.95
+RISK_FRACTION = 0.01 # equity risked per position
+ATR_MULTIPLE = 2.0   # stop distance, as `stop_loss = close - 2 * ATR`
+LOT_SIZE = 1000      # TWSE board lot
+BASE_CURRENCY = "TWD"
+
+# Exchange -> (quote currency, board lot); symbols without a suffix are US listings
+EXCHANGES = {"TWSE": ("TWD", LOT_SIZE), "TPEx": ("TWD", LOT_SIZE), "US": ("USD", 1)}
+
+def exchange_of(symbol):
+    """
+    "2330.TW" -> "TWSE", "6488.TWO" -> "TPEx", "AAPL" -> "US" (None for other suffixes).
+    """
+    for exchange, suffix in symbol_master.EXCHANGE_SUFFIX.items():
+        if symbol.upper().endswith(suffix): return exchange
+    return "US" if "." not in symbol else None
+
+def book_currency(symbols):
+    """
+    Currency most of `symbols` are quoted in (BASE_CURRENCY on a tie, None when none is known).
+    """
+    counts = {}
+    for s in symbols:
+        exchange = exchange_of(s)
+        if exchange is not None:
+            currency = EXCHANGES[exchange][0]
+            counts[currency] = counts.get(currency, 0) + 1
+    if not counts: return None
+    return max(counts, key=lambda c: (counts[c], c == BASE_CURRENCY))
+
+def parse_holdings(text):
+    """
+    "2330 2000\\n2317, 5000" -> {"2330.TW": 2000.0, "2317.TW": 5000.0}. Lines without a
+    share count are read as 0 shares (candidates for sizing).
+    Returns: (Dictionary of symbol -> shares, list of lines that could not be parsed)
+    """
+    holdings, bad = {}, []
+    for line in text.splitlines():
+        parts = line.replace(",", " ").split()
+        if not parts: continue
+        try:
+            shares = float(parts[1]) if len(parts) > 1 else 0.0
+        except ValueError:
+            bad.append(line)
+            continue
+        symbol, _ = symbol_master.process_ticker(parts[0])
+        holdings[symbol] = holdings.get(symbol, 0.0) + shares
+    return holdings, bad
+
+class Book:
+    """
+    Holdings with their aligned daily data: `returns` (date x symbol simple returns),
+    `close` / `atr` of the latest bar, `shares` and board `lots` per symbol, all quoted
+    in `currency`.
+    """
+    def __init__(self, shares, returns, close, atr, failures=None, lots=None, currency=BASE_CURRENCY):
+        self.shares = shares.astype(np.float64)
+        self.returns = returns
+        self.close = close
+        self.atr = atr
+        self.failures = failures or {}
+        self.lots = lots if lots is not None else pd.Series(float(LOT_SIZE), index=shares.index)
+        self.currency = currency
+
+    @property
+    def symbols(self):
+        return list(self.shares.index)
+
+    def values(self):
+        return self.shares * self.close
+
+def load_book(holdings, period="1y", atr_window=14):
+    """
+    Loads the holdings' bars with one batched panel load.
+    Returns: Book (symbols without enough data or quoted in another currency than the
+    book's are left out and listed in `failures`)
+    """
+    holdings = {t: float(s) for t, s in holdings.items()}
+    empty = pd.Series(dtype=np.float64)
+    try:
+        with instrumentation.stage("portfolio.load_panel"):
+            panel, resolved = stock_analysis.load_panel(list(holdings), period=period)
+    except Exception as e:
+        print(f"Error downloading portfolio: {e}")
+        return Book(empty, pd.DataFrame(), empty, empty, {t: f"download failed: {e}" for t in holdings})
+
+    with instrumentation.stage("portfolio.prepare"):
+        # ATR on each symbol's own bars (same values as the single-symbol pipeline)
+        aligned, _, n_bars = stock_analysis._align_bars(panel)
+        atr = stock_analysis.calculate_atr(aligned['High'], aligned['Low'], aligned['Close'], atr_window).iloc[-1]
+        close = aligned['Close'].iloc[-1]
+
+        shares, failures = {}, {}
+        for t, s in holdings.items():
+            r = resolved.get(t, t)
+            if r not in n_bars.index or n_bars[r] < 2:
+                failures[t] = "no data" if r not in n_bars.index or n_bars[r] == 0 else "insufficient history"
+            else:
+                shares[r] = shares.get(r, 0.0) + s
+
+        # 1. One currency per book (no FX conversion), board lot from the exchange
+        currency = book_currency(shares) or BASE_CURRENCY
+        lots = {}
+        for r in list(shares):
+            exchange = exchange_of(r)
+            if exchange is None:
+                failures[r] = "unknown exchange"
+            elif EXCHANGES[exchange][0] != currency:
+                failures[r] = f"quoted in {EXCHANGES[exchange][0]}, book is in {currency} (no FX conversion)"
+            else:
+                lots[r] = float(EXCHANGES[exchange][1])
+                continue
+            del shares[r]
+
+        symbols = list(shares)
+        prices = panel['Close'][symbols]
+        returns = (prices / prices.ffill().shift(1) - 1).fillna(0.0).iloc[1:]
+    return Book(pd.Series(shares, dtype=np.float64), returns, close[symbols], atr[symbols], failures,
+                lots=pd.Series(lots, index=symbols, dtype=np.float64), currency=currency)
+
+# ---- VaR / CVaR ----
+def _horizon_returns(returns, horizon):
+    """
+    Overlapping `horizon`-day compounded returns (scenarios x positions).
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    if horizon <= 1: return r
+    growth = np.cumsum(np.log1p(r), axis=0)
+    growth = np.vstack([np.zeros((1, r.shape[1])), growth])
+    return np.expm1(growth[horizon:] - growth[:-horizon])
+
+def historical_var(returns, values, confidence=CONFIDENCE, horizon=1):
+    """
+    Historical VaR / CVaR of the book and each position's contribution to CVaR.
+    Returns: (VaR, CVaR, ndarray of contributions summing to CVaR, P&L scenarios)
+    """
+    v = np.asarray(values, dtype=np.float64)
+    scenarios = _horizon_returns(returns, horizon) * v # per-position P&L per scenario
+    pnl = scenarios.sum(axis=1)
+    if not len(pnl): return np.nan, np.nan, np.full(len(v), np.nan), pnl
+    var = -np.quantile(pnl, 1 - confidence)
+    tail = pnl <= -var
+    contributions = -scenarios[tail].mean(axis=0)
+    return float(var), float(contributions.sum()), contributions, pnl
+
+def parametric_var(returns, values, confidence=CONFIDENCE, horizon=1):
+    """
+    Normal (variance-covariance) VaR / CVaR and component VaR per position.
+    Returns: (VaR, CVaR, ndarray of component VaR summing to VaR, portfolio sigma)
+    """
+    v = np.asarray(values, dtype=np.float64)
+    r = np.asarray(returns, dtype=np.float64)
+    if len(r) < 2: return np.nan, np.nan, np.full(len(v), np.nan), np.nan
+    cov = np.cov(r, rowvar=False).reshape(len(v), len(v)) * horizon
+    mu = r.mean(axis=0) * horizon @ v
+    marginal = cov @ v
+    sigma = float(np.sqrt(v @ marginal))
+    z = statistics.NormalDist().inv_cdf(confidence)
+    var = float(z * sigma - mu)
+    cvar = float(sigma * np.exp(-z * z / 2) / np.sqrt(2 * np.pi) / (1 - confidence) - mu)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        components = v * marginal / sigma * z - r.mean(axis=0) * horizon * v
+    return var, cvar, components, sigma
+
+# ---- sizing ----
+def atr_position_size(equity, close, atr, risk_fraction=RISK_FRACTION, atr_multiple=ATR_MULTIPLE, lot=LOT_SIZE):
+    """
+    Shares so a stop `atr_multiple` ATRs away loses `risk_fraction` of equity, rounded down
+    to whole lots (arrays / Series work element-wise, `lot` included).
+    Returns: (shares, capital needed)
+    """
+    atr = np.asarray(atr, dtype=np.float64)
+    lot = np.asarray(lot, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raw = equity * risk_fraction / (atr_multiple * atr)
+    shares = np.where(np.isfinite(raw), np.floor(raw / lot) * lot, 0.0)
+    return shares, shares * np.asarray(close, dtype=np.float64)
+
+def risk_report(book, equity=None, confidence=CONFIDENCE, horizon=1, risk_fraction=RISK_FRACTION,
+                atr_multiple=ATR_MULTIPLE, lot=None):
+    """
+    Aggregate and per-position risk of a Book.
+    `equity` defaults to the book's market value (in the book's currency), `lot` to each
+    position's board lot.
+    Returns: (Dictionary of portfolio figures, DataFrame per position)
+    """
+    with instrumentation.stage("portfolio.risk"):
+        values = book.values()
+        total = float(values.sum())
+        equity = equity or total
+        h_var, h_cvar, h_contrib, pnl = historical_var(book.returns, values, confidence, horizon)
+        p_var, p_cvar, p_contrib, sigma = parametric_var(book.returns, values, confidence, horizon)
+        lot = book.lots if lot is None else lot
+        target, capital = atr_position_size(equity, book.close, book.atr, risk_fraction, atr_multiple, lot)
+
+        positions = pd.DataFrame({
+            "name": [stock_analysis.lookup_name(s) or s for s in book.symbols],
+            "shares": book.shares, "close": book.close, "value": values,
+            "weight": values / total * 100 if total else np.nan,
+            "atr": book.atr, "stop_loss": book.close - atr_multiple * book.atr,
+            "stop_risk": book.shares * atr_multiple * book.atr,
+            "cvar_contrib": h_contrib, "cvar_share": h_contrib / h_cvar * 100 if h_cvar else np.nan,
+            "var_contrib": p_contrib, "target_shares": target, "target_value": capital,
+        }, index=book.symbols)
+        summary = {"value": total, "equity": equity, "currency": book.currency,
+                   "confidence": confidence, "horizon": horizon,
+                   "positions": len(values), "scenarios": len(pnl),
+                   "hist_var": h_var, "hist_cvar": h_cvar, "param_var": p_var, "param_cvar": p_cvar,
+                   "sigma": sigma, "stop_risk": float(positions["stop_risk"].sum()),
+                   "hist_var_pct": h_var / equity * 100 if equity else np.nan,
+                   "hist_cvar_pct": h_cvar / equity * 100 if equity else np.nan}
+    return summary, positions.sort_values("cvar_contrib", ascending=False)
+
+@st.cache_data(ttl=300) # same lifetime as the screener
+def analyze_portfolio(holdings, period="1y", equity=None, confidence=CONFIDENCE, horizon=1,
+                      risk_fraction=RISK_FRACTION, atr_multiple=ATR_MULTIPLE):
+    """
+    `load_book` + `risk_report` for a tuple of (symbol, shares) pairs (hashable for the cache).
+    Returns: (Dictionary of portfolio figures or None, DataFrame per position, Dictionary of ticker -> failure reason)
+    """
+    book = load_book(dict(holdings), period=period)
+    if not book.symbols: return None, pd.DataFrame(), book.failures
+    summary, positions = risk_report(book, equity, confidence, horizon, risk_fraction, atr_multiple)
+    return summary, positions, book.failures
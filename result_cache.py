@@ -0,0 +1,286 @@
+"""
+Shared cache of finished analysis results (`df`, `metrics`), usable across processes.
+
+Keys are (symbol, last bar timestamp, parameter hash): an entry stays valid for as long as
+the bars it was computed from, instead of a fixed TTL. The last bar's values are part of the
+timestamp component, so a revised intraday bar (same date, new close) is a different key.
+
+Entries are encoded as a small binary blob: magic + JSON metrics + the DataFrame as an
+LZ4-compressed Arrow IPC stream in the `compact_frame` layout (float32 indicators, no
+duplicate columns; see its precision contract). Backends only store bytes:
+- `DiskBackend`: one file per key in a shared folder (default), LRU by file mtime, which
+  `get` refreshes, so every process on the host shares both the data and the recency order.
+- `MemoryBackend`: in-process LRU, the stand-in for tests or single-process runs.
+Both are bounded by total bytes and evict least recently used entries first.
+"""
+import datetime as dt
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import bar_store
+from compact_frame import CompactFrame
+
+DEFAULT_CACHE_DIR = os.path.join(bar_store.DEFAULT_DATA_DIR, "results")
+DEFAULT_MAX_BYTES = int(os.environ.get("QUANT_CACHE_MB", "512")) * 1024 * 1024
+RESCAN_EVERY = 256 # DiskBackend puts between folder listings
+LOW_WATER = 0.9    # DiskBackend evicts down to this fraction of max_bytes, so a full cache is not rescanned on every put
+
+_MAGIC = b"QRC1"
+_IPC_OPTIONS = pa.ipc.IpcWriteOptions(compression="lz4")
+
+# ---- keys ----
+def bar_revision(df):
+    """
+    Last bar timestamp plus a short fingerprint of its values.
+    """
+    last = df.iloc[-1].to_numpy(dtype=np.float64)
+    digest = hashlib.sha1(last.tobytes()).hexdigest()[:10]
+    return f"{df.index[-1]:%Y%m%dT%H%M}.{digest}"
+
+def param_hash(params):
+    """
+    Stable short hash of the analysis parameters (any JSON-serializable structure).
+    """
+    blob = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+def result_key(symbol, df, params):
+    """
+    Returns: "symbol|last bar revision|param hash"
+    """
+    return f"{symbol}|{bar_revision(df)}|{param_hash(params)}"
+
+# ---- serialization ----
+def _json_default(obj):
+    # datetime first: it is also a date (intraday metrics carry the bar timestamp)
+    if isinstance(obj, dt.datetime):
+        return {"$datetime": obj.isoformat()}
+    if isinstance(obj, dt.date):
+        return {"$date": obj.isoformat()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+def _json_hook(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return dt.date.fromisoformat(obj["$date"])
+    if len(obj) == 1 and "$datetime" in obj:
+        return pd.Timestamp(obj["$datetime"])
+    return obj
+
+def encode(df, metrics):
+    """
+    Returns: bytes (magic, metrics JSON length, metrics JSON, Arrow IPC stream)
+    """
+    meta = json.dumps(metrics, default=_json_default, ensure_ascii=False).encode("utf-8")
+    table = (df if isinstance(df, CompactFrame) else CompactFrame.from_frame(df)).to_table()
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=_IPC_OPTIONS) as writer:
+        writer.write_table(table)
+    return b"".join([_MAGIC, struct.pack("<I", len(meta)), meta, sink.getvalue().to_pybytes()])
+
+def decode(blob, compact=False):
+    """
+    Returns: (DataFrame, metrics dict), or (CompactFrame, metrics dict) with `compact`
+    """
+    if blob[:4] != _MAGIC: raise ValueError("Not a result cache entry")
+    n = struct.unpack_from("<I", blob, 4)[0]
+    metrics = json.loads(bytes(blob[8:8 + n]).decode("utf-8"), object_hook=_json_hook)
+    table = pa.ipc.open_stream(pa.py_buffer(memoryview(blob)[8 + n:])).read_all()
+    frame = CompactFrame.from_table(table)
+    if frame is None:
+        # Entry written before the compact layout
+        frame = table.to_pandas()
+        return (CompactFrame.from_frame(frame) if compact else frame), metrics
+    return (frame if compact else frame.to_frame()), metrics
+
+# ---- backends ----
+class MemoryBackend:
+    """
+    In-process LRU over bytes, bounded by `max_bytes`.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            blob = self._data.get(key)
+            if blob is not None: self._data.move_to_end(key)
+            return blob
+
+    def put(self, key, blob):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None: self._nbytes -= len(old)
+            self._data[key] = blob
+            self._nbytes += len(blob)
+            while self._nbytes > self.max_bytes and len(self._data) > 1:
+                _, dropped = self._data.popitem(last=False)
+                self._nbytes -= len(dropped)
+                self.evictions += 1
+
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._data)
+
+class DiskBackend:
+    """
+    One file per key under `root`; file mtime is the LRU clock shared by all processes.
+    The folder size is tracked in memory from this process's puts; the folder is only
+    listed when that estimate passes `max_bytes` (evicting down to `LOW_WATER` of it) or
+    every `RESCAN_EVERY` puts (to pick up what other processes wrote or evicted).
+    """
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._nbytes = None # unknown until the first scan
+        self._count = None
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".bin")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)
+            return blob
+        except OSError:
+            return None
+
+    def put(self, key, blob):
+        path = self.path(key)
+        tmp = bar_store.temp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        try:
+            replaced, added = os.stat(path).st_size, 0
+        except OSError:
+            replaced, added = 0, 1
+        os.replace(tmp, path)
+        with self._lock:
+            self._puts += 1
+            if self._nbytes is not None:
+                self._nbytes += len(blob) - replaced
+                self._count += added
+            rescan = self._nbytes is None or self._nbytes > self.max_bytes or self._puts % RESCAN_EVERY == 0
+        if rescan:
+            self._evict()
+
+    def _entries(self):
+        out = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".bin"):
+                try:
+                    st = entry.stat()
+                    out.append((st.st_mtime, st.st_size, entry.path))
+                except OSError:
+                    pass  # removed by another process
+        return out
+
+    def _evict(self):
+        entries = self._entries()
+        total, count = sum(size for _, size, _ in entries), len(entries)
+        if total > self.max_bytes:
+            for mtime, size, path in sorted(entries)[:-1]:
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except OSError:
+                    continue
+                total -= size
+                count -= 1
+                if total <= self.max_bytes * LOW_WATER: break
+        with self._lock:
+            self._nbytes, self._count = total, count
+
+    def nbytes(self):
+        """
+        Tracked folder size (as of the last scan plus this process's puts).
+        """
+        if self._nbytes is None: self._evict()
+        return self._nbytes
+
+    def __len__(self):
+        if self._count is None: self._evict()
+        return self._count
+
+class ResultCache:
+    """
+    Encodes/decodes entries on top of a backend and counts hits and misses (per process).
+    """
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else DiskBackend()
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self._lock = threading.Lock() # counters: API threads and refresh pools share one cache
+
+    def get(self, key, compact=False):
+        """
+        Returns: (DataFrame, metrics) ((CompactFrame, metrics) with `compact`) or None
+        """
+        blob = self.backend.get(key)
+        if blob is not None:
+            try:
+                result = decode(blob, compact)
+                with self._lock:
+                    self.hits += 1
+                return result
+            except Exception as e:
+                print(f"Error decoding cache entry {key}: {e}")
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, df, metrics):
+        self.backend.put(key, encode(df, metrics))
+        with self._lock:
+            self.puts += 1
+
+    def stats(self):
+        """
+        Returns: Dictionary with hits, misses, puts, hit_rate, evictions, entries, bytes
+        (entries / bytes as tracked by the backend, no folder listing)
+        """
+        with self._lock:
+            hits, misses, puts = self.hits, self.misses, self.puts
+        lookups = hits + misses
+        return {"hits": hits, "misses": misses, "puts": puts,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "evictions": self.backend.evictions,
+                "entries": len(self.backend), "bytes": self.backend.nbytes()}
+
+_default_cache = None
+
+def get_default_cache():
+    """
+    Process-wide cache over the shared disk backend.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+def set_default_cache(cache):
+    global _default_cache
+    _default_cache = cache
@@ -0,0 +1,208 @@
+"""
+Background warm-up of the watchlist into the shared result cache.
+
+Runs every `interval_minutes` during the TWSE session and once after the close
+(`post_close`, default 14:00 Taipei, when the daily bar has settled). Each run syncs the
+watchlist with one batched bar-store call, recomputes every symbol and writes the
+`df`/`metrics` pair to `result_cache`, so `analyze_stock` becomes a cache read.
+Progress (last refresh, next run, per-symbol failures) is kept in `scheduler_status.json`
+in the data folder so any process can display it. Every refreshed symbol is also fed to
+the alert engine (rules from `alerts.txt`, events appended to `alerts.jsonl`, see `alerts`);
+finished days of the metrics history (`metrics_history`) are compacted into one file each.
+
+    python scheduler.py --watchlist 2330,2317,6488 --interval 5     # worker process
+    python scheduler.py --once                                       # single refresh
+
+In-process: `WarmScheduler(watchlist).start()` runs the same loop in a daemon thread.
+The watchlist defaults to QUANT_WATCHLIST (comma separated), then `watchlist.txt` in the
+data folder, then the Taiwan symbols of `TW_STOCK_NAMES`.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import threading
+import time
+
+import alerts
+import bar_store
+import market_hours
+import metrics_history
+import result_cache
+import stock_analysis
+import symbol_master
+
+STATUS_PATH = os.path.join(bar_store.DEFAULT_DATA_DIR, "scheduler_status.json")
+
+def default_watchlist():
+    env = os.environ.get("QUANT_WATCHLIST")
+    if env:
+        return [t.strip() for t in env.split(",") if t.strip()]
+    path = os.path.join(bar_store.DEFAULT_DATA_DIR, "watchlist.txt")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [t for t in stock_analysis.TW_STOCK_NAMES if t.endswith(".TW")]
+
+def read_status(path=STATUS_PATH):
+    """
+    Last persisted scheduler status (see `WarmScheduler.status`), or None if it never ran.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class WarmScheduler:
+    """
+    Refreshes `watchlist` on the intraday / post-close schedule.
+    """
+    def __init__(self, watchlist=None, interval_minutes=5, post_close=dt.time(14, 0), cache=None,
+                 status_path=STATUS_PATH, alert_engine=None, rules_path=alerts.RULES_PATH):
+        master = symbol_master.get_master()
+        self.watchlist = [master.resolve(t) or t for t in (watchlist or default_watchlist())]
+        self.interval = dt.timedelta(minutes=interval_minutes) if interval_minutes else None
+        self.post_close = post_close
+        self.cache = cache or result_cache.get_default_cache()
+        self.status_path = status_path
+        # Alert rules from the shared rules file, events to the shared JSON lines log
+        self.alerts = alert_engine or alerts.AlertEngine([alerts.LogSink()])
+        self.rules_path = rules_path
+        self._stop = threading.Event()
+        self._thread = None
+        self._status = {"watchlist": self.watchlist, "last_refresh": None, "last_duration": None,
+                        "next_run": None, "symbols": {}}
+
+    # ---- schedule ----
+    def run_times(self, day):
+        """
+        Refresh times for one trading day: intraday steps after the open, then post-close.
+        """
+        open_at, close_at = market_hours.session_bounds(day)
+        times = []
+        if self.interval:
+            t = open_at + self.interval
+            while t <= close_at:
+                times.append(t)
+                t += self.interval
+        times.append(dt.datetime.combine(day, self.post_close, market_hours.TZ))
+        return times
+
+    def max_age(self):
+        """
+        Seconds a stored bar stays fresh for `refresh` (half the interval, 0 post-close only).
+        """
+        return self.interval.total_seconds() / 2 if self.interval else 0
+
+    def next_run(self, now=None):
+        now = market_hours.to_tw(now or market_hours.now_tw())
+        day = now.date()
+        if market_hours.is_trading_day(day):
+            upcoming = [t for t in self.run_times(day) if t > now]
+            if upcoming: return upcoming[0]
+        return self.run_times(market_hours.next_trading_day(day))[0]
+
+    # ---- work ----
+    def refresh(self):
+        """
+        Syncs and recomputes the whole watchlist.
+        Returns: Dictionary of symbol -> error message for the symbols that failed
+        """
+        t0 = time.time()
+        failures = {}
+        try:
+            # `fetched_at` is stamped after the previous run's fetch, so the store's own
+            # refresh limit would skip every other run: only bars fetched well within
+            # the interval count as fresh
+            bar_store.get_default_store().sync_many(self.watchlist, max_age=self.max_age())
+        except Exception as e:
+            print(f"Error syncing watchlist: {e}")
+
+        rule_errors = self.alerts.watch_file(self.rules_path) if self.rules_path else {}
+        for line, reason in rule_errors.items():
+            print(f"Skipping alert rule {line!r}: {reason}")
+
+        for symbol in self.watchlist:
+            entry = self._status["symbols"].setdefault(symbol, {"ok_at": None, "error": None, "error_at": None})
+            try:
+                df, metrics = stock_analysis.compute_stock(symbol, cache=self.cache)
+                if not metrics: raise ValueError("no data")
+                entry.update(ok_at=time.time(), error=None)
+                self.alerts.on_metrics(metrics, df)
+            except Exception as e:
+                failures[symbol] = str(e)
+                entry.update(error=str(e), error_at=time.time())
+
+        try:
+            metrics_history.get_default_history().compact_before(market_hours.now_tw().date())
+        except Exception as e:
+            print(f"Error compacting metrics history: {e}")
+
+        self._status.update(last_refresh=t0, last_duration=time.time() - t0)
+        self._write_status()
+        return failures
+
+    def status(self):
+        """
+        Returns: Dictionary with watchlist, last_refresh / next_run (epoch seconds),
+                 last_duration (seconds) and per-symbol ok_at / error / error_at
+        """
+        return json.loads(json.dumps(self._status))
+
+    def _write_status(self):
+        path = self.status_path
+        tmp = bar_store.temp_path(path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._status, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    # ---- loop ----
+    def run_forever(self, run_now=True):
+        if run_now and not self._stop.is_set():
+            self.refresh()
+        while not self._stop.is_set():
+            due = self.next_run()
+            self._status["next_run"] = due.timestamp()
+            self._write_status()
+            if self._stop.wait(max(0.0, (due - market_hours.now_tw()).total_seconds())): break
+            self.refresh()
+
+    def start(self, run_now=True):
+        """
+        Runs the loop in a daemon thread.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, args=(run_now,),
+                                            name="warm-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warms the shared result cache for a watchlist")
+    parser.add_argument("--watchlist", help="comma separated, e.g. 2330,2317,6488")
+    parser.add_argument("--interval", type=int, default=5, help="intraday refresh interval in minutes (0 = post-close only)")
+    parser.add_argument("--post-close", default="14:00", help="post-close refresh time (Taipei)")
+    parser.add_argument("--once", action="store_true", help="refresh once and exit")
+    args = parser.parse_args(argv)
+
+    watchlist = args.watchlist.split(",") if args.watchlist else None
+    hour, minute = map(int, args.post_close.split(":"))
+    scheduler = WarmScheduler(watchlist, interval_minutes=args.interval, post_close=dt.time(hour, minute))
+    if args.once:
+        failures = scheduler.refresh()
+        print(f"Refreshed {len(scheduler.watchlist) - len(failures)}/{len(scheduler.watchlist)} symbols")
+        for symbol, reason in failures.items():
+            print(f"  {symbol}: {reason}")
+        return
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+if __name__ == "__main__":
+    main()
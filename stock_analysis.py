@@ -1,13 +1,22 @@
-import yfinance as yf
+import time
 import pandas as pd
 import numpy as np
 import streamlit as st
+import bar_store
+import indicator_kernel
+import divergence
+import fetcher
+import symbol_master
+import result_cache
+import timeframes
+import instrumentation
+import metrics_history
+from compact_frame import CompactFrame
 
 # Suppress warnings
 import warnings
 warnings.filterwarnings("ignore")
 
-@st.cache_data(ttl=300) # Cache data for 5 minutes
 def calculate_rsi(data, window=14):
     delta = data.diff()
     gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
@@ -35,19 +44,16 @@ def calculate_atr(high, low, close, window=14):
     high_low = high - low
     high_close = np.abs(high - close.shift())
     low_close = np.abs(low - close.shift())
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = ranges.max(axis=1)
+    # Element-wise NaN-skipping max so wide (date x ticker) frames work too
+    true_range = np.fmax(np.fmax(high_low, high_close), low_close)
     return true_range.rolling(window=window).mean()
 
 def calculate_adx(high, low, close, window=14):
     up_move = high.diff()
     down_move = -low.diff()
     
-    plus_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
-    minus_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
-    
-    plus_dm = pd.Series(plus_dm, index=high.index)
-    minus_dm = pd.Series(minus_dm, index=high.index)
+    plus_dm = up_move.where((up_move > down_move) & (up_move > 0), 0.0)
+    minus_dm = down_move.where((down_move > up_move) & (down_move > 0), 0.0)
     
     tr = calculate_atr(high, low, close, window=window)
     
@@ -58,19 +64,17 @@ def calculate_adx(high, low, close, window=14):
     adx = dx.rolling(window=window).mean()
     return adx
 
-def detect_divergence(price, indicator, window=10):
-    if len(price) < window: return "None"
-    
-    msg = []
-    try:
-        if (price.iloc[-1] > price.iloc[-window]) and (indicator.iloc[-1] < indicator.iloc[-window]):
-             msg.append("Top Divergence (Bearish)")
-        if (price.iloc[-1] < price.iloc[-window]) and (indicator.iloc[-1] > indicator.iloc[-window]):
-             msg.append("Bottom Divergence (Bullish)")
-    except:
-        pass
-        
-    return ", ".join(msg) if msg else "None"
+def detect_divergence(price, indicator, recent=divergence.RECENT):
+    """
+    Swing-point divergence between price and an indicator (see `divergence`) confirmed
+    within the last `recent` bars.
+    Returns: label string ("None" when there is none)
+    """
+    # Only the last bars can change the result, so long histories cost the same
+    tail = divergence.HISTORY - divergence.RECENT + recent
+    price = np.asarray(price, dtype=np.float64)[-tail:]
+    indicator = np.asarray(indicator, dtype=np.float64)[-tail:]
+    return divergence.label(divergence.latest(divergence.detect(price, indicator), recent))
 
 def analyze_pattern(open_p, high, low, close):
     """
@@ -134,33 +138,42 @@ def calculate_pivots(high, low, close):
         "cdp": cdp, "ah": ah, "nh": nh, "nl": nl, "al": al
     }
 
-def calculate_quant_score(metrics):
+# Points awarded by calculate_quant_score (tunable, see optimizer.py)
+SCORE_WEIGHTS = {
+    "ma_alignment": 2, "above_ma20": 1, "above_ma60": 1,
+    "rsi_healthy": 1.5, "rsi_weak": 0.5, "rsi_overbought": -0.5,
+    "macd_accelerating": 1.5, "macd_positive": 1.0,
+    "volume_support": 1, "bb_expansion": 1, "red_k": 1, "black_k": -1,
+}
+
+def calculate_quant_score(metrics, weights=None):
     """
     Calculates a 0-10 score based on quantitative factors.
     Weights: Trend(40%), Momentum(30%), Risk/Structure(30%)
     """
+    w = SCORE_WEIGHTS if weights is None else dict(SCORE_WEIGHTS, **weights)
     score = 0
     
     # 1. Trend (40%)
-    if metrics['ma20'] > metrics['ma60']: score += 2  # Bullish Alignment
-    if metrics['close'] > metrics['ma20']: score += 1 # Above Monthly
-    if metrics['close'] > metrics['ma60']: score += 1 # Above Quarterly
+    if metrics['ma20'] > metrics['ma60']: score += w['ma_alignment']  # Bullish Alignment
+    if metrics['close'] > metrics['ma20']: score += w['above_ma20'] # Above Monthly
+    if metrics['close'] > metrics['ma60']: score += w['above_ma60'] # Above Quarterly
     
     # 2. Momentum (30%)
     # RSI
-    if 50 <= metrics['rsi'] <= 70: score += 1.5   # Healthy Bull
-    elif 40 <= metrics['rsi'] < 50: score += 0.5  # Weak
-    elif metrics['rsi'] > 80: score -= 0.5        # Overbought Danger
+    if 50 <= metrics['rsi'] <= 70: score += w['rsi_healthy']   # Healthy Bull
+    elif 40 <= metrics['rsi'] < 50: score += w['rsi_weak']  # Weak
+    elif metrics['rsi'] > 80: score += w['rsi_overbought']        # Overbought Danger
     
     # MACD
-    if metrics['macd_hist'] > 0 and metrics['macd_hist'] > metrics['macd_hist_prev']: score += 1.5 # Accelerating
-    elif metrics['macd_hist'] > 0: score += 1.0 # Positive
+    if metrics['macd_hist'] > 0 and metrics['macd_hist'] > metrics['macd_hist_prev']: score += w['macd_accelerating'] # Accelerating
+    elif metrics['macd_hist'] > 0: score += w['macd_positive'] # Positive
     
     # 3. Structure & Volume (30%)
-    if metrics['volume'] > metrics['mv5']: score += 1 # Volume Support
-    if metrics['bb_width'] > 10: score += 1  # Volatility Expansion (Trend)
-    if "紅K" in metrics['pattern']: score += 1
-    elif "黑K" in metrics['pattern']: score -= 1
+    if metrics['volume'] > metrics['mv5']: score += w['volume_support'] # Volume Support
+    if metrics['bb_width'] > 10: score += w['bb_expansion']  # Volatility Expansion (Trend)
+    if "紅K" in metrics['pattern']: score += w['red_k']
+    elif "黑K" in metrics['pattern']: score += w['black_k']
     
     # Cap at 10, Min at 0
     return max(0, min(10, score))
@@ -202,128 +215,372 @@ TW_STOCK_NAMES = {
     "INTC": "英特爾 (Intel)"
 }
 
-@st.cache_data(ttl=300) # Cache data for 5 minutes
-def analyze_stock(ticker):
+def compute_indicators(high, low, close, volume):
     """
-    Fetches data and calculates indicators.
-    Returns: (DataFrame, Dictionary of latest metrics)
+    Runs the full indicator pipeline through the fused array kernel.
+    Works on Series (one symbol) or wide DataFrames (date x ticker) alike.
+    Returns: Dictionary of indicator name -> Series/DataFrame
     """
-    try:
-        # Fetch data
-        df = yf.download(ticker, period="1y", progress=False)
-        
-        # Fallback Logic: Detect if it's a potential OTC stock (empty on .TW, might work on .TWO)
-        if df.empty and ticker.endswith(".TW"):
-            alt_ticker = ticker.replace(".TW", ".TWO")
-            print(f"Retry with OTC ticker: {alt_ticker}")
-            df = yf.download(alt_ticker, period="1y", progress=False)
-            if not df.empty:
-                ticker = alt_ticker # Update ticker to the working one
-        
-        if df.empty: return None, None
+    arrays = indicator_kernel.compute(high.to_numpy(dtype=float), low.to_numpy(dtype=float),
+                                      close.to_numpy(dtype=float), volume.to_numpy(dtype=float))
+    if isinstance(close, pd.DataFrame):
+        return {name: pd.DataFrame(values, index=close.index, columns=close.columns)
+                for name, values in arrays.items()}
+    return {name: pd.Series(values, index=close.index, name=name) for name, values in arrays.items()}
 
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-            
-        # 1. Lookup Name in Dictionary First (Fast & Reliable)
-        stock_name = TW_STOCK_NAMES.get(ticker, ticker)
+def compute_indicators_pandas(high, low, close, volume):
+    """
+    Reference implementation built from the per-indicator pandas functions above.
+    Kept for regression checks of the array kernel (see benchmarks/bench_indicators.py).
+    """
+    ind = {}
+    ind['MA5'] = close.rolling(window=5).mean()
+    ind['MA20'] = close.rolling(window=20).mean()
+    ind['MA60'] = close.rolling(window=60).mean()
+    
+    ind['BB_Mid'] = ind['MA20']
+    ind['BB_Std'] = close.rolling(window=20).std()
+    ind['BB_Up'] = ind['BB_Mid'] + 2 * ind['BB_Std']
+    ind['BB_Low'] = ind['BB_Mid'] - 2 * ind['BB_Std']
+    
+    ind['K'], ind['D'] = calculate_kd(high, low, close)
+    ind['RSI'] = calculate_rsi(close)
+    ind['MACD'], ind['Signal'], ind['Hist'] = calculate_macd(close)
+    ind['ATR'] = calculate_atr(high, low, close)
+    ind['ADX'] = calculate_adx(high, low, close)
+    
+    # Volume Indicators
+    ind['MV5'] = volume.rolling(window=5).mean()
+    ind['MV20'] = volume.rolling(window=20).mean()
+    return ind
+
+def build_metrics(latest, prev, date, ticker, stock_name, close, rsi, hist, timeframe="1d", divergences=None):
+    """
+    Assembles the metrics dictionary from the latest and previous bar.
+    `latest`/`prev` map column names to values (e.g. a DataFrame row);
+    `close`/`rsi`/`hist` are the series used for divergence checks, unless `divergences`
+    already holds the (div_rsi, div_macd) labels (screener: one 2-D pass for all symbols).
+    `date` is the bar date (daily and longer) or bar start timestamp (intraday).
+    """
+    metrics = {
+        "date": date,
+        "timeframe": timeframe,
+        "symbol": ticker,
+        "name": stock_name,
+        # OHLC
+        "open": latest['Open'],
+        "high": latest['High'],
+        "low": latest['Low'],
+        "close": latest['Close'],
+        "prev_close": prev['Close'],
         
-        # 2. If not found, try yfinance info (Fallback, slower)
-        if stock_name == ticker:
-            try:
-                t = yf.Ticker(ticker)
-                info = t.info 
-                stock_name = info.get('longName') or info.get('shortName') or ticker
-            except:
-                pass
-            
-        # Indicators
-        close = df['Close']
-        high = df['High']
-        low = df['Low']
+        # Volume
+        "volume": latest['Volume'],
+        "mv5": latest['MV5'],
+        "mv20": latest['MV20'],
+        "vol_change": (latest['Volume'] - prev['Volume']) / prev['Volume'] * 100 if prev['Volume'] > 0 else 0,
         
-        df['MA5'] = close.rolling(window=5).mean()
-        df['MA20'] = close.rolling(window=20).mean()
-        df['MA60'] = close.rolling(window=60).mean()
+        # Trend
+        "ma5": latest['MA5'],
+        "ma20": latest['MA20'],
+        "ma60": latest['MA60'],
+        "bias_ma20": (latest['Close'] - latest['MA20']) / latest['MA20'] * 100,
+        "bias_ma60": (latest['Close'] - latest['MA60']) / latest['MA60'] * 100,
+        "trend": "Bullish" if latest['MA20'] > latest['MA60'] else "Bearish",
         
-        df['BB_Mid'] = df['MA20']
-        df['BB_Std'] = close.rolling(window=20).std()
-        df['BB_Up'] = df['BB_Mid'] + 2 * df['BB_Std']
-        df['BB_Low'] = df['BB_Mid'] - 2 * df['BB_Std']
+        # Oscillators
+        "k": latest['K'],
+        "d": latest['D'],
+        "rsi": latest['RSI'],
+        "macd": latest['MACD'],
+        "macd_hist": latest['Hist'],
+        # Need previous hist for momentum score
+        "macd_hist_prev": prev['Hist'], 
         
-        df['K'], df['D'] = calculate_kd(high, low, close)
-        df['RSI'] = calculate_rsi(close)
-        df['MACD'], df['Signal'], df['Hist'] = calculate_macd(close)
-        df['ATR'] = calculate_atr(high, low, close)
-        df['ADX'] = calculate_adx(high, low, close)
+        # Risk
+        "bb_up": latest['BB_Up'],
+        "bb_low": latest['BB_Low'],
+        "bb_width": (latest['BB_Up'] - latest['BB_Low']) / latest['BB_Mid'] * 100, 
+        "atr": latest['ATR'],
+        "adx": latest['ADX'],
+        "stop_loss": latest['Close'] - 2 * latest['ATR'],
+        "div_rsi": divergences[0] if divergences else detect_divergence(close, rsi),
+        "div_macd": divergences[1] if divergences else detect_divergence(close, hist),
         
-        # Volume Indicators
-        vol = df['Volume']
-        df['MV5'] = vol.rolling(window=5).mean()
-        df['MV20'] = vol.rolling(window=20).mean()
+        # Pattern
+        "pattern": analyze_pattern(latest['Open'], latest['High'], latest['Low'], latest['Close'])
+    }
+    
+    # Add Extended Metrics (Score & Pivots)
+    metrics['pivots'] = calculate_pivots(latest['High'], latest['Low'], latest['Close'])
+    metrics['score'] = calculate_quant_score(metrics)
+    return metrics
+
+NAME_LOOKUP_TIMEOUT = 10 # seconds
+
+def lookup_name(ticker):
+    """
+    Offline name lookup: TW_STOCK_NAMES overrides, then the symbol master.
+    Returns: name or None
+    """
+    return TW_STOCK_NAMES.get(ticker) or symbol_master.get_master().name(ticker)
+
+# Everything that changes the output for the same bars (part of the result cache key)
+ANALYSIS_PARAMS = {"version": 3, "period": "1y", "windows": indicator_kernel.DEFAULT_WINDOWS,
+                   "weights": SCORE_WEIGHTS,
+                   "divergence": (divergence.ORDER, divergence.TOLERANCE, divergence.MAX_GAP, divergence.RECENT)}
+
+def analysis_params(timeframe="1d"):
+    """
+    Cache-key parameters for one timeframe (daily: ANALYSIS_PARAMS as is).
+    """
+    if timeframe == "1d": return ANALYSIS_PARAMS
+    return {**ANALYSIS_PARAMS, "timeframe": timeframe, "period": timeframes.DEFAULT_PERIODS[timeframe]}
+
+_resampled = {} # (symbol, timeframe) -> last resampled frame, extended incrementally
+_RESAMPLED_MAX = 256
+
+def load_bars(store, ticker, timeframe="1d"):
+    """
+    Bars of `timeframe` for a ticker: the base interval from the store, resampled
+    incrementally for higher timeframes.
+    Returns: (DataFrame, resolved symbol)
+    """
+    base = timeframes.base_interval(timeframe)
+    df, ticker = store.load(ticker, period=timeframes.DEFAULT_PERIODS[timeframe], interval=base)
+    if timeframe == base or df.empty:
+        return df, ticker
+    key = (ticker, timeframe)
+    with instrumentation.stage("analyze.resample"):
+        out = timeframes.update(_resampled.get(key), df, timeframe)
+    out = out[out.index >= timeframes.bucket_starts(df.index[:1], timeframe)[0]]
+    if key not in _resampled and len(_resampled) >= _RESAMPLED_MAX:
+        _resampled.pop(next(iter(_resampled)))
+    _resampled[key] = out
+    return out, ticker
+
+def analyze_stock(ticker, timeframe="1d"):
+    """
+    Fetches data and calculates indicators, served from the shared result cache when the
+    bars have not changed since the last computation.
+    Returns: (DataFrame, Dictionary of latest metrics)
+    """
+    # Listing exchange from the symbol master: OTC codes go straight to .TWO
+    ticker = symbol_master.get_master().resolve(ticker) or ticker
+    return compute_stock(ticker, cache=result_cache.get_default_cache(), timeframe=timeframe)
+
+def analyze_timeframes(ticker, wanted=("1d", "1wk", "1mo")):
+    """
+    Multi-timeframe view: the same analysis for each timeframe in `wanted`.
+    Returns: Dictionary of timeframe -> (DataFrame, metrics) ((None, None) when unavailable)
+    """
+    return {tf: analyze_stock(ticker, timeframe=tf) for tf in wanted}
+
+def compute_stock(ticker, cache=None, timeframe="1d", compact=False):
+    """
+    Analysis of one (canonical) ticker: sync bars, look up the name, run indicators.
+    With a `result_cache.ResultCache`, a result for the same bars is returned as is and
+    new results are stored. With `compact`, the frame is returned as a
+    `compact_frame.CompactFrame` (for long-lived in-memory caches).
+    Returns: (DataFrame, Dictionary of latest metrics) or (None, None)
+    """
+    t0 = time.perf_counter()
+    try:
+        store = bar_store.get_default_store()
+
+        # 1. Fetch data (incremental sync of the on-disk bar store, handles the .TW -> .TWO fallback)
+        with instrumentation.stage("analyze.load_bars"):
+            df, ticker = load_bars(store, ticker, timeframe)
+
+        if len(df) < 2:
+            instrumentation.count("analyze.no_data")
+            return None, None
+
+        # 2. Result for the same bars (the key only needs the bars)
+        key = None
+        if cache is not None:
+            with instrumentation.stage("analyze.cache_get"):
+                key = result_cache.result_key(ticker, df, analysis_params(timeframe))
+                hit = cache.get(key, compact=compact)
+            if hit is not None:
+                instrumentation.count("analyze.cache_hit")
+                instrumentation.record("analyze.total", time.perf_counter() - t0)
+                return hit
+            instrumentation.count("analyze.cache_miss")
+        df = df.copy()
+
+        # 3. Name: dictionary / symbol master, then the name saved in the store; the online
+        #    lookup runs once per symbol and its answer (found or not) is saved
+        with instrumentation.stage("analyze.name_lookup"):
+            stock_name = lookup_name(ticker) or store.name(ticker)
+            if stock_name is None:
+                try:
+                    stock_name = fetcher.run(fetcher.get_default_fetcher().name(ticker), timeout=NAME_LOOKUP_TIMEOUT)
+                    store.save_name(ticker, stock_name)
+                except Exception:
+                    instrumentation.count("analyze.name_failed")
+            stock_name = stock_name or ticker
+
+        # Indicators
+        with instrumentation.stage("analyze.indicators"):
+            indicators = compute_indicators(df['High'], df['Low'], df['Close'], df['Volume'])
+            for col, values in indicators.items():
+                df[col] = values
 
         # Latest Metrics
-        latest = df.iloc[-1]
-        prev = df.iloc[-2]
-        
-        metrics = {
-            "date": latest.name.date(),
-            "symbol": ticker,
-            "name": stock_name,
-            # OHLC
-            "open": latest['Open'],
-            "high": latest['High'],
-            "low": latest['Low'],
-            "close": latest['Close'],
-            "prev_close": prev['Close'],
-            
-            # Volume
-            "volume": latest['Volume'],
-            "mv5": latest['MV5'],
-            "mv20": latest['MV20'],
-            "vol_change": (latest['Volume'] - prev['Volume']) / prev['Volume'] * 100 if prev['Volume'] > 0 else 0,
-            
-        # Trend
-            "ma5": latest['MA5'],
-            "ma20": latest['MA20'],
-            "ma60": latest['MA60'],
-            "bias_ma20": (latest['Close'] - latest['MA20']) / latest['MA20'] * 100,
-            "bias_ma60": (latest['Close'] - latest['MA60']) / latest['MA60'] * 100,
-            "trend": "Bullish" if latest['MA20'] > latest['MA60'] else "Bearish",
-            
-            # Oscillators
-            "k": latest['K'],
-            "d": latest['D'],
-            "rsi": latest['RSI'],
-            "macd": latest['MACD'],
-            "macd_hist": latest['Hist'],
-            # Need previous hist for momentum score
-            "macd_hist_prev": df.iloc[-2]['Hist'], 
-            
-            # Risk
-            "bb_up": latest['BB_Up'],
-            "bb_low": latest['BB_Low'],
-            "bb_width": (latest['BB_Up'] - latest['BB_Low']) / latest['BB_Mid'] * 100, 
-            "atr": latest['ATR'],
-            "adx": latest['ADX'],
-            "stop_loss": latest['Close'] - 2 * latest['ATR'],
-            "div_rsi": detect_divergence(close, df['RSI']),
-            "div_macd": detect_divergence(close, df['Hist']),
-            
-            # Pattern
-            "pattern": analyze_pattern(latest['Open'], latest['High'], latest['Low'], latest['Close'])
-        }
-        
-        # Add Extended Metrics (Score & Pivots)
-        metrics['pivots'] = calculate_pivots(latest['High'], latest['Low'], latest['Close'])
-        metrics['score'] = calculate_quant_score(metrics)
-        
+        with instrumentation.stage("analyze.metrics"):
+            latest = df.iloc[-1]
+            prev = df.iloc[-2]
+            date = latest.name if timeframes.is_intraday(timeframe) else latest.name.date()
+            metrics = build_metrics(latest, prev, date, ticker, stock_name,
+                                    df['Close'], df['RSI'], df['Hist'], timeframe=timeframe)
+
+        with instrumentation.stage("analyze.history"):
+            metrics_history.record_metrics([metrics])
+
+        if key is not None:
+            try:
+                with instrumentation.stage("analyze.cache_put"):
+                    cache.put(key, df, metrics)
+            except Exception as e:
+                print(f"Error caching {ticker}: {e}")
+        if compact:
+            df = CompactFrame.from_frame(df)
+        instrumentation.record("analyze.total", time.perf_counter() - t0)
         return df, metrics
 
     except Exception as e:
+        # Timed separately so slow failures (e.g. download timeouts) stay visible;
+        # the stage that raised also counts an error
+        instrumentation.record("analyze.failed", time.perf_counter() - t0, error=True)
         print(f"Error analyzing {ticker}: {e}")
         return None, None
 
+OHLCV_FIELDS = bar_store.OHLCV_COLUMNS
+
+def load_panel(tickers, period="1y"):
+    """
+    Loads several tickers from the bar store (one batched sync for all stale symbols).
+    Returns: (Dictionary of OHLCV field -> wide DataFrame (date x resolved ticker), Dictionary of ticker -> resolved ticker)
+    """
+    master = symbol_master.get_master()
+    requested = {t: master.resolve(t) or t for t in tickers}
+    loaded = bar_store.get_default_store().load_many(list(dict.fromkeys(requested.values())), period=period)
+    resolved = {t: loaded[c][1] for t, c in requested.items()}
+    frames = {r: df for t, (df, r) in loaded.items()}
+    panel = {}
+    for field in OHLCV_FIELDS:
+        panel[field] = pd.concat({r: df[field] for r, df in frames.items()}, axis=1).sort_index()
+    return panel, resolved
+
+def _align_order(valid, bottom=True):
+    """
+    Row order that packs the True rows of every column of a (bars x symbols) mask at the
+    bottom (last bars line up) or, with bottom=False, at the top (first bars line up, so
+    no column has missing rows before its history: every bar matches the 1-D pipeline).
+    Returns: (order (depth x symbols) of row indices, bool mask of real bars in that order, bar count per column)
+    """
+    n_bars = valid.sum(axis=0)
+    depth = int(n_bars.max()) if len(n_bars) else 0
+    # Stable sort of the mask puts missing rows first and keeps bar order within each column
+    if bottom:
+        order = np.argsort(valid, axis=0, kind='stable')[len(valid) - depth:]
+    else:
+        order = np.argsort(~valid, axis=0, kind='stable')[:depth]
+    return order, np.take_along_axis(valid, order, axis=0), n_bars
+
+def _align_bars(panel):
+    """
+    Bottom-aligns every ticker's valid bars so row i is the i-th bar from the end.
+    Symbols in one panel can trade on different calendars (TW vs US holidays, suspensions);
+    packing each column onto its own bars makes every rolling/EWM window identical
+    to the single-symbol pipeline in `analyze_stock`.
+    Returns: (aligned panel, Series of last bar date per ticker, Series of bar count per ticker)
+    """
+    close = panel['Close'].to_numpy(dtype=float)
+    order, filled, n_bars = _align_order(~np.isnan(close))
+    depth = len(order)
+
+    aligned = {}
+    for field, frame in panel.items():
+        values = np.take_along_axis(frame.to_numpy(dtype=float), order, axis=0)
+        values[~filled] = np.nan
+        aligned[field] = pd.DataFrame(values, columns=frame.columns)
+
+    dates = pd.Series(pd.NaT, index=panel['Close'].columns, dtype='datetime64[ns]')
+    if depth:
+        last_row = order[-1]
+        has_bars = n_bars > 0
+        dates[has_bars] = panel['Close'].index.to_numpy()[last_row[has_bars]]
+    return aligned, dates, pd.Series(n_bars, index=panel['Close'].columns)
+
+@st.cache_data(ttl=300) # Cache data for 5 minutes
+def analyze_universe(tickers):
+    """
+    Screens many tickers in one pass: one batched bar-store sync, one indicator
+    pipeline over wide (date x ticker) frames, then a ranked score table.
+    Returns: (DataFrame of metrics per symbol ranked by score, Dictionary of ticker -> failure reason)
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers: return pd.DataFrame(), {}
+
+    try:
+        # Fallback Logic for .TW -> .TWO is done by the store in a single batched retry
+        with instrumentation.stage("screener.load_panel"):
+            panel, _ = load_panel(tickers)
+    except Exception as e:
+        print(f"Error downloading universe: {e}")
+        return pd.DataFrame(), {t: f"download failed: {e}" for t in tickers}
+    return screen_panel(panel)
+
+def screen_panel(panel):
+    """
+    Screener over an already loaded panel (see `load_panel`), e.g. one that is shared with
+    the cross-sectional analytics.
+    Returns: (DataFrame of metrics per symbol ranked by score, Dictionary of ticker -> failure reason)
+    """
+    failures = {}
+    aligned, last_dates, n_bars = _align_bars(panel)
+    for t in n_bars.index:
+        if n_bars[t] < 2:
+            failures[t] = "no data" if n_bars[t] == 0 else "insufficient history"
+    if len(failures) == len(n_bars): return pd.DataFrame(), failures
+
+    with instrumentation.stage("screener.indicators"):
+        ind = compute_indicators(aligned['High'], aligned['Low'], aligned['Close'], aligned['Volume'])
+    frames = {**aligned, **ind}
+    last = pd.DataFrame({col: frame.iloc[-1] for col, frame in frames.items()})
+    prev = pd.DataFrame({col: frame.iloc[-2] for col, frame in frames.items()}) if len(aligned['Close']) > 1 else None
+
+    with instrumentation.stage("screener.divergence"):
+        tail = divergence.HISTORY
+        close = frames['Close'].to_numpy(dtype=np.float64)[-tail:]
+        div_rsi, div_macd = (divergence.latest(divergence.detect(close, frames[col].to_numpy(dtype=np.float64)[-tail:]))
+                             for col in ("RSI", "Hist"))
+
+    rows = []
+    with instrumentation.stage("screener.metrics"):
+        for j, t in enumerate(n_bars.index):
+            if t in failures: continue
+            try:
+                stock_name = lookup_name(t) or t
+                metrics = build_metrics(last.loc[t], prev.loc[t], last_dates[t].date(), t, stock_name,
+                                        frames['Close'][t], frames['RSI'][t], frames['Hist'][t],
+                                        divergences=(divergence.label(div_rsi[j]), divergence.label(div_macd[j])))
+                pivots = metrics.pop('pivots')
+                rows.append({**metrics, **pivots})
+            except Exception as e:
+                failures[t] = str(e)
+
+    if not rows: return pd.DataFrame(), failures
+    with instrumentation.stage("screener.history"):
+        metrics_history.record_metrics(rows)
+
+    table = pd.DataFrame(rows).set_index("symbol")
+    table = table.sort_values("score", ascending=False, kind="stable")
+    table.insert(0, "rank", range(1, len(table) + 1))
+    return table, failures
+
 if __name__ == "__main__":
     # Test run
     df, metrics = analyze_stock("2330.TW")
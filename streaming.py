@@ -0,0 +1,314 @@
+"""
+Incremental (streaming) indicator engine.
+
+The engine keeps the state of every indicator up to the last *committed* bar plus one
+*pending* bar (the current, possibly still forming, bar). Every update only combines the
+committed state with the pending bar, so a new bar or an intraday tick costs O(1) no
+matter how long the history is. Outputs follow the pandas pipeline in
+`stock_analysis.compute_indicators` (same warm-up NaNs, same EWM weighting), so they match
+the batch functions to floating-point tolerance.
+"""
+import math
+from collections import deque
+
+import pandas as pd
+
+import divergence
+import stock_analysis
+import timeframes
+
+NAN = float("nan")
+
+def _div(a, b):
+    """
+    Division with NumPy semantics (x/0 -> +-inf, 0/0 -> NaN) instead of ZeroDivisionError.
+    """
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a != a or a == 0: return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+class _RollingWindow:
+    """
+    Fixed-size rolling window over the last `window - 1` committed values.
+    The pending value is combined on read, so revising it never touches the state.
+    Optional monotonic deques give O(1) amortized rolling min/max.
+    """
+    def __init__(self, window, track_min=False, track_max=False):
+        self.window = window
+        self.values = deque(maxlen=window - 1)
+        self.n = 0            # committed values seen
+        self.nans = 0         # NaNs currently inside `values`
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.shift = None     # subtracted before squaring to limit cancellation
+        self.mins = deque() if track_min else None
+        self.maxs = deque() if track_max else None
+
+    def _ready(self, x):
+        # pandas min_periods == window: need a full window without NaN
+        return self.n + 1 >= self.window and self.nans == 0 and x == x
+
+    def mean(self, x):
+        if not self._ready(x): return NAN
+        return (self.total + x) / self.window
+
+    def std(self, x):
+        if not self._ready(x): return NAN
+        shift = self.shift if self.shift is not None else x
+        s = self.total - shift * (self.window - 1) + (x - shift)
+        sq = self.total_sq + (x - shift) ** 2
+        var = (sq - s * s / self.window) / (self.window - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def min(self, x):
+        if not self._ready(x): return NAN
+        return min(self.mins[0][1], x) if self.mins else x
+
+    def max(self, x):
+        if not self._ready(x): return NAN
+        return max(self.maxs[0][1], x) if self.maxs else x
+
+    def commit(self, x):
+        if self.window == 1:
+            self.n += 1
+            return
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            if old != old:
+                self.nans -= 1
+            else:
+                self.total -= old
+                self.total_sq -= (old - self.shift) ** 2
+        self.values.append(x)
+        if x != x:
+            self.nans += 1
+        else:
+            if self.shift is None: self.shift = x
+            self.total += x
+            self.total_sq += (x - self.shift) ** 2
+
+        pos = self.n
+        self.n += 1
+        oldest = self.n - (self.window - 1)
+        for dq, worse in ((self.mins, lambda a, b: a >= b), (self.maxs, lambda a, b: a <= b)):
+            if dq is None: continue
+            if x == x:
+                while dq and worse(dq[-1][1], x):
+                    dq.pop()
+                dq.append((pos, x))
+            while dq and dq[0][0] < oldest:
+                dq.popleft()
+
+class _Ewm:
+    """
+    `Series.ewm(alpha=..., adjust=False).mean()` as a recurrence, including pandas'
+    handling of leading and interior NaNs (ignore_na=False).
+    """
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.weighted = NAN
+        self.old_wt = 1.0
+
+    def _step(self, x):
+        weighted, old_wt = self.weighted, self.old_wt
+        if weighted != weighted:
+            return (x, old_wt) if x == x else (NAN, old_wt)
+        old_wt *= 1.0 - self.alpha
+        if x == x:
+            if weighted != x:
+                weighted = (old_wt * weighted + self.alpha * x) / (old_wt + self.alpha)
+            old_wt = 1.0
+        return weighted, old_wt
+
+    def value(self, x):
+        return self._step(x)[0]
+
+    def commit(self, x):
+        self.weighted, self.old_wt = self._step(x)
+
+class StreamingIndicators:
+    """
+    Stateful indicator engine for one symbol.
+
+    Usage:
+        engine = StreamingIndicators.from_history(df, "2330.TW", "台積電")
+        metrics = engine.update(ts, open, high, low, close, volume)   # new bar or revised bar
+        metrics = engine.tick(price, volume)                            # intraday tick on current bar
+
+    For higher timeframes, feed the output of `timeframes.StreamingResampler` (one update per
+    base bar; the bucket timestamp decides between commit and revision).
+    """
+    def __init__(self, symbol, name=None, timeframe="1d"):
+        self.symbol = symbol
+        self.name = name or stock_analysis.lookup_name(symbol) or symbol
+        self.timeframe = timeframe
+        self._intraday = timeframes.is_intraday(timeframe)
+
+        self._ma5 = _RollingWindow(5)
+        self._ma20 = _RollingWindow(20)       # MA20 + Bollinger std
+        self._ma60 = _RollingWindow(60)
+        self._kd_low = _RollingWindow(9, track_min=True)
+        self._kd_high = _RollingWindow(9, track_max=True)
+        self._k = _Ewm(1 / 3)                 # com=2
+        self._d = _Ewm(1 / 3)
+        self._gain = _RollingWindow(14)
+        self._loss = _RollingWindow(14)
+        self._ema12 = _Ewm(2 / 13)
+        self._ema26 = _Ewm(2 / 27)
+        self._signal = _Ewm(2 / 10)
+        self._tr = _RollingWindow(14)
+        self._plus_dm = _RollingWindow(14)
+        self._minus_dm = _RollingWindow(14)
+        self._dx = _RollingWindow(14)
+        self._mv5 = _RollingWindow(5)
+        self._mv20 = _RollingWindow(20)
+
+        self._prev_bar = None                 # last committed bar (dict of OHLCV)
+        self._prev_row = None                 # last committed output row
+        self._div_rsi = divergence.StreamingDivergence()   # same signals as detect_divergence
+        self._div_macd = divergence.StreamingDivergence()
+
+        self._pending = None                  # current bar (dict incl. timestamp)
+        self._row = None                      # output row for the pending bar
+        self._inputs = None                   # per-indicator inputs of the pending bar
+
+    @classmethod
+    def from_history(cls, df, symbol, name=None, timeframe="1d"):
+        """
+        Seeds the engine from an OHLCV DataFrame of `timeframe` bars; its last row becomes the pending bar.
+        """
+        engine = cls(symbol, name, timeframe)
+        for ts, o, h, l, c, v in df[["Open", "High", "Low", "Close", "Volume"]].itertuples():
+            engine.update(ts, o, h, l, c, v, emit=False)
+        return engine
+
+    @property
+    def row(self):
+        """
+        Indicator values of the current bar, keyed like the `analyze_stock` DataFrame columns.
+        """
+        return self._row
+
+    def update(self, timestamp, open_p, high, low, close, volume, emit=True):
+        """
+        Feeds one bar. A new timestamp commits the previous bar first; the same timestamp
+        revises the current bar in place.
+        Returns: metrics dictionary (None while fewer than 2 bars are known or emit=False)
+        """
+        if not isinstance(timestamp, pd.Timestamp):
+            timestamp = pd.Timestamp(timestamp)
+        if self._pending is not None:
+            if timestamp < self._pending["ts"]:
+                raise ValueError(f"Out-of-order bar for {self.symbol}: {timestamp} < {self._pending['ts']}")
+            if timestamp > self._pending["ts"]:
+                self._commit()
+        self._pending = {"ts": timestamp, "Open": float(open_p), "High": float(high),
+                         "Low": float(low), "Close": float(close), "Volume": volume}
+        self._evaluate()
+        return self.metrics() if emit else None
+
+    def tick(self, price, volume=None):
+        """
+        Revises the current bar with a trade print (cumulative day volume if given).
+        """
+        if self._pending is None:
+            raise ValueError("tick() needs a current bar; call update() first")
+        bar = self._pending
+        return self.update(bar["ts"], bar["Open"], max(bar["High"], price), min(bar["Low"], price),
+                           price, bar["Volume"] if volume is None else volume)
+
+    def _evaluate(self):
+        bar = self._pending
+        o, h, l, c, v = bar["Open"], bar["High"], bar["Low"], bar["Close"], float(bar["Volume"])
+        prev = self._prev_bar
+        pc = prev["Close"] if prev else NAN
+
+        row = {"Open": o, "High": h, "Low": l, "Close": c, "Volume": bar["Volume"]}
+
+        # Trend & Bollinger
+        row["MA5"] = self._ma5.mean(c)
+        row["MA20"] = self._ma20.mean(c)
+        row["MA60"] = self._ma60.mean(c)
+        row["BB_Mid"] = row["MA20"]
+        row["BB_Std"] = self._ma20.std(c)
+        row["BB_Up"] = row["BB_Mid"] + 2 * row["BB_Std"]
+        row["BB_Low"] = row["BB_Mid"] - 2 * row["BB_Std"]
+
+        # KD
+        low_min = self._kd_low.min(l)
+        high_max = self._kd_high.max(h)
+        rsv = 100 * _div(c - low_min, high_max - low_min)
+        row["K"] = self._k.value(rsv)
+        row["D"] = self._d.value(row["K"])
+
+        # RSI (first bar: NaN delta counts as 0 gain / 0 loss, as in calculate_rsi)
+        delta = c - pc
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        rs = _div(self._gain.mean(gain), self._loss.mean(loss))
+        row["RSI"] = 100 - _div(100, 1 + rs)
+
+        # MACD
+        e12, e26 = self._ema12.value(c), self._ema26.value(c)
+        macd = e12 - e26
+        row["MACD"] = macd
+        row["Signal"] = self._signal.value(macd)
+        row["Hist"] = macd - row["Signal"]
+
+        # ATR (NaN previous close is skipped, as np.fmax does)
+        tr = h - l
+        if pc == pc:
+            tr = max(tr, abs(h - pc), abs(l - pc))
+        row["ATR"] = self._tr.mean(tr)
+
+        # ADX
+        up_move = h - prev["High"] if prev else NAN
+        down_move = prev["Low"] - l if prev else NAN
+        plus_dm = up_move if (up_move > down_move and up_move > 0) else 0.0
+        minus_dm = down_move if (down_move > up_move and down_move > 0) else 0.0
+        plus_di = 100 * _div(self._plus_dm.mean(plus_dm), row["ATR"])
+        minus_di = 100 * _div(self._minus_dm.mean(minus_dm), row["ATR"])
+        dx = 100 * _div(abs(plus_di - minus_di), plus_di + minus_di)
+        row["ADX"] = self._dx.mean(dx)
+
+        # Volume
+        row["MV5"] = self._mv5.mean(v)
+        row["MV20"] = self._mv20.mean(v)
+
+        self._row = row
+        self._inputs = {"c": c, "h": h, "l": l, "v": v, "rsv": rsv, "gain": gain, "loss": loss,
+                        "tr": tr, "plus_dm": plus_dm, "minus_dm": minus_dm, "dx": dx}
+
+    def _commit(self):
+        x, row = self._inputs, self._row
+        for window, value in ((self._ma5, x["c"]), (self._ma20, x["c"]), (self._ma60, x["c"]),
+                              (self._kd_low, x["l"]), (self._kd_high, x["h"]),
+                              (self._gain, x["gain"]), (self._loss, x["loss"]), (self._tr, x["tr"]),
+                              (self._plus_dm, x["plus_dm"]), (self._minus_dm, x["minus_dm"]),
+                              (self._dx, x["dx"]), (self._mv5, x["v"]), (self._mv20, x["v"])):
+            window.commit(value)
+        self._k.commit(x["rsv"])
+        self._d.commit(row["K"])
+        self._ema12.commit(x["c"])
+        self._ema26.commit(x["c"])
+        self._signal.commit(row["MACD"])
+
+        self._div_rsi.push(row["Close"], row["RSI"])
+        self._div_macd.push(row["Close"], row["Hist"])
+        self._prev_bar = self._pending
+        self._prev_row = row
+
+    def metrics(self):
+        """
+        Metrics dictionary for the current bar, identical in layout to `analyze_stock`.
+        """
+        if self._prev_row is None: return None
+        row = self._row
+        divergences = (divergence.label(self._div_rsi.latest(row["Close"], row["RSI"])),
+                       divergence.label(self._div_macd.latest(row["Close"], row["Hist"])))
+        ts = self._pending["ts"]
+        return stock_analysis.build_metrics(row, self._prev_row, ts if self._intraday else ts.date(),
+                                            self.symbol, self.name, None, None, None, timeframe=self.timeframe,
+                                            divergences=divergences)
@@ -0,0 +1,219 @@
+"""
+Symbol master: exchange, Chinese/English names and the yfinance suffix per code.
+
+Loaded from the refreshed copy in the data folder when present, otherwise from the bundled
+`data/symbol_master.csv`. Lookups by code ("2330"), symbol ("2330.TW") or exact name ("台積電")
+are dict hits; `search` does prefix matching over a sorted key list, then fuzzy matching.
+
+    python symbol_master.py --refresh          # pull the full TWSE + TPEx lists
+    python symbol_master.py --search 台積
+"""
+import argparse
+import bisect
+import difflib
+import json
+import os
+import urllib.request
+
+import pandas as pd
+
+import bar_store
+
+COLUMNS = ["code", "symbol", "exchange", "name_zh", "name_en"]
+EXCHANGE_SUFFIX = {"TWSE": ".TW", "TPEx": ".TWO"}
+
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "symbol_master.csv")
+LOCAL_PATH = os.path.join(bar_store.DEFAULT_DATA_DIR, "symbol_master.csv")
+
+# Open data endpoints: listed (TWSE) and OTC (TPEx) daily quotes carry code + Chinese name
+TWSE_LIST_URL = "https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL"
+TPEX_LIST_URL = "https://www.tpex.org.tw/openapi/v1/tpex_mainboard_daily_close_quotes"
+
+def _norm(text):
+    return str(text).strip().upper()
+
+class SymbolMaster:
+    """
+    In-memory index over the symbol master records (list of dicts with COLUMNS).
+    """
+    def __init__(self, records):
+        self.records = records
+        self._by_key = {}
+        prefix_keys = []
+        # Codes/symbols first so a name can never shadow a code
+        for fields in (("code", "symbol"), ("name_zh", "name_en")):
+            for rec in records:
+                for key in (rec[f] for f in fields):
+                    if key:
+                        self._by_key.setdefault(_norm(key), rec)
+                        prefix_keys.append((_norm(key), rec["symbol"]))
+        self._by_symbol = {rec["symbol"]: rec for rec in records}
+        self._prefix_keys = sorted(set(prefix_keys))
+        self._names = {_norm(rec[k]): rec for rec in records for k in ("name_zh", "name_en") if rec[k]}
+
+    @classmethod
+    def from_csv(cls, path):
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        return cls(df[COLUMNS].to_dict("records"))
+
+    def to_csv(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = bar_store.temp_path(path)
+        pd.DataFrame(self.records, columns=COLUMNS).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, text):
+        """
+        Exact lookup by code, symbol or name (case-insensitive).
+        Returns: record dict or None
+        """
+        return self._by_key.get(_norm(text))
+
+    def canonical(self, symbol):
+        """
+        Corrects the Taiwan suffix from the listing exchange ("6488.TW" -> "6488.TWO").
+        Returns: yfinance symbol or None when the code is unknown
+        """
+        if symbol in self._by_symbol: return symbol
+        code, dot, suffix = symbol.partition(".")
+        if dot and "." + suffix.upper() in EXCHANGE_SUFFIX.values():
+            rec = self._by_key.get(_norm(code))
+            if rec and rec["exchange"] in EXCHANGE_SUFFIX: return rec["symbol"]
+        return None
+
+    def resolve(self, text):
+        """
+        Code / symbol / name -> yfinance symbol ("2330" -> "2330.TW", "6488.TW" -> "6488.TWO").
+        Returns: symbol or None when unknown
+        """
+        rec = self.get(text)
+        return rec["symbol"] if rec else self.canonical(text.strip().upper())
+
+    def name(self, symbol):
+        """
+        Display name for a yfinance symbol (Chinese first).
+        Returns: name or None
+        """
+        rec = self._by_symbol.get(self.canonical(symbol) or symbol)
+        return (rec["name_zh"] or rec["name_en"] or None) if rec else None
+
+    def search(self, query, limit=10):
+        """
+        Prefix matches on codes/symbols/names, topped up with fuzzy name matches.
+        Returns: list of record dicts
+        """
+        q = _norm(query)
+        if not q: return []
+        found = []
+        i = bisect.bisect_left(self._prefix_keys, (q,))
+        while i < len(self._prefix_keys) and self._prefix_keys[i][0].startswith(q) and len(found) < limit:
+            symbol = self._prefix_keys[i][1]
+            if symbol not in found: found.append(symbol)
+            i += 1
+        if len(found) < limit:
+            for key in difflib.get_close_matches(q, list(self._names), n=limit, cutoff=0.5):
+                symbol = self._names[key]["symbol"]
+                if symbol not in found: found.append(symbol)
+        return [self._by_symbol[s] for s in found[:limit]]
+
+# ---- refresh from the exchanges ----
+def _get_json(url, timeout):
+    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+def _exchange_records(payload, exchange, code_keys, name_keys):
+    out = []
+    for row in payload or []:
+        code = next((row[k] for k in code_keys if row.get(k)), None)
+        name = next((row[k] for k in name_keys if row.get(k)), None)
+        if code and name:
+            code = code.strip()
+            out.append({"code": code, "symbol": code + EXCHANGE_SUFFIX[exchange], "exchange": exchange,
+                        "name_zh": name.strip(), "name_en": ""})
+    return out
+
+def refresh(path=LOCAL_PATH, timeout=20):
+    """
+    Downloads the TWSE and TPEx lists and merges them over the bundled file
+    (bundled rows keep their English names; indices and US rows are kept as is).
+    Returns: the new SymbolMaster (also installed as the process-wide one)
+    """
+    fetched = _exchange_records(_get_json(TWSE_LIST_URL, timeout), "TWSE", ["Code"], ["Name"])
+    fetched += _exchange_records(_get_json(TPEX_LIST_URL, timeout), "TPEx",
+                                 ["SecuritiesCompanyCode", "Code"], ["CompanyName", "Name"])
+    if not fetched: raise ValueError("Exchange lists came back empty")
+
+    merged = {rec["code"]: rec for rec in SymbolMaster.from_csv(BUNDLED_PATH).records}
+    for rec in fetched:
+        old = merged.get(rec["code"])
+        merged[rec["code"]] = dict(rec, name_en=old["name_en"] if old else "")
+    master = SymbolMaster(list(merged.values()))
+    master.to_csv(path)
+    set_master(master)
+    return master
+
+_master = None
+
+def get_master():
+    """
+    Process-wide symbol master (refreshed local copy if present, else the bundled file).
+    """
+    global _master
+    if _master is None:
+        _master = SymbolMaster.from_csv(LOCAL_PATH if os.path.exists(LOCAL_PATH) else BUNDLED_PATH)
+    return _master
+
+def set_master(master):
+    global _master
+    _master = master
+
+# ---- user input ----
+def process_ticker(input_str):
+    """
+    Smartly converts user input to yfinance ticker.
+    """
+    input_str = input_str.strip().upper()
+    
+    # 1. Futures Mapping (Proxy)
+    if input_str in ["TX", "WTX", "台指期", "FUTURES", "TAIEX"]:
+        return "^TWII", "台指期 (Proxy: 加權指數)"
+        
+    # 2. Symbol Master: code, symbol or name -> ticker with the right exchange suffix
+    rec = get_master().get(input_str)
+    if rec:
+        return rec['symbol'], rec['name_zh'] or rec['name_en'] or input_str
+
+    # 3. Taiwan Stock Shortcut (4 digits, not in the master yet)
+    if input_str.isdigit() and len(input_str) == 4:
+        # Default assumption: simple ticker input -> likely Taiwan Stock
+        return f"{input_str}.TW", f"{input_str}"
+        
+    # 4. Default
+    return input_str, input_str
+
+def parse_ticker_list(text):
+    """
+    Splits a comma/space/newline separated list and normalizes each entry via process_ticker.
+    """
+    tokens = [tok for tok in text.replace(",", " ").split() if tok.strip()]
+    return [process_ticker(tok)[0] for tok in tokens]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Symbol master maintenance")
+    parser.add_argument("--refresh", action="store_true", help="download the TWSE + TPEx lists")
+    parser.add_argument("--search", help="prefix / fuzzy search")
+    args = parser.parse_args(argv)
+
+    if args.refresh:
+        master = refresh()
+        print(f"Saved {len(master)} symbols to {LOCAL_PATH}")
+    if args.search:
+        for rec in get_master().search(args.search):
+            print(f"{rec['symbol']:<10} {rec['exchange']:<5} {rec['name_zh']} {rec['name_en']}")
+
+if __name__ == "__main__":
+    main()
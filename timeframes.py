@@ -0,0 +1,149 @@
+"""
+Timeframes and TWSE-session-aware resampling.
+
+Two base intervals are stored by `bar_store` ("1d" and "5m"); every other timeframe is
+aggregated from one of them:
+    5m  -> 60m   hourly buckets anchored at the 09:00 open; the last one is 13:00-13:30 and
+                 the 13:30 closing-auction print is folded into it, so no bucket crosses the
+                 close or spans two sessions
+    1d  -> 1wk   Monday-anchored weeks
+    1d  -> 1mo   calendar months
+Buckets are labelled with their start (hour / Monday / 1st of month) and aggregated as
+first Open, max High, min Low, last Close, summed Volume.
+
+`resample` is the batch version. `update` extends an already resampled frame by
+re-aggregating only the last (still forming) bucket and the new base bars, and
+`StreamingResampler` does the same bar by bar for `streaming.StreamingIndicators`.
+"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+import market_hours
+
+# timeframe -> base interval it is built from
+TIMEFRAMES = {"5m": "5m", "60m": "5m", "1d": "1d", "1wk": "1d", "1mo": "1d"}
+TIMEFRAME_LABELS = {"5m": "5分K", "60m": "60分K", "1d": "日K", "1wk": "週K", "1mo": "月K"}
+# Base history loaded per timeframe: enough bars for MA60 on the resampled series.
+# Yahoo keeps about 60 days of 5-minute bars.
+DEFAULT_PERIODS = {"5m": "1mo", "60m": "60d", "1d": "1y", "1wk": "2y", "1mo": "10y"}
+
+_SESSION_MINUTES = (dt.datetime.combine(dt.date.min, market_hours.SESSION_CLOSE)
+                    - dt.datetime.combine(dt.date.min, market_hours.SESSION_OPEN)) // dt.timedelta(minutes=1)
+_OPEN_MINUTE = market_hours.SESSION_OPEN.hour * 60 + market_hours.SESSION_OPEN.minute
+
+def base_interval(timeframe):
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unsupported timeframe: {timeframe} (one of {', '.join(TIMEFRAMES)})")
+    return TIMEFRAMES[timeframe]
+
+def is_intraday(timeframe):
+    return base_interval(timeframe) != "1d"
+
+def bucket_starts(index, timeframe):
+    """
+    Bucket label (start timestamp) of every bar of a sorted DatetimeIndex (exchange-local time).
+    """
+    index = pd.DatetimeIndex(index)
+    day = index.normalize()
+    if timeframe == "1wk":
+        return day - pd.to_timedelta(index.dayofweek, unit="D")
+    if timeframe == "1mo":
+        return day - pd.to_timedelta(index.day - 1, unit="D")
+    if timeframe == "60m":
+        # Minutes since the open, clipped into the session: pre-open prints join the first
+        # bucket and the 13:30 closing auction joins the 13:00 bucket
+        minutes = np.clip(index.hour * 60 + index.minute - _OPEN_MINUTE, 0, _SESSION_MINUTES - 1)
+        return day + pd.to_timedelta(_OPEN_MINUTE + minutes // 60 * 60, unit="min")
+    return index
+
+def aggregate_runs(df, starts, index):
+    """
+    OHLCV aggregate of consecutive row runs beginning at positions `starts`.
+    Returns: DataFrame indexed by `index` (one label per run)
+    """
+    ends = np.r_[starts[1:], len(df)] - 1
+    out = {
+        "Open": df['Open'].to_numpy()[starts],
+        "High": np.fmax.reduceat(df['High'].to_numpy(dtype=np.float64), starts),
+        "Low": np.fmin.reduceat(df['Low'].to_numpy(dtype=np.float64), starts),
+        "Close": df['Close'].to_numpy()[ends],
+    }
+    if "Volume" in df:
+        volume = np.add.reduceat(np.nan_to_num(df['Volume'].to_numpy(dtype=np.float64)), starts)
+        out["Volume"] = volume.astype(df['Volume'].dtype) if df['Volume'].dtype.kind in "iu" else volume
+    return pd.DataFrame(out, index=pd.DatetimeIndex(index, name=df.index.name))
+
+def resample(df, timeframe):
+    """
+    Aggregates base bars into `timeframe` bars (no-op for the base timeframes).
+    """
+    if timeframe == base_interval(timeframe) or df.empty:
+        return df
+    keys = bucket_starts(df.index, timeframe)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return aggregate_runs(df, starts, keys[starts])
+
+def update(resampled, base, timeframe):
+    """
+    Incremental `resample`: only bars from the start of the last (possibly partial) bucket on
+    are re-aggregated. Falls back to a full pass when the base history was revised
+    (e.g. re-adjusted for a dividend) before that bucket.
+    """
+    if resampled is None or resampled.empty or len(resampled) < 2 or timeframe == base_interval(timeframe):
+        return resample(base, timeframe)
+    last_start = resampled.index[-1]
+    before = base[base.index < last_start]
+    # Close of the previous bucket is the last base close before it; an adjustment rescales
+    # every bar before the ex-date, so both ends of the history are checked
+    if before.empty or before['Close'].iloc[-1] != resampled['Close'].iloc[-2]:
+        return resample(base, timeframe)
+    first = bucket_starts(base.index[:1], timeframe)[0]
+    if first == resampled.index[0] and base['Open'].iloc[0] != resampled['Open'].iloc[0]:
+        return resample(base, timeframe)
+    tail = resample(base[base.index >= last_start], timeframe)
+    return pd.concat([resampled.iloc[:-1], tail])
+
+class StreamingResampler:
+    """
+    Turns a stream of base bars into a stream of `timeframe` bars.
+
+    `update` returns the aggregated bar of the bucket the base bar falls into; feed it to
+    `StreamingIndicators.update`, which commits on a new bucket timestamp and revises the
+    current one otherwise. Re-sending the latest base bar (same timestamp) revises it.
+    """
+    def __init__(self, timeframe):
+        base_interval(timeframe)
+        self.timeframe = timeframe
+        self._bucket = None      # start of the current bucket
+        self._committed = None   # aggregate of the bucket's base bars before the pending one
+        self._pending = None     # latest base bar (timestamp, o, h, l, c, v)
+
+    def _key(self, timestamp):
+        return bucket_starts(pd.DatetimeIndex([timestamp]), self.timeframe)[0]
+
+    @staticmethod
+    def _combine(agg, bar):
+        if agg is None:
+            return bar[1:]
+        o, h, l, c, v = agg
+        return (o, max(h, bar[2]), min(l, bar[3]), bar[4], v + bar[5])
+
+    def update(self, timestamp, open_p, high, low, close, volume):
+        """
+        Returns: (bucket timestamp, open, high, low, close, volume)
+        """
+        timestamp = pd.Timestamp(timestamp)
+        bar = (timestamp, float(open_p), float(high), float(low), float(close), volume)
+        key = self._key(timestamp)
+        if self._pending is not None:
+            if timestamp < self._pending[0]:
+                raise ValueError(f"Out-of-order bar: {timestamp} < {self._pending[0]}")
+            if key != self._bucket:
+                self._committed = None
+            elif timestamp > self._pending[0]:
+                self._committed = self._combine(self._committed, self._pending)
+        self._bucket = key
+        self._pending = bar
+        return (key, *self._combine(self._committed, bar))